@@ -0,0 +1,101 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Throughput of concurrent events through the asyncio API compared with the
+blocking API (Python 3). Run it through benchmark.py:
+  python3 benchmark.py concurrency --events 32 --players 64 --rounds 5
+
+Every event creates a tournament in the configured database, so point it at
+a scratch database with --dsn.
+"""
+import asyncio
+import random
+import time
+import aiotournament
+import db
+import tournament
+
+
+def _results(pairings, rng):
+    """Decides every paired match by a coin toss."""
+    return [
+        (id1, id2) if rng.random() < 0.5 else (id2, id1)
+        for (id1, name1, id2, name2) in pairings
+    ]
+
+
+def playEvent(player_count, rounds, rng):
+    """Plays a whole event through the blocking API."""
+    tournament_id = tournament.createTournament()
+    tournament.registerPlayers(
+        ["Player %d" % i for i in range(player_count)], tournament_id
+    )
+    for _ in range(rounds):
+        pairings = tournament.swissPairings(tournament_id)
+        tournament.reportMatches(_results(pairings, rng), tournament_id)
+    return tournament.playerStandings(tournament_id=tournament_id)
+
+
+async def playEventAsync(player_count, rounds, rng):
+    """Plays a whole event through the asyncio API."""
+    tournament_id = await aiotournament.createTournament()
+    await aiotournament.registerPlayers(
+        ["Player %d" % i for i in range(player_count)], tournament_id
+    )
+    for _ in range(rounds):
+        pairings = await aiotournament.swissPairings(tournament_id)
+        await aiotournament.reportMatches(
+            _results(pairings, rng), tournament_id
+        )
+    return await aiotournament.playerStandings(tournament_id=tournament_id)
+
+
+def benchmarkConcurrency(event_count, player_count, rounds, seed=0):
+    """Times event_count events played one after another through the
+    blocking API, then all at once on one event loop through the asyncio API.
+
+    Both APIs open as many connections as the shared pool of db.py.
+
+    Returns:
+      A dict with the seconds and events per second of both runs.
+    """
+    rng = random.Random(seed)
+    start = time.time()
+    for _ in range(event_count):
+        playEvent(player_count, rounds, rng)
+    sync_seconds = time.time() - start
+
+    async def playAll():
+        await asyncio.gather(*[
+            playEventAsync(player_count, rounds, rng)
+            for _ in range(event_count)
+        ])
+
+    async def playAllPooled():
+        # Every connection is opened before the timing starts, as the
+        # blocking run reuses the connections of its own pool.
+        await aiotournament.configurePool(
+            db.poolSize(), db.poolSize(), db.poolDsn()
+        )
+        try:
+            await aiotournament.getPool()
+            start = time.time()
+            await playAll()
+            return time.time() - start
+        finally:
+            await aiotournament.closePool()
+
+    async_seconds = asyncio.run(playAllPooled())
+
+    return {
+        'events': event_count,
+        'players': player_count,
+        'rounds': rounds,
+        'pool_connections': db.poolSize(),
+        'sync_seconds': sync_seconds,
+        'sync_events_per_second': event_count / sync_seconds,
+        'async_seconds': async_seconds,
+        'async_events_per_second': event_count / async_seconds,
+        'speedup': sync_seconds / async_seconds,
+    }
@@ -0,0 +1,409 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Asyncio counterpart of the tournament API, for Python 3 services that run
+many events on one event loop.
+
+Every function is a coroutine running on asyncpg and its own pool of
+connections, so the event loop never blocks on the database and no threads
+are involved. Each call runs in a single transaction, with the tournament
+locked where its blocking counterpart locks it. Matches are recorded by the
+statement sequences of the PostgreSQL backend and rounds are paired by
+pairing.pairNextRound(), the code the blocking API runs, so both APIs can be
+used against the same database at once:
+
+    tournament_id = await aiotournament.createTournament()
+    await aiotournament.registerPlayers(names, tournament_id)
+    pairings = await aiotournament.swissPairings(tournament_id)
+
+Requires asyncpg (pip install asyncpg).
+"""
+import asyncio
+import functools
+import re
+import asyncpg
+import db
+import pairing
+import pgstorage
+import storage
+import tiebreakers as _tiebreakers
+from pairing import GREEDY, OPTIMAL  # noqa
+
+_config = {
+    'dsn': db.DSN,
+    'min_size': 1,
+    'max_size': 10,
+}
+_pool = None
+_pool_lock = None
+
+# Id of the active tournament, cached by activeTournamentId().
+_active_tournament_id = None
+_active_tournament_lock = None
+
+_PLACEHOLDER = re.compile(r"%s")
+
+# libpq connection parameters and the asyncpg.connect() arguments they map to.
+_DSN_PARAMETERS = {
+    'host': ('host', str),
+    'hostaddr': ('host', str),
+    'port': ('port', int),
+    'dbname': ('database', str),
+    'user': ('user', str),
+    'password': ('password', str),
+    'connect_timeout': ('timeout', float),
+    'sslmode': ('ssl', str),
+}
+_DSN_PAIR = re.compile(r"\s*(\w+)\s*=\s*('(?:[^'\\]|\\.)*'|[^\s']*)")
+
+
+async def configurePool(min_size=1, max_size=10, dsn=db.DSN):
+    """Configures the pool of connections every coroutine runs on.
+
+    Any existing pool is closed; a new one is created lazily on the next
+    call.
+
+    Args:
+      min_size: number of connections opened with the pool.
+      max_size: upper bound on open connections; callers wait until a
+        connection is free once the bound is reached.
+      dsn: libpq connection string or postgresql:// URI of the tournament
+        database.
+    """
+    if not 0 < min_size <= max_size:
+        raise ValueError("Pool sizes must satisfy 0 < min_size <= max_size.")
+    _connectArguments(dsn)
+    await closePool()
+    _config.update(dsn=dsn, min_size=min_size, max_size=max_size)
+
+
+async def getPool():
+    """Returns the connection pool, creating it if necessary.
+
+    The pool belongs to the event loop it was created on; close it with
+    closePool() before that loop stops.
+    """
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                min_size=_config['min_size'], max_size=_config['max_size'],
+                **_connectArguments(_config['dsn'])
+            )
+    return _pool
+
+
+async def closePool():
+    """Closes every connection of the pool, waiting for calls in flight."""
+    global _pool, _pool_lock, _active_tournament_lock
+    pool, _pool = _pool, None
+    _pool_lock = None
+    _active_tournament_lock = None
+    if pool is not None:
+        await pool.close()
+
+
+def _connectArguments(dsn):
+    """Translates a connection string into asyncpg.connect() arguments.
+
+    asyncpg only parses postgresql:// URIs, so the key=value strings used by
+    db.py are mapped parameter by parameter. Parameters left out are read
+    from the PG* environment variables, as libpq does.
+    """
+    if '://' in dsn:
+        return {'dsn': dsn}
+    arguments = {}
+    position = 0
+    dsn = dsn.strip()
+    while position < len(dsn):
+        match = _DSN_PAIR.match(dsn, position)
+        if match is None:
+            raise ValueError("Invalid connection string %r." % (dsn,))
+        key, value = match.groups()
+        if value.startswith("'"):
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        if key not in _DSN_PARAMETERS:
+            raise ValueError(
+                "Unsupported connection parameter %r in %r." % (key, dsn)
+            )
+        argument, convert = _DSN_PARAMETERS[key]
+        arguments[argument] = convert(value)
+        position = match.end()
+    return arguments
+
+
+@functools.lru_cache(maxsize=None)
+def _numbered(query):
+    """Rewrites the %s placeholders of a query into asyncpg's $1, $2, ...
+
+    asyncpg prepares every query once per connection and keeps the
+    statement, so statements are not parsed again on later calls, as with
+    db.executePrepared().
+    """
+    numbers = iter(range(1, query.count('%s') + 1))
+    return _PLACEHOLDER.sub(lambda m: '$%d' % next(numbers), query)
+
+
+async def _run(conn, statements):
+    """Runs a statement sequence of pgstorage on conn, the way
+    pgstorage.runStatements() runs it on a cursor.
+
+    Rows are written with binary COPY instead of multi-row INSERTs. asyncpg
+    prepares every statement, so a PreparedStatement runs like any other.
+    """
+    rows = None
+    try:
+        step = next(statements)
+        while isinstance(step, (
+                pgstorage.Statement, pgstorage.PreparedStatement,
+                pgstorage.Rows)):
+            if isinstance(step, pgstorage.Rows):
+                await conn.copy_records_to_table(
+                    step.table, records=step.rows,
+                    columns=[column.lower() for column in step.columns]
+                )
+                rows = None
+            else:
+                rows = [tuple(row) for row in await conn.fetch(
+                    _numbered(step.query), *step.parameters
+                )]
+            step = statements.send(rows)
+    except StopIteration:
+        return None
+    return step
+
+
+async def createTournament():
+    """Creates a new tournament, makes it the active one and returns its id."""
+    global _active_tournament_id
+    pool = await getPool()
+    tournament_id = await pool.fetchval(pgstorage.CREATE_TOURNAMENT_QUERY)
+    _active_tournament_id = tournament_id
+    return tournament_id
+
+
+async def activeTournamentId():
+    """Returns the active tournament id, see tournament.activeTournamentId().
+
+    The id is cached separately from the blocking API's. Concurrent first
+    calls wait for a single lookup, so at most one tournament is created.
+    """
+    global _active_tournament_id, _active_tournament_lock
+    if _active_tournament_id is not None:
+        return _active_tournament_id
+    if _active_tournament_lock is None:
+        _active_tournament_lock = asyncio.Lock()
+    async with _active_tournament_lock:
+        if _active_tournament_id is None:
+            pool = await getPool()
+            tournament_id = await pool.fetchval(
+                pgstorage.LATEST_TOURNAMENT_QUERY
+            )
+            if tournament_id is None:
+                return await createTournament()
+            _active_tournament_id = tournament_id
+    return _active_tournament_id
+
+
+def clearActiveTournament():
+    """Forgets the cached active tournament id so it is looked up again."""
+    global _active_tournament_id
+    _active_tournament_id = None
+
+
+async def registerPlayer(name, tournament_id=None):
+    """Coroutine version of tournament.registerPlayer()."""
+    if tournament_id is None:
+        tournament_id = await activeTournamentId()
+    pool = await getPool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            player_id = await conn.fetchval(
+                _numbered(pgstorage.REGISTER_PLAYER_QUERY), name, tournament_id
+            )
+            await _bumpResultVersion(conn, tournament_id)
+    return player_id
+
+
+async def registerPlayers(names, tournament_id=None):
+    """Coroutine version of tournament.registerPlayers().
+
+    The ids are reserved from the player sequence in one query and the
+    players are streamed to the database with binary COPY.
+    """
+    names = list(names)
+    if not names:
+        return []
+    if tournament_id is None:
+        tournament_id = await activeTournamentId()
+    pool = await getPool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            player_ids = [row[0] for row in await conn.fetch(
+                _numbered(pgstorage.RESERVE_PLAYER_IDS_QUERY), len(names)
+            )]
+            await conn.copy_records_to_table(
+                'player', columns=('id', 'name', 'tournamentid'),
+                records=[
+                    (player_id, name, tournament_id)
+                    for player_id, name in zip(player_ids, names)
+                ]
+            )
+            await conn.copy_records_to_table(
+                'standing', columns=('playerid', 'tournamentid'),
+                records=[
+                    (player_id, tournament_id) for player_id in player_ids
+                ]
+            )
+            await _bumpResultVersion(conn, tournament_id)
+    return player_ids
+
+
+async def _bumpResultVersion(conn, tournament_id):
+    """Gives the tournament a new result version in the transaction of conn,
+    so that standings cached by the blocking API are read again."""
+    statement = pgstorage.bumpResultVersionStatement(tournament_id)
+    await conn.execute(_numbered(statement.query), *statement.parameters)
+
+
+async def playerStandings(show_all_columns=False, tournament_id=None,
+                          tiebreakers=None, limit=None, offset=0):
+    """Coroutine version of tournament.playerStandings()."""
+    if tournament_id is None:
+        tournament_id = await activeTournamentId()
+    pool = await getPool()
+    query = _numbered(pgstorage.STANDINGS_QUERY)
+    if not tiebreakers:
+        rows = await pool.fetch(query, tournament_id, limit, offset)
+        player_standings = [storage.Standing._make(row) for row in rows]
+    else:
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation='repeatable_read'):
+                rows = await conn.fetch(query, tournament_id, None, 0)
+                results = [tuple(row) for row in await conn.fetch(
+                    _numbered(pgstorage.MATCH_RESULTS_QUERY), tournament_id
+                )]
+        player_standings = [storage.Standing._make(row) for row in rows]
+        player_standings = _tiebreakers.sortStandings(
+            player_standings,
+            _tiebreakers.computeTiebreakers(
+                [p.id for p in player_standings], results
+            ),
+            tiebreakers
+        )
+        stop = None if limit is None else offset + limit
+        player_standings = player_standings[offset:stop]
+    if show_all_columns:
+        return player_standings
+    return [(p.id, p.name, p.wins, p.matches) for p in player_standings]
+
+
+async def reportMatch(winner, loser, is_tie=False, tournament_id=None):
+    """Coroutine version of tournament.reportMatch().
+
+    Raises:
+      ValueError: if a player is not registered in the tournament, the
+        players are the same, or a tie has no loser.
+    """
+    if tournament_id is None:
+        tournament_id = await activeTournamentId()
+    pool = await getPool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await _reportMatch(conn, tournament_id, winner, loser, is_tie)
+
+
+async def _reportMatch(conn, tournament_id, winner, loser, is_tie):
+    """Records a match in the transaction of conn, validating it first."""
+    await _run(conn, pgstorage.reportMatchStatements(
+        tournament_id, winner, loser, is_tie
+    ))
+
+
+async def reportMatches(results, tournament_id=None):
+    """Coroutine version of tournament.reportMatches().
+
+    The matches are streamed with binary COPY and the standings of the
+    tournament are recomputed once afterwards.
+
+    Raises:
+      ValueError: if a result names a player who is not registered in the
+        tournament, pits a player against themself, or is a tie
+        without a loser.
+    """
+    results = [
+        (result[0], result[1], bool(result[2]) if len(result) > 2 else False)
+        for result in results
+    ]
+    if not results:
+        return
+    if tournament_id is None:
+        tournament_id = await activeTournamentId()
+    pool = await getPool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await _run(
+                conn, pgstorage.reportMatchesStatements(tournament_id, results)
+            )
+
+
+class _Transaction(object):
+    """The storage calls of pairing.pairNextRound(), made in the transaction
+    of one connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def playersWithBye(self, tournament_id):
+        return set(row[0] for row in await self.conn.fetch(
+            _numbered(pgstorage.PLAYERS_WITH_BYE_QUERY), tournament_id
+        ))
+
+    async def playerOpponents(self, tournament_id):
+        return pgstorage.opponentGraph(await self.conn.fetch(
+            _numbered(pgstorage.OPPONENTS_QUERY), tournament_id
+        ))
+
+    async def reportMatch(self, tournament_id, winner, loser, is_tie):
+        await _reportMatch(self.conn, tournament_id, winner, loser, is_tie)
+
+    async def snapshotStandings(self, tournament_id, round_number):
+        await self.conn.execute(
+            _numbered(pgstorage.SNAPSHOT_STANDINGS_QUERY), round_number,
+            tournament_id
+        )
+
+
+async def swissPairings(tournament_id=None, method=GREEDY):
+    """Coroutine version of tournament.swissPairings().
+
+    The round is paired in one transaction holding the tournament's lock,
+    the same lock the blocking API takes, and a bye it grants is reported
+    in that transaction.
+    """
+    if tournament_id is None:
+        tournament_id = await activeTournamentId()
+    pool = await getPool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            lock = pgstorage.lockTournamentStatement(tournament_id)
+            await conn.execute(_numbered(lock.query), *lock.parameters)
+            players = [
+                storage.Standing._make(row) for row in await conn.fetch(
+                    _numbered(pgstorage.STANDINGS_QUERY),
+                    tournament_id, None, 0
+                )
+            ]
+            transaction = _Transaction(conn)
+            steps = pairing.pairNextRound(players, method)
+            step = next(steps)
+            while isinstance(step, pairing.Call):
+                step = steps.send(await getattr(transaction, step.method)(
+                    tournament_id, *step.arguments
+                ))
+    return step
@@ -0,0 +1,951 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Benchmarks for the tournament module. Results are printed as JSON.
+
+Time the pairing engines on a simulated field, without a database:
+  python benchmark.py pairing --players 4096 --rounds 6 --method optimal
+
+Time every API call over whole Swiss events of several sizes, in the
+configured storage backend, and compare two saved runs:
+  python benchmark.py suite --sizes 16,256,10000 --output before.json
+  python benchmark.py compare before.json after.json
+
+Measure what preparing the hot statements once per connection saves on
+every call, in client time and in server planning time:
+  python benchmark.py statements --players 256 --calls 500
+
+Compare the aggregating queries over match_result with the match_tie
+queries and views they replaced, on the same results:
+  python benchmark.py results --players 4096 --rounds 12 --tie-rate 0.1
+
+Time a round turnover of many small tournaments, paired one after the
+other and then by swissPairingsBatch() with pools of several sizes:
+  python benchmark.py batch --tournaments 200 --players 16 --workers 1,2,4
+
+Compare concurrent events through the asyncio API with the blocking API
+(Python 3 and asyncpg only; see aiobenchmark.py):
+  python3 benchmark.py concurrency --events 32 --players 64 --rounds 5
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import re
+import random
+import subprocess
+import sys
+import time
+import pairing
+import storage
+
+# Operations timed by benchmarkSuite(), in the order they are reported.
+SUITE_OPERATIONS = (
+    'registerPlayer', 'swissPairings', 'reportMatch', 'playerStandings'
+)
+
+# Operations timed by benchmarkStatements(); they run the prepared
+# statements of the PostgreSQL backend.
+STATEMENT_OPERATIONS = (
+    'havePlayersBeenPaired', 'doesPlayerHaveBye', 'playerStandings',
+    'reportMatch'
+)
+
+_PLANNING_TIME = re.compile(r"Planning Time: ([0-9.]+) ms")
+
+# Queries compared by benchmarkResults(), in the order they are reported.
+RESULT_QUERIES = (
+    'refresh_standings', 'opponents', 'match_results', 'player_record',
+    'player_opponents'
+)
+
+# The same reads before ties moved into match_result: a tie was a match row
+# without winner or loser plus two match_tie rows. benchmarkResults() runs
+# them against a temporary match_tie rebuilt from match_result. Every %s is
+# the tournament id.
+_LEGACY_PLAYER_RECORD = (
+    "SELECT p.tournamentId, p.id, p.name, COALESCE(w.wins, 0) wins, "
+    "COALESCE(l.losses, 0) losses, COALESCE(t.ties, 0) ties, "
+    "COALESCE(w.wins, 0) + COALESCE(l.losses, 0) + COALESCE(t.ties, 0) "
+    "matches FROM player p "
+    "LEFT JOIN (SELECT tournamentId, winnerId, COUNT(winnerId) wins "
+    "FROM match GROUP BY tournamentId, winnerId) w "
+    "ON p.tournamentId = w.tournamentId AND p.id = w.winnerId "
+    "LEFT JOIN (SELECT tournamentId, loserId, COUNT(loserId) losses "
+    "FROM match GROUP BY tournamentId, loserId) l "
+    "ON p.tournamentId = l.tournamentId AND p.id = l.loserId "
+    "LEFT JOIN (SELECT tournamentId, playerId, COUNT(playerId) ties "
+    "FROM match_tie GROUP BY tournamentId, playerId) t "
+    "ON p.tournamentId = t.tournamentId AND p.id = t.playerId"
+)
+_LEGACY_OPPONENTS_VIEW = " UNION ".join(
+    "SELECT p.tournamentId, p.id, p.name, %s opponentId, "
+    "pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, "
+    "pr.ties opponentMatchTiePoints FROM player p %s "
+    "INNER JOIN (" % (opponent, join) + _LEGACY_PLAYER_RECORD + ") pr "
+    "ON p.tournamentId = pr.tournamentId AND %s = pr.id" % opponent
+    for opponent, join in (
+        ("m.loserId", "INNER JOIN match m ON p.tournamentId = "
+         "m.tournamentId AND p.id = m.winnerId AND m.loserId IS NOT NULL"),
+        ("m.winnerId", "INNER JOIN match m ON p.tournamentId = "
+         "m.tournamentId AND p.id = m.loserId AND m.winnerId IS NOT NULL"),
+        ("mt2.playerId", "INNER JOIN match_tie mt ON p.tournamentId = "
+         "mt.tournamentId AND p.id = mt.playerId INNER JOIN match_tie mt2 "
+         "ON mt.tournamentId = mt2.tournamentId AND mt.matchId = mt2.matchId "
+         "AND mt.playerId != mt2.playerId"),
+    )
+)
+LEGACY_RESULT_QUERIES = {
+    'refresh_standings': (
+        "WITH result AS ("
+        "SELECT winnerId AS playerId, loserId AS opponentId, "
+        "1 AS win, 0 AS loss, 0 AS tie, "
+        "CASE WHEN loserId IS NULL THEN 1 ELSE 0 END AS bye "
+        "FROM match WHERE tournamentId = %s AND winnerId IS NOT NULL "
+        "UNION ALL "
+        "SELECT loserId, winnerId, 0, 1, 0, 0 "
+        "FROM match WHERE tournamentId = %s AND loserId IS NOT NULL "
+        "UNION ALL "
+        "SELECT mt.playerId, mt2.playerId, 0, 0, 1, 0 FROM match_tie mt "
+        "INNER JOIN match_tie mt2 ON mt.matchId = mt2.matchId AND "
+        "mt.playerId != mt2.playerId "
+        "WHERE mt.tournamentId = %s), "
+        "total AS ("
+        "SELECT playerId, SUM(win) AS wins, SUM(loss) AS losses, "
+        "SUM(tie) AS ties, COUNT(*) AS matches, SUM(bye) AS byes, "
+        "SUM(win) * 4 + SUM(tie) AS points "
+        "FROM result GROUP BY playerId), "
+        "opponent_points AS ("
+        "SELECT o.playerId, SUM(t.points) AS omw "
+        "FROM (SELECT DISTINCT playerId, opponentId FROM result "
+        "WHERE opponentId IS NOT NULL) o "
+        "INNER JOIN total t ON t.playerId = o.opponentId "
+        "GROUP BY o.playerId) "
+        "UPDATE standing s SET wins = t.wins, losses = t.losses, "
+        "ties = t.ties, matches = t.matches, byes = t.byes, "
+        "omw = COALESCE(op.omw, 0) "
+        "FROM total t "
+        "LEFT JOIN opponent_points op ON op.playerId = t.playerId "
+        "WHERE s.tournamentId = %s AND s.playerId = t.playerId"
+    ),
+    'opponents': (
+        "SELECT winnerId, loserId FROM match WHERE tournamentId = %s "
+        "AND winnerId IS NOT NULL AND loserId IS NOT NULL "
+        "UNION ALL "
+        "SELECT mt.playerId, mt2.playerId FROM match_tie mt "
+        "INNER JOIN match_tie mt2 ON mt.matchId = mt2.matchId AND "
+        "mt.playerId < mt2.playerId "
+        "WHERE mt.tournamentId = %s"
+    ),
+    'match_results': (
+        "SELECT winnerId, loserId, FALSE FROM match "
+        "WHERE tournamentId = %s AND winnerId IS NOT NULL "
+        "UNION ALL "
+        "SELECT mt.playerId, mt2.playerId, TRUE FROM match_tie mt "
+        "INNER JOIN match_tie mt2 ON mt.matchId = mt2.matchId AND "
+        "mt.playerId < mt2.playerId "
+        "WHERE mt.tournamentId = %s"
+    ),
+    'player_record': (
+        "SELECT * FROM (" + _LEGACY_PLAYER_RECORD + ") v "
+        "WHERE tournamentId = %s"
+    ),
+    'player_opponents': (
+        "SELECT * FROM (" + _LEGACY_OPPONENTS_VIEW + ") v "
+        "WHERE tournamentId = %s"
+    ),
+}
+
+
+def benchmarkPairing(player_count, rounds, method=pairing.GREEDY,
+                     bracket_size=pairing.OPTIMAL_BRACKET_SIZE, seed=0):
+    """Times the pairing engine over a simulated Swiss event.
+
+    Each round the field is sorted like playerStandings(), paired with the
+    given method, and every match is decided by a coin toss.
+
+    Args:
+      player_count: number of players in the event.
+      rounds: number of rounds to pair.
+      method: pairing.GREEDY or pairing.OPTIMAL.
+      bracket_size: bracket size used by the optimal method.
+      seed: seed of the random results.
+
+    Returns:
+      A dict with the seconds spent pairing each round and the number of
+      rematches each round contained.
+    """
+    rng = random.Random(seed)
+    # Counters in the order of the fields of a storage.Standing:
+    # (tournamentId, id, name, wins, losses, ties, matches, omw)
+    records = dict(
+        (i, [1, i, "Player %d" % i, 0, 0, 0, 0, 0])
+        for i in range(1, player_count + 1)
+    )
+    opponents = dict((i, set()) for i in records)
+    byes = set()
+    results = []
+    for round_number in range(1, rounds + 1):
+        players = sorted(
+            (storage.Standing._make(record) for record in records.values()),
+            key=lambda p: (-p.wins, -p.ties, p.id)
+        )
+        start = time.time()
+        if method == pairing.OPTIMAL:
+            pairings, bye = pairing.optimalPairings(
+                players, opponents, byes, bracket_size
+            )
+        else:
+            bye = None
+            if len(players) % 2:
+                for i, player in enumerate(players):
+                    if player.id not in byes:
+                        bye = players.pop(i)
+                        break
+            pairings = pairing.bracketPairings(players, opponents)
+        seconds = time.time() - start
+
+        rematches = 0
+        for (id1, name1, id2, name2) in pairings:
+            if id2 in opponents[id1]:
+                rematches += 1
+            opponents[id1].add(id2)
+            opponents[id2].add(id1)
+            winner, loser = (id1, id2) if rng.random() < 0.5 else (id2, id1)
+            records[winner][3] += 1
+            records[loser][4] += 1
+            records[winner][6] += 1
+            records[loser][6] += 1
+        if bye is not None:
+            byes.add(bye.id)
+            records[bye.id][3] += 1
+            records[bye.id][6] += 1
+        results.append({
+            'round': round_number,
+            'seconds': seconds,
+            'rematches': rematches,
+        })
+    return {
+        'method': method,
+        'players': player_count,
+        'bracket_size': bracket_size,
+        'rounds': results,
+        'max_round_seconds': max(r['seconds'] for r in results),
+        'total_seconds': sum(r['seconds'] for r in results),
+    }
+
+
+def summarize(samples):
+    """Summarises a list of timings in seconds.
+
+    Returns:
+      A dict with the count, total, mean, 50th, 90th and 99th percentiles
+      (nearest rank) and maximum of the samples.
+    """
+    samples = sorted(samples)
+    count = len(samples)
+    if not count:
+        return {'count': 0}
+
+    def percentile(p):
+        return samples[max(0, int(math.ceil(p / 100.0 * count)) - 1)]
+
+    total = sum(samples)
+    return {
+        'count': count,
+        'total': total,
+        'mean': total / count,
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'p99': percentile(99),
+        'max': samples[-1],
+    }
+
+
+def benchmarkSuite(sizes, rounds=None, method=pairing.GREEDY, seed=0):
+    """Times the tournament API over a whole Swiss event of each size.
+
+    Every event registers its players one at a time, then plays its rounds:
+    each round is paired, every match is reported on its own with a coin
+    toss deciding it, and the standings are read. Each event is played in a
+    new tournament of the storage backend in use.
+
+    Args:
+      sizes: numbers of players, one event per size.
+      rounds: number of rounds per event; defaults to the usual Swiss count
+        of log2 of the number of players, rounded up.
+      method: pairing method passed to swissPairings().
+      seed: seed of the random results.
+
+    Returns:
+      A dict with, for each event, percentiles of every operation over the
+      whole event and the timings of every round.
+    """
+    import tournament
+    rng = random.Random(seed)
+    random.seed(seed)
+    events = []
+    for size in sizes:
+        round_count = rounds or max(1, int(math.ceil(math.log(size, 2))))
+        tournament_id = tournament.createTournament()
+        timings = dict((name, []) for name in SUITE_OPERATIONS)
+
+        def timed(name, function, *args, **kwargs):
+            start = time.time()
+            result = function(*args, **kwargs)
+            seconds = time.time() - start
+            timings[name].append(seconds)
+            return result, seconds
+
+        for i in range(size):
+            timed(
+                'registerPlayer', tournament.registerPlayer, "Player %d" % i,
+                tournament_id
+            )
+        round_results = []
+        for round_number in range(1, round_count + 1):
+            pairings, pairing_seconds = timed(
+                'swissPairings', tournament.swissPairings, tournament_id,
+                method
+            )
+            reports = []
+            for (id1, name1, id2, name2) in pairings:
+                winner, loser = (
+                    (id1, id2) if rng.random() < 0.5 else (id2, id1)
+                )
+                reports.append(timed(
+                    'reportMatch', tournament.reportMatch, winner, loser,
+                    False, tournament_id
+                )[1])
+            standings_seconds = timed(
+                'playerStandings', tournament.playerStandings, False,
+                tournament_id
+            )[1]
+            round_results.append({
+                'round': round_number,
+                'swissPairings': pairing_seconds,
+                'reportMatch': summarize(reports),
+                'playerStandings': standings_seconds,
+            })
+        events.append({
+            'players': size,
+            'rounds': round_results,
+            'operations': dict(
+                (name, summarize(timings[name])) for name in SUITE_OPERATIONS
+            ),
+        })
+    return {
+        'backend': type(tournament.getBackend()).__name__,
+        'method': method,
+        'revision': _revision(),
+        'events': events,
+    }
+
+
+def benchmarkStatements(player_count=256, calls=500, dsn=None, seed=0):
+    """Times the calls backed by prepared statements with and without them.
+
+    Each mode plays one round of a new PostgreSQL tournament, warms every
+    operation up past the five custom plans PostgreSQL makes before it
+    considers a generic one, and then times calls of each operation. The
+    statements one call sends are then run again under EXPLAIN (SUMMARY) to
+    read how long the server spends planning them.
+
+    Args:
+      player_count: number of players in each tournament.
+      calls: number of timed calls of each operation.
+      dsn: database to run in; defaults to db.DSN.
+      seed: seed of the players picked for every call.
+
+    Returns:
+      A dict with, for each operation, the client time percentiles and the
+      server planning milliseconds per call of both modes, and the p50 and
+      planning time saved per call.
+    """
+    import db
+    import instrumentation
+    import tournament
+    tournament.setBackend('postgres')
+    modes = {}
+    for prepared in (False, True):
+        db.configurePool(dsn=dsn or db.DSN, prepare_statements=prepared)
+        rng = random.Random(seed)
+        tournament_id = tournament.createTournament()
+        player_ids = tournament.registerPlayers(
+            ["Player %d" % i for i in range(player_count)], tournament_id
+        )
+        tournament.reportMatches([
+            (id1, id2, False) for (id1, name1, id2, name2) in
+            tournament.swissPairings(tournament_id)
+        ], tournament_id)
+
+        def pick():
+            return tuple(rng.sample(player_ids, 2))
+
+        operations = {
+            'havePlayersBeenPaired': lambda: (
+                tournament.havePlayersBeenPaired(*pick())
+            ),
+            'doesPlayerHaveBye': lambda: tournament.doesPlayerHaveBye(
+                pick()[0], tournament_id
+            ),
+            'playerStandings': lambda: tournament.playerStandings(
+                tournament_id=tournament_id, limit=8
+            ),
+            'reportMatch': lambda: tournament.reportMatch(
+                *(pick() + (False, tournament_id))
+            ),
+        }
+        results = {}
+        for name in STATEMENT_OPERATIONS:
+            operation = operations[name]
+            for _ in range(10):
+                operation()
+            samples = []
+            for _ in range(calls):
+                start = time.time()
+                operation()
+                samples.append(time.time() - start)
+            results[name] = {
+                'seconds': summarize(samples),
+                'planning_ms': _planningMilliseconds(
+                    db, instrumentation, operation
+                ),
+            }
+        modes['prepared' if prepared else 'plain'] = results
+    db.configurePool(dsn=dsn or db.DSN)
+
+    savings = {}
+    for name in STATEMENT_OPERATIONS:
+        plain, prepared = modes['plain'][name], modes['prepared'][name]
+        savings[name] = {
+            'p50_seconds': (
+                plain['seconds']['p50'] - prepared['seconds']['p50']
+            ),
+            'planning_ms': plain['planning_ms'] - prepared['planning_ms'],
+        }
+    return {
+        'players': player_count,
+        'calls': calls,
+        'revision': _revision(),
+        'plain': modes['plain'],
+        'prepared': modes['prepared'],
+        'saved_per_call': savings,
+    }
+
+
+def benchmarkResults(player_count=4096, rounds=12, tie_rate=0.1,
+                     tournaments=4, repeat=20, dsn=None, seed=0):
+    """Times the reads aggregating match results, before and after ties
+    moved into match_result.
+
+    Several PostgreSQL tournaments are played so that per-tournament filters
+    matter. The last one is then read both by the current queries and views
+    and by LEGACY_RESULT_QUERIES, in one transaction against a temporary
+    match_tie filled from its tied rows of match_result. Refreshing the
+    standings is compared by the standing rows it leaves.
+
+    Args:
+      player_count: number of players in each tournament.
+      rounds: number of rounds played in each tournament.
+      tie_rate: probability that a match ends in a tie.
+      tournaments: number of tournaments played.
+      repeat: number of timed runs of each query.
+      dsn: database to run in; defaults to db.DSN.
+      seed: seed of the results.
+
+    Returns:
+      A dict with, for each query, the timings of both versions, the ratio
+      of their medians and whether they returned the same rows.
+    """
+    import db
+    import pgstorage
+    import tournament
+    tournament.setBackend('postgres')
+    db.configurePool(dsn=dsn or db.DSN)
+    rng = random.Random(seed)
+    random.seed(seed)
+    for _ in range(tournaments):
+        tournament_id = tournament.createTournament()
+        tournament.registerPlayers(
+            ["Player %d" % i for i in range(player_count)], tournament_id
+        )
+        for _ in range(rounds):
+            tournament.reportMatches([
+                (id1, id2, rng.random() < tie_rate)
+                for (id1, name1, id2, name2) in
+                tournament.swissPairings(tournament_id)
+            ], tournament_id)
+
+    def refreshStandings(c):
+        for statement in pgstorage.refreshStandingsStatements(tournament_id):
+            c.execute(statement.query, statement.parameters)
+
+    current = {
+        'refresh_standings': refreshStandings,
+        'opponents': pgstorage.OPPONENTS_QUERY,
+        'match_results': pgstorage.MATCH_RESULTS_QUERY,
+        'player_record': (
+            "SELECT * FROM player_record WHERE tournamentId = %s"
+        ),
+        'player_opponents': (
+            "SELECT * FROM player_opponents WHERE tournamentId = %s"
+        ),
+    }
+    results = {}
+    with db.get_cursor() as c:
+        c.execute(
+            "CREATE TEMPORARY TABLE match_tie ON COMMIT DROP AS "
+            "SELECT matchId, playerId, tournamentId FROM match_result "
+            "WHERE points = 1"
+        )
+        c.execute("CREATE INDEX ON match_tie (tournamentId)")
+        c.execute("CREATE INDEX ON match_tie (matchId)")
+        c.execute("CREATE INDEX ON match_tie (playerId)")
+        c.execute("ANALYZE match_tie")
+        c.execute("ANALYZE match_result")
+
+        def run(operation):
+            if callable(operation):
+                execute = operation
+            else:
+                def execute(c):
+                    c.execute(
+                        operation,
+                        (tournament_id,) * operation.count('%s')
+                    )
+                    if c.description is not None:
+                        return c.fetchall()
+            samples = []
+            for _ in range(repeat):
+                start = time.time()
+                rows = execute(c)
+                samples.append(time.time() - start)
+            if rows is None:
+                c.execute(
+                    "SELECT * FROM standing WHERE tournamentId = %s",
+                    (tournament_id,)
+                )
+                rows = c.fetchall()
+            return summarize(samples), rows
+
+        for name in RESULT_QUERIES:
+            before, before_rows = run(LEGACY_RESULT_QUERIES[name])
+            after, after_rows = run(current[name])
+            if name == 'opponents':
+                before_rows = _opponentSets(before_rows)
+                after_rows = _opponentSets(after_rows)
+            results[name] = {
+                'before': before,
+                'after': after,
+                'ratio': after['p50'] / before['p50'],
+                'same_rows': sorted(before_rows) == sorted(after_rows),
+            }
+    return {
+        'players': player_count,
+        'rounds': rounds,
+        'tie_rate': tie_rate,
+        'tournaments': tournaments,
+        'revision': _revision(),
+        'queries': results,
+    }
+
+
+def benchmarkBatch(tournament_count=200, player_count=16, rounds=3,
+                   worker_counts=(1, 2, 4), processes=True,
+                   method=pairing.GREEDY, seed=0):
+    """Times round turnovers of many tournaments, serial and in batches.
+
+    For the serial run and for every pool size, a fresh set of tournaments
+    plays its rounds; only pairing every tournament for a round is timed,
+    the results are then reported at random.
+
+    Args:
+      tournament_count: number of tournaments paired each round.
+      player_count: number of players in each tournament.
+      rounds: number of rounds played.
+      worker_counts: sizes of the pools swissPairingsBatch() is run with.
+      processes: pair in worker processes rather than threads.
+      method: pairing method passed to the pairing functions.
+      seed: seed of the results.
+
+    Returns:
+      A dict with the per-round turnover seconds of the serial run and of
+      every pool size, and the speedup of each pool size over serial.
+    """
+    import tournament
+
+    def play(pair):
+        rng = random.Random(seed)
+        tournament_ids = [
+            tournament.createTournament() for _ in range(tournament_count)
+        ]
+        for tournament_id in tournament_ids:
+            tournament.registerPlayers(
+                ["Player %d" % i for i in range(player_count)],
+                tournament_id
+            )
+        samples = []
+        for _ in range(rounds):
+            start = time.time()
+            pairings = pair(tournament_ids)
+            samples.append(time.time() - start)
+            for tournament_id in tournament_ids:
+                tournament.reportMatches([
+                    (id1, id2, False) if rng.random() < 0.5 else
+                    (id2, id1, False)
+                    for (id1, name1, id2, name2) in pairings[tournament_id]
+                ], tournament_id)
+        return summarize(samples)
+
+    def pairSerially(tournament_ids):
+        return dict(
+            (t, tournament.swissPairings(t, method)) for t in tournament_ids
+        )
+
+    def pairInBatch(workers):
+        def pair(tournament_ids):
+            pairings, errors = tournament.swissPairingsBatch(
+                tournament_ids, method, workers, processes
+            )
+            if errors:
+                raise errors.popitem()[1]
+            return pairings
+        return pair
+
+    serial = play(pairSerially)
+    batches = {}
+    for workers in worker_counts:
+        batches[str(workers)] = play(pairInBatch(workers))
+    return {
+        'tournaments': tournament_count,
+        'players': player_count,
+        'rounds': rounds,
+        'processes': processes,
+        'cores': multiprocessing.cpu_count(),
+        'revision': _revision(),
+        'serial': serial,
+        'batch': batches,
+        'speedup': dict(
+            (workers, serial['mean'] / batch['mean'])
+            for workers, batch in batches.items()
+        ),
+    }
+
+
+def _opponentSets(pairs):
+    """Returns the opponents of every player of a list of pairs."""
+    opponents = {}
+    for player1, player2 in pairs:
+        opponents.setdefault(player1, set()).add(player2)
+        opponents.setdefault(player2, set()).add(player1)
+    return opponents
+
+
+def _planningMilliseconds(db, instrumentation, operation, repeat=10):
+    """Returns the server planning time of the statements of one call.
+
+    The statements are captured with an instrumentation hook and each one is
+    explained repeat times on the same connection; the medians are summed.
+    """
+    statements = []
+
+    def capture(fingerprint, query, parameters, seconds):
+        if not query.lstrip().upper().startswith('PREPARE'):
+            statements.append((query, parameters))
+
+    instrumentation.enable(slow_query_seconds=None)
+    instrumentation.addHook(capture)
+    try:
+        operation()
+    finally:
+        instrumentation.removeHook(capture)
+        instrumentation.disable()
+
+    total = 0.0
+    with db.get_cursor() as c:
+        for query, parameters in statements:
+            timings = []
+            for _ in range(repeat):
+                c.execute("EXPLAIN (SUMMARY) " + query, parameters)
+                plan = '\n'.join(row[0] for row in c.fetchall())
+                timings.append(float(_PLANNING_TIME.search(plan).group(1)))
+            total += sorted(timings)[len(timings) // 2]
+    return total
+
+
+def compareSuites(before, after, threshold=1.25):
+    """Compares the operation timings of two benchmarkSuite() results.
+
+    Args:
+      before: result of the baseline run.
+      after: result of the run to check.
+      threshold: ratio of the medians above which an operation counts as a
+        regression.
+
+    Returns:
+      A tuple (rows, regressions): rows is a list of dicts comparing the
+      median and 99th percentile of every operation at every size played by
+      both runs, and regressions is the list of those rows over threshold.
+    """
+    previous = dict((e['players'], e['operations']) for e in before['events'])
+    rows = []
+    for event in after['events']:
+        operations = previous.get(event['players'])
+        if operations is None:
+            continue
+        for name in SUITE_OPERATIONS:
+            old, new = operations.get(name, {}), event['operations'][name]
+            if not old.get('count') or not new.get('count'):
+                continue
+            rows.append({
+                'players': event['players'],
+                'operation': name,
+                'before_p50': old['p50'],
+                'after_p50': new['p50'],
+                'before_p99': old['p99'],
+                'after_p99': new['p99'],
+                'ratio': new['p50'] / old['p50'] if old['p50'] else None,
+            })
+    regressions = [
+        row for row in rows
+        if row['ratio'] is not None and row['ratio'] > threshold
+    ]
+    return rows, regressions
+
+
+def _revision():
+    """Returns the git commit of the benchmarked code, when known."""
+    try:
+        with open(os.devnull, 'w') as devnull:
+            revision = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], stderr=devnull,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision.decode('ascii').strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    commands = parser.add_subparsers(dest='command')
+    # Python 3 makes subcommands optional unless told otherwise.
+    commands.required = True
+
+    pairing_parser = commands.add_parser(
+        'pairing', help="time the pairing engines without a database"
+    )
+    pairing_parser.add_argument('--players', type=int, default=4096)
+    pairing_parser.add_argument('--rounds', type=int, default=6)
+    pairing_parser.add_argument(
+        '--method', choices=[pairing.GREEDY, pairing.OPTIMAL],
+        default=pairing.OPTIMAL
+    )
+    pairing_parser.add_argument(
+        '--bracket-size', type=int, default=pairing.OPTIMAL_BRACKET_SIZE
+    )
+    pairing_parser.add_argument('--seed', type=int, default=0)
+    pairing_parser.add_argument(
+        '--budget', type=float, default=None,
+        help="fail if pairing any round takes longer than this many seconds"
+    )
+
+    suite_parser = commands.add_parser(
+        'suite', help="time every API call over whole events"
+    )
+    suite_parser.add_argument(
+        '--sizes', default='16,64,256,1024',
+        help="comma separated numbers of players, one event each"
+    )
+    suite_parser.add_argument(
+        '--rounds', type=int, default=None,
+        help="rounds per event; defaults to log2 of the number of players"
+    )
+    suite_parser.add_argument(
+        '--method', choices=[pairing.GREEDY, pairing.OPTIMAL],
+        default=pairing.GREEDY
+    )
+    suite_parser.add_argument('--seed', type=int, default=0)
+    suite_parser.add_argument(
+        '--backend', default=None,
+        help="storage backend; defaults to TOURNAMENT_BACKEND or postgres"
+    )
+    suite_parser.add_argument(
+        '--dsn', default=None, help="database to play the events in"
+    )
+    suite_parser.add_argument(
+        '--output', default=None, help="also write the results to this file"
+    )
+
+    compare_parser = commands.add_parser(
+        'compare', help="compare two results of the suite command"
+    )
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help="fail if a median grows by more than this factor"
+    )
+
+    statements_parser = commands.add_parser(
+        'statements', help="measure what prepared statements save per call"
+    )
+    statements_parser.add_argument('--players', type=int, default=256)
+    statements_parser.add_argument('--calls', type=int, default=500)
+    statements_parser.add_argument('--seed', type=int, default=0)
+    statements_parser.add_argument(
+        '--dsn', default=None, help="database to run the calls in"
+    )
+
+    results_parser = commands.add_parser(
+        'results', help="compare the match_result queries with the old ones"
+    )
+    results_parser.add_argument('--players', type=int, default=4096)
+    results_parser.add_argument('--rounds', type=int, default=12)
+    results_parser.add_argument(
+        '--tie-rate', type=float, default=0.1,
+        help="probability that a match ends in a tie"
+    )
+    results_parser.add_argument(
+        '--tournaments', type=int, default=4,
+        help="number of tournaments in the database"
+    )
+    results_parser.add_argument('--repeat', type=int, default=20)
+    results_parser.add_argument('--seed', type=int, default=0)
+    results_parser.add_argument(
+        '--dsn', default=None, help="database to run the queries in"
+    )
+
+    batch_parser = commands.add_parser(
+        'batch', help="time pairing many tournaments serially and in batches"
+    )
+    batch_parser.add_argument('--tournaments', type=int, default=200)
+    batch_parser.add_argument('--players', type=int, default=16)
+    batch_parser.add_argument('--rounds', type=int, default=3)
+    batch_parser.add_argument(
+        '--workers', default='1,2,4',
+        help="comma-separated pool sizes to time"
+    )
+    batch_parser.add_argument(
+        '--threads', action='store_true',
+        help="pair in worker threads rather than processes"
+    )
+    batch_parser.add_argument(
+        '--method', choices=[pairing.GREEDY, pairing.OPTIMAL],
+        default=pairing.GREEDY
+    )
+    batch_parser.add_argument('--seed', type=int, default=0)
+    batch_parser.add_argument(
+        '--backend', default=None,
+        help="storage backend; defaults to TOURNAMENT_BACKEND or postgres"
+    )
+    batch_parser.add_argument(
+        '--dsn', default=None, help="database to pair the tournaments in"
+    )
+
+    concurrency_parser = commands.add_parser(
+        'concurrency', help="compare the asyncio and blocking APIs"
+    )
+    concurrency_parser.add_argument('--events', type=int, default=32)
+    concurrency_parser.add_argument('--players', type=int, default=64)
+    concurrency_parser.add_argument('--rounds', type=int, default=5)
+    concurrency_parser.add_argument('--seed', type=int, default=0)
+    concurrency_parser.add_argument(
+        '--pool-size', type=int, default=10,
+        help="maximum number of pooled connections"
+    )
+    concurrency_parser.add_argument(
+        '--dsn', default=None, help="database to play the events in"
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == 'suite':
+        import tournament
+        if args.backend:
+            tournament.setBackend(args.backend)
+        if args.dsn:
+            tournament.configurePool(dsn=args.dsn)
+        result = benchmarkSuite(
+            [int(size) for size in args.sizes.split(',')], args.rounds,
+            args.method, args.seed
+        )
+        output = json.dumps(result, indent=2, sort_keys=True)
+        print(output)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+        return 0
+    if args.command == 'compare':
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        rows, regressions = compareSuites(before, after, args.threshold)
+        print(json.dumps(
+            {'comparisons': rows, 'regressions': regressions},
+            indent=2, sort_keys=True
+        ))
+        if regressions:
+            sys.stderr.write(
+                "%d operations got slower by more than %.2fx.\n" % (
+                    len(regressions), args.threshold
+                )
+            )
+            return 1
+        return 0
+    if args.command == 'statements':
+        result = benchmarkStatements(
+            args.players, args.calls, args.dsn, args.seed
+        )
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0
+    if args.command == 'results':
+        result = benchmarkResults(
+            args.players, args.rounds, args.tie_rate, args.tournaments,
+            args.repeat, args.dsn, args.seed
+        )
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0
+    if args.command == 'batch':
+        import tournament
+        if args.backend:
+            tournament.setBackend(args.backend)
+        if args.dsn:
+            tournament.configurePool(dsn=args.dsn)
+        result = benchmarkBatch(
+            args.tournaments, args.players, args.rounds,
+            [int(workers) for workers in args.workers.split(',')],
+            not args.threads, args.method, args.seed
+        )
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0
+    if args.command == 'concurrency':
+        import aiobenchmark
+        import db
+        db.configurePool(
+            max_connections=args.pool_size, dsn=args.dsn or db.DSN
+        )
+        result = aiobenchmark.benchmarkConcurrency(
+            args.events, args.players, args.rounds, args.seed
+        )
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0
+
+    result = benchmarkPairing(
+        args.players, args.rounds, args.method, args.bracket_size, args.seed
+    )
+    print(json.dumps(result, indent=2, sort_keys=True))
+    if args.budget is not None and result['max_round_seconds'] > args.budget:
+        sys.stderr.write(
+            "Pairing took %.3fs, over the budget of %.3fs.\n" % (
+                result['max_round_seconds'], args.budget
+            )
+        )
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+"""
+import re
+import threading
+import time
+import instrumentation
+import psycopg2
+from contextlib import contextmanager
+from psycopg2 import pool
+
+DSN = "dbname=tournament"
+
+_config = {
+    'dsn': DSN,
+    'min_connections': 1,
+    'max_connections': 10,
+    'health_check_interval': 30,
+    'prepare_statements': True,
+}
+_pool = None
+_slots = None
+# Pools inherited from the parent of a forked process, see forgetPool().
+_inherited_pools = []
+_last_used = {}
+# connection id -> names of the statements prepared on the connection
+_prepared = {}
+
+_PLACEHOLDER = re.compile(r"%s")
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def connect():
+    """Connect to the PostgreSQL database.  Returns a database connection."""
+    return psycopg2.connect(_config['dsn'])
+
+
+def configurePool(min_connections=1, max_connections=10,
+                  health_check_interval=30, dsn=DSN, prepare_statements=True):
+    """Configures the shared connection pool used by get_cursor().
+
+    Any existing pool is closed; a new one is created lazily on the next
+    checkout.
+
+    Args:
+      min_connections: number of connections opened with the pool.
+      max_connections: upper bound on open connections; callers block until a
+        connection is free once the bound is reached. Connections opened
+        past min_connections stay open once returned, up to this bound.
+      health_check_interval: seconds a connection may sit idle before it is
+        pinged on checkout. 0 pings on every checkout, None never pings.
+      dsn: libpq connection string of the tournament database.
+      prepare_statements: if false, executePrepared() sends its query as
+        plain text every time, e.g. to measure what preparing saves.
+    """
+    if not 0 < min_connections <= max_connections:
+        raise ValueError(
+            "Pool sizes must satisfy 0 < min_connections <= max_connections."
+        )
+    closePool()
+    with _lock:
+        _config.update(
+            dsn=dsn,
+            min_connections=min_connections,
+            max_connections=max_connections,
+            health_check_interval=health_check_interval,
+            prepare_statements=prepare_statements,
+        )
+
+
+def closePool():
+    """Closes every connection held by the shared connection pool."""
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _slots = None
+        _last_used.clear()
+        _prepared.clear()
+
+
+def forgetPool():
+    """Drops the shared pool inherited from the parent of a forked process.
+
+    The inherited connections share their sockets with the parent's, so
+    closing them, which closePool() and configurePool() do, would end the
+    parent's sessions, including ones other threads of the parent are
+    using. They are kept referenced, so they are never closed by garbage
+    collection either, and never used again; the next checkout opens a new
+    pool. The lock is replaced too, since another thread of the parent may
+    have held it while forking.
+    """
+    global _pool, _slots, _lock, _local
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _slots = None
+    _lock = threading.Lock()
+    _local = threading.local()
+    _last_used.clear()
+    _prepared.clear()
+
+
+def poolSize():
+    """Returns the maximum number of connections the shared pool opens."""
+    return _config['max_connections']
+
+
+def poolDsn():
+    """Returns the connection string of the database the shared pool uses."""
+    return _config['dsn']
+
+
+class _ConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool keeping every returned connection open.
+
+    psycopg2 closes a returned connection once minconn connections are
+    idle, so concurrent callers would reconnect on almost every call.
+    minconn only sizes the connections opened up front; afterwards up to
+    maxconn are kept.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        pool.ThreadedConnectionPool.__init__(
+            self, minconn, maxconn, *args, **kwargs
+        )
+        self.minconn = maxconn
+
+
+def getPool():
+    """Returns the shared connection pool, creating it if necessary."""
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            _pool = _ConnectionPool(
+                _config['min_connections'], _config['max_connections'],
+                _config['dsn']
+            )
+            _slots = threading.BoundedSemaphore(_config['max_connections'])
+        return _pool
+
+
+def _isHealthy(conn):
+    """Determine if a pooled connection is still usable.
+
+    Connections idle for longer than the configured health check interval
+    are pinged with a trivial query before being handed out.
+    """
+    if conn.closed:
+        return False
+    interval = _config['health_check_interval']
+    last_used = _last_used.get(id(conn))
+    if interval is None or last_used is None:
+        return True
+    if time.time() - last_used < interval:
+        return True
+    try:
+        c = conn.cursor()
+        c.execute("SELECT 1")
+        c.close()
+        conn.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _checkout():
+    """Borrows a healthy connection from the pool, blocking while all
+    connections are in use."""
+    connection_pool = getPool()
+    slots = _slots
+    slots.acquire()
+    try:
+        for _ in range(_config['max_connections'] + 1):
+            conn = connection_pool.getconn()
+            if _isHealthy(conn):
+                return connection_pool, slots, conn
+            _forget(conn)
+            connection_pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError(
+            "Unable to obtain a healthy database connection."
+        )
+    except:
+        slots.release()
+        raise
+
+
+def _checkin(connection_pool, slots, conn):
+    """Returns a borrowed connection to the pool it came from."""
+    if not conn.closed:
+        _last_used[id(conn)] = time.time()
+    try:
+        connection_pool.putconn(conn, close=bool(conn.closed))
+    except pool.PoolError:
+        # The pool was closed or reconfigured while the connection was out.
+        conn.close()
+    finally:
+        # The pool also closes connections returned beyond its minimum.
+        if conn.closed:
+            _forget(conn)
+        slots.release()
+
+
+def _forget(conn):
+    """Drops what is remembered about a connection that is being closed."""
+    _last_used.pop(id(conn), None)
+    _prepared.pop(id(conn), None)
+
+
+@contextmanager
+def get_cursor(name=None):
+    """Returns a context manager that will handle our database connection.
+
+    Connections are borrowed from the shared pool instead of being opened on
+    every call. Nested calls on the same thread reuse the outer connection and
+    join its transaction; only the outermost call commits or rolls back.
+
+    Checkouts and statements are measured while instrumentation is enabled,
+    see instrumentation.py.
+
+    Args:
+      name: name of a server-side cursor to open instead of a client-side
+        one; its rows are fetched from the server itersize at a time while
+        being iterated. The name must be unique within the connection.
+        A server-side cursor always gets a connection of its own, even
+        inside another call, and no other call joins its transaction, so a
+        paused stream can be resumed or closed from any thread without
+        affecting writes made meanwhile.
+    """
+    if name is None:
+        conn = getattr(_local, 'conn', None)
+        if conn is not None:
+            c = conn.cursor(cursor_factory=instrumentation.cursorFactory())
+            try:
+                yield c
+            finally:
+                c.close()
+            return
+
+    start = time.time()
+    connection_pool, slots, conn = _checkout()
+    instrumentation.recordConnection(time.time() - start)
+    if name is None:
+        _local.conn = conn
+    try:
+        with _transaction(conn, name) as c:
+            yield c
+    finally:
+        if name is None:
+            _local.conn = None
+        _checkin(connection_pool, slots, conn)
+
+
+@contextmanager
+def _transaction(conn, name):
+    """Runs the body in a transaction of conn, committing unless it raises.
+
+    Args:
+      conn: a connection checked out by get_cursor().
+      name: name of a server-side cursor, or None for a client-side one.
+    """
+    c = conn.cursor(name, cursor_factory=instrumentation.cursorFactory())
+    try:
+        # Server-side cursors only live as long as the transaction, so the
+        # cursor is closed before the transaction ends.
+        try:
+            yield c
+        finally:
+            c.close()
+    except:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+def executePrepared(c, name, query, parameters=()):
+    """Executes a query through a statement prepared once per connection.
+
+    The first call for a name on a pooled connection sends PREPARE; later
+    calls on the same connection only send EXECUTE and the parameters, so
+    the server does not parse the query again and, once it has settled on
+    a generic plan, does not plan it again either. Prepared statements
+    survive rolled back transactions and last until their connection is
+    closed. The pool closes connections returned beyond min_connections, so
+    set min_connections to the usual number of concurrent callers to keep
+    their statements prepared.
+
+    Args:
+      c: a cursor from get_cursor().
+      name: SQL identifier of the statement; each query needs its own name.
+      query: the query, with a %s placeholder for each parameter.
+      parameters: a sequence of the query's parameters.
+    """
+    if not _config['prepare_statements']:
+        c.execute(query, parameters)
+        return
+    prepared = _prepared.setdefault(id(c.connection), set())
+    if name not in prepared:
+        numbers = iter(range(1, len(parameters) + 1))
+        c.execute("PREPARE %s AS %s" % (
+            name, _PLACEHOLDER.sub(lambda m: '$%d' % next(numbers), query)
+        ))
+        prepared.add(name)
+    if parameters:
+        c.execute(
+            "EXECUTE %s (%s)" % (name, ", ".join(["%s"] * len(parameters))),
+            parameters
+        )
+    else:
+        c.execute("EXECUTE %s" % name)
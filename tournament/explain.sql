@@ -0,0 +1,32 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Prints the plans of the hot per-tournament queries so that index use can be
+-- checked against a populated database, e.g.:
+--   psql tournament -v tournament=1 -v player=1 -v opponent=2 -f explain.sql
+-- On a nearly empty database the planner may still prefer sequential scans.
+
+-- playerStandings()
+EXPLAIN SELECT * FROM player_standing WHERE tournamentId = :tournament;
+
+-- playerOpponents()
+EXPLAIN SELECT player1, player2 FROM opponent_pair
+WHERE tournamentId = :tournament;
+
+-- havePlayersBeenPaired(), with :player below :opponent
+EXPLAIN SELECT EXISTS (SELECT 1 FROM opponent_pair
+    WHERE tournamentId = (SELECT tournamentId FROM player WHERE id = :player)
+    AND player1 = :player AND player2 = :opponent);
+
+-- The OMW bookkeeping in reportMatch()
+EXPLAIN SELECT opponentId FROM match_result
+WHERE playerId = :player AND opponentId IS NOT NULL;
+
+-- doesPlayerHaveBye()
+EXPLAIN SELECT * FROM player_bye WHERE tournamentId = :tournament AND
+    winnerId = :player;
+
+-- Ad hoc per-tournament reads of the aggregating views
+EXPLAIN SELECT * FROM player_record WHERE tournamentId = :tournament;
+EXPLAIN SELECT * FROM player_opponents WHERE tournamentId = :tournament;
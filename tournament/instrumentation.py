@@ -0,0 +1,335 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Instrumentation of the connections and statements of db.get_cursor().
+
+Nothing is measured until enable() is called. From then on every connection
+checkout and every statement run through get_cursor() is counted and timed:
+  - track() measures what a block of code costs on the current thread
+  - statistics() and prometheusText() return totals and per-query timing
+    histograms since the last resetStatistics()
+  - statements slower than the configured threshold are logged with their
+    parameters to the 'tournament.sql' logger
+  - hooks added with addHook(), such as StatsdHook, see every statement
+
+Queries are grouped by fingerprint: their text with literals replaced by ?,
+so statements built by execute_values() share one entry.
+"""
+import hashlib
+import logging
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2.extensions
+
+logger = logging.getLogger('tournament.sql')
+
+# Upper bounds in seconds of the statement timing histogram buckets.
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_config = {
+    'enabled': False,
+    'slow_query_seconds': 0.1,
+}
+_hooks = []
+_lock = threading.Lock()
+_local = threading.local()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_VALUE_TUPLE = r"\((?:[?, ]|NULL|true|false)*\)"
+_VALUES_LIST = re.compile(_VALUE_TUPLE + r"(?:\s*,\s*" + _VALUE_TUPLE + ")+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _newStatistics():
+    """Returns empty counters and histograms."""
+    return {
+        'connections': 0,
+        'connection_wait_seconds': 0.0,
+        'statements': 0,
+        'statement_seconds': 0.0,
+        'queries': {},
+    }
+
+_statistics = _newStatistics()
+
+
+def enable(slow_query_seconds=0.1):
+    """Starts instrumenting connections and statements.
+
+    Args:
+      slow_query_seconds: statements taking at least this long are logged
+        with their parameters; None logs none.
+    """
+    with _lock:
+        _config.update(enabled=True, slow_query_seconds=slow_query_seconds)
+
+
+def disable():
+    """Stops instrumenting; statistics gathered so far are kept."""
+    with _lock:
+        _config['enabled'] = False
+
+
+def isEnabled():
+    """Returns True if connections and statements are being instrumented."""
+    return _config['enabled']
+
+
+def addHook(hook):
+    """Calls hook(fingerprint, query, parameters, seconds) after every
+    instrumented statement."""
+    with _lock:
+        _hooks.append(hook)
+
+
+def removeHook(hook):
+    """Stops calling a hook added with addHook()."""
+    with _lock:
+        _hooks.remove(hook)
+
+
+def fingerprint(query):
+    """Returns the text of a query with its literals replaced by ?."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    query = _STRING_LITERAL.sub('?', query)
+    query = _NUMBER_LITERAL.sub('?', query)
+    query = _VALUES_LIST.sub('(...)', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+def queryId(query_fingerprint):
+    """Returns a short stable id of a query fingerprint, usable in metric
+    names."""
+    return hashlib.md5(query_fingerprint.encode('utf-8')).hexdigest()[:8]
+
+
+@contextmanager
+def track():
+    """Measures the connections and statements used by a block of code.
+
+    Only work done on the current thread is counted, and only while
+    instrumentation is enabled. Blocks may be nested.
+
+    Yields:
+      A dict that is filled in as the block runs:
+        connections: number of connections checked out of the pool
+        connection_wait_seconds: time spent waiting for a free connection
+        statements: number of statements executed
+        statement_seconds: time spent executing them
+        queries: a list of (fingerprint, seconds) of every statement
+    """
+    usage = {
+        'connections': 0,
+        'connection_wait_seconds': 0.0,
+        'statements': 0,
+        'statement_seconds': 0.0,
+        'queries': [],
+    }
+    trackers = getattr(_local, 'trackers', None)
+    if trackers is None:
+        trackers = _local.trackers = []
+    trackers.append(usage)
+    try:
+        yield usage
+    finally:
+        trackers.pop()
+
+
+def resetStatistics():
+    """Forgets all counters and histograms."""
+    global _statistics
+    with _lock:
+        _statistics = _newStatistics()
+
+
+def resetAfterFork():
+    """Starts a forked process with empty counters and a lock of its own.
+
+    Another thread of the parent may have held the lock while forking, in
+    which case the copy inherited by the child would never be released.
+    """
+    global _lock, _local, _statistics
+    _lock = threading.Lock()
+    _local = threading.local()
+    _statistics = _newStatistics()
+
+
+def statistics():
+    """Returns a copy of the counters and histograms gathered so far.
+
+    Returns:
+      A dict with the totals of connections, connection_wait_seconds,
+      statements and statement_seconds, and a queries dict mapping every
+      fingerprint to its count, total seconds, max seconds and histogram
+      bucket counts (not cumulative, the last bucket being +Inf).
+    """
+    with _lock:
+        copy = dict(_statistics)
+        copy['queries'] = dict(
+            (query, dict(entry, buckets=list(entry['buckets'])))
+            for query, entry in _statistics['queries'].items()
+        )
+    return copy
+
+
+def prometheusText():
+    """Returns the statistics in the Prometheus text exposition format."""
+    current = statistics()
+    lines = [
+        "# HELP tournament_db_connections_total Connections checked out of "
+        "the pool.",
+        "# TYPE tournament_db_connections_total counter",
+        "tournament_db_connections_total %d" % current['connections'],
+        "# HELP tournament_db_connection_wait_seconds_total Time spent "
+        "waiting for a pooled connection.",
+        "# TYPE tournament_db_connection_wait_seconds_total counter",
+        "tournament_db_connection_wait_seconds_total %r" %
+        current['connection_wait_seconds'],
+        "# HELP tournament_db_statement_seconds Time spent executing "
+        "statements.",
+        "# TYPE tournament_db_statement_seconds histogram",
+    ]
+    for query in sorted(current['queries']):
+        entry = current['queries'][query]
+        labels = 'query_id="%s",query="%s"' % (
+            queryId(query),
+            query.replace('\\', '\\\\').replace('"', '\\"')
+        )
+        cumulative = 0
+        bounds = [repr(b) for b in HISTOGRAM_BUCKETS] + ['+Inf']
+        for bound, count in zip(bounds, entry['buckets']):
+            cumulative += count
+            lines.append(
+                'tournament_db_statement_seconds_bucket{%s,le="%s"} %d' % (
+                    labels, bound, cumulative
+                )
+            )
+        lines.append('tournament_db_statement_seconds_sum{%s} %r' % (
+            labels, entry['seconds']
+        ))
+        lines.append('tournament_db_statement_seconds_count{%s} %d' % (
+            labels, entry['count']
+        ))
+    return '\n'.join(lines) + '\n'
+
+
+class StatsdHook(object):
+    """Statement hook sending StatsD metrics over UDP.
+
+    For every statement it sends a counter and a timer named after the
+    query's id, e.g. tournament.sql.3fa2c1d0.count and
+    tournament.sql.3fa2c1d0.time. Send errors are ignored so that metrics
+    never break a request.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='tournament.sql'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, query_fingerprint, query, parameters, seconds):
+        name = '%s.%s' % (self.prefix, queryId(query_fingerprint))
+        payload = '%s.count:1|c\n%s.time:%.3f|ms' % (
+            name, name, seconds * 1000
+        )
+        try:
+            self.socket.sendto(payload.encode('ascii'), self.address)
+        except socket.error:
+            pass
+
+    def close(self):
+        self.socket.close()
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor timing every statement it executes."""
+
+    def execute(self, query, vars=None):
+        start = time.time()
+        try:
+            return super(InstrumentedCursor, self).execute(query, vars)
+        finally:
+            recordStatement(query, vars, time.time() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.time()
+        try:
+            return super(InstrumentedCursor, self).executemany(
+                query, vars_list
+            )
+        finally:
+            recordStatement(query, None, time.time() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.time()
+        try:
+            return super(InstrumentedCursor, self).copy_expert(
+                sql, file, size
+            )
+        finally:
+            recordStatement(sql, None, time.time() - start)
+
+
+def cursorFactory():
+    """Returns the cursor class get_cursor() should use, or None for the
+    default one."""
+    return InstrumentedCursor if _config['enabled'] else None
+
+
+def recordConnection(wait_seconds):
+    """Counts a connection checkout that waited wait_seconds for the pool."""
+    if not _config['enabled']:
+        return
+    with _lock:
+        _statistics['connections'] += 1
+        _statistics['connection_wait_seconds'] += wait_seconds
+    for usage in getattr(_local, 'trackers', ()):
+        usage['connections'] += 1
+        usage['connection_wait_seconds'] += wait_seconds
+
+
+def recordStatement(query, parameters, seconds):
+    """Counts and times a statement, logs it if slow and calls the hooks."""
+    query_fingerprint = fingerprint(query)
+    bucket = len(HISTOGRAM_BUCKETS)
+    for i, bound in enumerate(HISTOGRAM_BUCKETS):
+        if seconds <= bound:
+            bucket = i
+            break
+    with _lock:
+        _statistics['statements'] += 1
+        _statistics['statement_seconds'] += seconds
+        entry = _statistics['queries'].get(query_fingerprint)
+        if entry is None:
+            entry = _statistics['queries'][query_fingerprint] = {
+                'count': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'buckets': [0] * (len(HISTOGRAM_BUCKETS) + 1),
+            }
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        entry['max_seconds'] = max(entry['max_seconds'], seconds)
+        entry['buckets'][bucket] += 1
+        hooks = list(_hooks)
+    for usage in getattr(_local, 'trackers', ()):
+        usage['statements'] += 1
+        usage['statement_seconds'] += seconds
+        usage['queries'].append((query_fingerprint, seconds))
+
+    threshold = _config['slow_query_seconds']
+    if threshold is not None and seconds >= threshold:
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        logger.warning(
+            "Slow query %s (%.1f ms): %s; parameters: %r",
+            queryId(query_fingerprint), seconds * 1000, query, parameters
+        )
+    for hook in hooks:
+        hook(query_fingerprint, query, parameters, seconds)
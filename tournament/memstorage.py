@@ -0,0 +1,391 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+In-memory storage backend. Everything lives in Python dicts of the current
+process, so it needs no database and is gone when the process exits; meant
+for simulations and for running the tests without PostgreSQL.
+"""
+import itertools
+import threading
+import storage
+
+
+class _Record(object):
+    """Standing counters of one player, without a per-instance dict."""
+
+    __slots__ = ('wins', 'losses', 'ties', 'matches', 'omw', 'byes')
+
+    def __init__(self):
+        self.wins = self.losses = self.ties = 0
+        self.matches = self.omw = self.byes = 0
+
+
+class MemoryBackend(storage.Backend):
+    """Stores tournaments in dicts indexed the way the API reads them.
+
+    Standings are kept up to date on every report, the same way the standing
+    table is by the PostgreSQL backend, so reads only sort. All methods are
+    safe to call from several threads; a tournament's lock is always taken
+    before the lock guarding the dicts.
+    """
+
+    process_local = True
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # tournament id -> lock held by lockTournament()
+        self._tournament_locks = {}
+        self._tournaments = []
+        self._next_tournament_id = 1
+        # tournament id -> result version, from a counter never restarted
+        self._result_versions = {}
+        self._version_counter = itertools.count(1)
+        self._clearPlayers()
+
+    def _clearPlayers(self):
+        """Forgets every player and match and restarts their ids."""
+        # player id -> (tournamentId, name)
+        self._players = {}
+        # tournament id -> {player id -> _Record}
+        self._standings = dict((t, {}) for t in self._tournaments)
+        self._next_player_id = 1
+        self._clearMatches()
+
+    def _clearMatches(self):
+        """Forgets every match and restarts the match ids."""
+        # match id -> (tournamentId, winnerId, loserId, isTie)
+        self._matches = {}
+        # match id -> (playerId, playerId) of a tied match
+        self._ties = {}
+        # player id -> set of ids of the players they have faced
+        self._opponents = {}
+        # tournament id -> list of MatchEvent
+        self._events = {}
+        # tournament id -> {round -> {player id -> (wins, losses, ties,
+        # matches, omw)}}
+        self._snapshots = {}
+        self._next_match_id = 1
+        self._next_event_id = 1
+
+    def _bumpVersion(self, tournament_ids):
+        """Gives tournaments a new result version; the lock must be held."""
+        for tournament_id in tournament_ids:
+            self._result_versions[tournament_id] = next(self._version_counter)
+
+    def deleteMatches(self):
+        with self._lock:
+            self._clearMatches()
+            for records in self._standings.values():
+                for player_id in records:
+                    records[player_id] = _Record()
+            self._bumpVersion(self._tournaments)
+
+    def deletePlayers(self):
+        with self._lock:
+            self._clearPlayers()
+            self._bumpVersion(self._tournaments)
+
+    def deleteTournaments(self):
+        with self._lock:
+            self._tournaments = []
+            self._next_tournament_id = 1
+            self._result_versions.clear()
+            self._clearPlayers()
+
+    def countPlayers(self):
+        with self._lock:
+            return len(self._players)
+
+    def createTournament(self):
+        with self._lock:
+            tournament_id = self._next_tournament_id
+            self._next_tournament_id += 1
+            self._tournaments.append(tournament_id)
+            self._standings[tournament_id] = {}
+            self._bumpVersion([tournament_id])
+        return tournament_id
+
+    def latestTournamentId(self):
+        with self._lock:
+            return self._tournaments[-1] if self._tournaments else None
+
+    def resultVersion(self, tournament_id):
+        with self._lock:
+            return self._result_versions.get(tournament_id)
+
+    def registerPlayer(self, tournament_id, name):
+        return self.registerPlayers(tournament_id, [name])[0]
+
+    def registerPlayers(self, tournament_id, names):
+        with self._lock:
+            records = self._tournamentStandings(tournament_id)
+            player_ids = list(range(
+                self._next_player_id, self._next_player_id + len(names)
+            ))
+            self._next_player_id += len(names)
+            for player_id, name in zip(player_ids, names):
+                self._players[player_id] = (tournament_id, name)
+                records[player_id] = _Record()
+            self._bumpVersion([tournament_id])
+        return player_ids
+
+    def playerStandings(self, tournament_id, limit=None, offset=0):
+        with self._lock:
+            rows = [
+                storage.Standing(
+                    tournament_id, player_id, self._players[player_id][1],
+                    record.wins, record.losses, record.ties, record.matches,
+                    record.omw
+                )
+                for player_id, record in
+                self._standings.get(tournament_id, {}).items()
+            ]
+        rows.sort(key=lambda p: (-p.wins, -p.ties, -p.omw, p.id))
+        stop = None if limit is None else offset + limit
+        return rows[offset:stop]
+
+    def iterPlayerStandings(self, tournament_id,
+                            batch_size=storage.STANDINGS_BATCH_SIZE):
+        """Yields from a sorted copy; the standings are in memory anyway."""
+        for row in self.playerStandings(tournament_id):
+            yield row
+
+    def lockTournament(self, tournament_id):
+        with self._lock:
+            lock = self._tournament_locks.get(tournament_id)
+            if lock is None:
+                lock = self._tournament_locks[tournament_id] = (
+                    threading.RLock()
+                )
+        return lock
+
+    def reportMatch(self, tournament_id, winner, loser, is_tie):
+        with self.lockTournament(tournament_id), self._lock:
+            records = self._tournamentStandings(tournament_id)
+            storage.validateResults([(winner, loser, is_tie)], records)
+            self._recordMatch(tournament_id, records, winner, loser, is_tie)
+            self._bumpVersion([tournament_id])
+
+    def reportMatches(self, tournament_id, results):
+        with self.lockTournament(tournament_id), self._lock:
+            records = self._tournamentStandings(tournament_id)
+            storage.validateResults(results, records)
+            for winner, loser, is_tie in results:
+                self._recordMatch(
+                    tournament_id, records, winner, loser, is_tie
+                )
+            self._bumpVersion([tournament_id])
+
+    def _tournamentStandings(self, tournament_id):
+        """Returns the standing records of a tournament by player id.
+
+        Raises:
+          ValueError: if there is no tournament with that id.
+        """
+        try:
+            return self._standings[tournament_id]
+        except KeyError:
+            raise ValueError("There is no tournament %r." % (tournament_id,))
+
+    def _recordMatch(self, tournament_id, records, winner, loser, is_tie):
+        """Stores a match, applies it to the standings and logs it."""
+        match_id = self._next_match_id
+        self._next_match_id += 1
+        if is_tie:
+            self._matches[match_id] = (tournament_id, None, None, True)
+            self._ties[match_id] = (winner, loser)
+        else:
+            self._matches[match_id] = (tournament_id, winner, loser, False)
+        self._applyMatch(records, winner, loser, is_tie)
+
+        # The match's round is the larger match count of its players.
+        round_number = records[winner].matches
+        if loser is not None:
+            round_number = max(round_number, records[loser].matches)
+        self._appendEvent(
+            tournament_id, round_number, match_id, winner, loser, is_tie,
+            False
+        )
+
+    def _appendEvent(self, tournament_id, round_number, match_id, winner,
+                     loser, is_tie, is_correction):
+        """Appends an entry to the match log of a tournament."""
+        self._events.setdefault(tournament_id, []).append(storage.MatchEvent(
+            self._next_event_id, round_number, match_id, winner, loser,
+            bool(is_tie), is_correction
+        ))
+        self._next_event_id += 1
+
+    def _applyMatch(self, records, winner, loser, is_tie):
+        """Applies a match to the standing records of its tournament.
+
+        OMW is maintained incrementally like the standing table of the
+        PostgreSQL backend: the new match points are added to the OMW of
+        everyone the players have already faced, and on a first meeting each
+        player's OMW also gains the other's match points.
+        """
+        winner_record = records[winner]
+        if loser is None:
+            winner_record.wins += 1
+            winner_record.byes += 1
+            scored = [(winner, 4)]
+        else:
+            loser_record = records[loser]
+            if is_tie:
+                winner_record.ties += 1
+                loser_record.ties += 1
+                scored = [(winner, 1), (loser, 1)]
+            else:
+                winner_record.wins += 1
+                loser_record.losses += 1
+                scored = [(winner, 4)]
+            loser_record.matches += 1
+        winner_record.matches += 1
+
+        is_first_meeting = (
+            loser is not None and
+            loser not in self._opponents.get(winner, ())
+        )
+        for player, points in scored:
+            for opponent in self._opponents.get(player, ()):
+                records[opponent].omw += points
+        if is_first_meeting:
+            winner_record.omw += loser_record.wins * 4 + loser_record.ties
+            loser_record.omw += winner_record.wins * 4 + winner_record.ties
+            self._opponents.setdefault(winner, set()).add(loser)
+            self._opponents.setdefault(loser, set()).add(winner)
+
+    def matchResults(self, tournament_id):
+        with self._lock:
+            return [
+                self._ties[match_id] + (True,) if is_tie else
+                (winner, loser, False)
+                for match_id, (match_tournament_id, winner, loser, is_tie) in
+                self._matches.items()
+                if match_tournament_id == tournament_id
+            ]
+
+    def matchEvents(self, tournament_id):
+        with self._lock:
+            return list(self._events.get(tournament_id, ()))
+
+    def correctMatch(self, tournament_id, winner, loser, is_tie):
+        """Rewrites the stored match, then rebuilds the tournament's records
+        and opponents by applying its matches again in order."""
+        with self.lockTournament(tournament_id), self._lock:
+            records = self._tournamentStandings(tournament_id)
+            storage.validateCorrection(winner, loser, is_tie, records)
+            pair = set((winner, loser))
+            for event in reversed(self._events.get(tournament_id, ())):
+                if set((event.winnerId, event.loserId)) == pair:
+                    break
+            else:
+                raise ValueError(
+                    "Players %r and %r have not played each other in the "
+                    "tournament." % (winner, loser)
+                )
+            self._appendEvent(
+                tournament_id, event.round, event.matchId, winner, loser,
+                is_tie, True
+            )
+            self._ties.pop(event.matchId, None)
+            if is_tie:
+                self._matches[event.matchId] = (
+                    tournament_id, None, None, True
+                )
+                self._ties[event.matchId] = (winner, loser)
+            else:
+                self._matches[event.matchId] = (
+                    tournament_id, winner, loser, False
+                )
+            snapshots = self._snapshots.get(tournament_id, {})
+            for round_number in list(snapshots):
+                if round_number >= event.round:
+                    del snapshots[round_number]
+
+            for player_id in records:
+                records[player_id] = _Record()
+                self._opponents.pop(player_id, None)
+            for match_id in sorted(self._matches):
+                match_tournament_id, match_winner, match_loser, match_tie = (
+                    self._matches[match_id]
+                )
+                if match_tournament_id != tournament_id:
+                    continue
+                if match_tie:
+                    match_winner, match_loser = self._ties[match_id]
+                self._applyMatch(records, match_winner, match_loser, match_tie)
+            self._bumpVersion([tournament_id])
+
+    def snapshotStandings(self, tournament_id, round_number):
+        with self._lock:
+            snapshots = self._snapshots.setdefault(tournament_id, {})
+            if round_number not in snapshots:
+                snapshots[round_number] = dict(
+                    (player_id, (record.wins, record.losses, record.ties,
+                                 record.matches, record.omw))
+                    for player_id, record in
+                    self._tournamentStandings(tournament_id).items()
+                )
+
+    def standingsAfterRound(self, tournament_id, round_number):
+        with self._lock:
+            names = dict(
+                (player_id, self._players[player_id][1])
+                for player_id in self._tournamentStandings(tournament_id)
+            )
+            snapshots = self._snapshots.get(tournament_id, {})
+            snapshot = snapshots.get(round_number)
+            if snapshot is not None:
+                rows = [
+                    storage.Standing(
+                        tournament_id, player_id, names[player_id],
+                        *snapshot[player_id]
+                    )
+                    for player_id in snapshot
+                ]
+                rows.sort(key=lambda p: (-p.wins, -p.ties, -p.omw, p.id))
+                return rows
+            earlier = [r for r in snapshots if r < round_number]
+            snapshot_round = max(earlier) if earlier else 0
+            snapshot = snapshots.get(snapshot_round, {})
+            # The latest event of every match up to the round is its result.
+            latest = {}
+            for event in self._events.get(tournament_id, ()):
+                if event.round <= round_number:
+                    latest[event.matchId] = event
+        return storage.replayStandings(
+            tournament_id, names,
+            dict((player_id, counts[:4])
+                 for player_id, counts in snapshot.items()),
+            [(e.winnerId, e.loserId, e.isTie) for e in latest.values()
+             if e.round > snapshot_round],
+            [(e.winnerId, e.loserId) for e in latest.values()
+             if e.loserId is not None]
+        )
+
+    def playersWithBye(self, tournament_id):
+        with self._lock:
+            return set(
+                player_id for player_id, record in
+                self._standings.get(tournament_id, {}).items()
+                if record.byes > 0
+            )
+
+    def doesPlayerHaveBye(self, tournament_id, player):
+        with self._lock:
+            record = self._standings.get(tournament_id, {}).get(player)
+            return record is not None and record.byes > 0
+
+    def havePlayersBeenPaired(self, player1, player2):
+        with self._lock:
+            return player2 in self._opponents.get(player1, ())
+
+    def playerOpponents(self, tournament_id):
+        with self._lock:
+            return dict(
+                (player_id, set(self._opponents[player_id]))
+                for player_id in self._standings.get(tournament_id, {})
+                if player_id in self._opponents
+            )
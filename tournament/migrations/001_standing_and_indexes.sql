@@ -0,0 +1,97 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Upgrades a database created by the original tournament.sql to the schema
+-- with the standing table, the tournament-scoped views and the indexes.
+-- Run once from psql: \i migrations/001_standing_and_indexes.sql
+BEGIN;
+
+-- Ties carry their tournament so that they can be filtered without a join
+ALTER TABLE match_tie ADD COLUMN tournamentId integer REFERENCES tournament(id);
+UPDATE match_tie mt SET tournamentId = m.tournamentId
+    FROM match m
+    WHERE mt.matchId = m.id;
+
+-- Standings table, backfilled from the old aggregating player_standing view
+CREATE TABLE standing (
+    playerId integer PRIMARY KEY REFERENCES player(id),
+    tournamentId integer REFERENCES tournament(id),
+    wins integer NOT NULL DEFAULT 0,
+    losses integer NOT NULL DEFAULT 0,
+    ties integer NOT NULL DEFAULT 0,
+    matches integer NOT NULL DEFAULT 0,
+    omw integer NOT NULL DEFAULT 0
+);
+INSERT INTO standing (playerId, tournamentId, wins, losses, ties, matches, omw)
+    SELECT id, tournamentId, wins, losses, ties, matches, omw
+    FROM player_standing;
+DROP VIEW player_standing;
+
+-- Index definitions
+CREATE INDEX standing_rank_idx
+    ON standing (tournamentId, wins DESC, ties DESC, omw DESC);
+CREATE INDEX player_tournament_idx ON player (tournamentId);
+CREATE INDEX match_tournament_idx ON match (tournamentId);
+CREATE INDEX match_winner_idx ON match (winnerId);
+CREATE INDEX match_loser_idx ON match (loserId);
+CREATE INDEX match_bye_idx ON match (tournamentId, winnerId)
+    WHERE winnerId IS NOT NULL AND loserId IS NULL;
+CREATE INDEX match_tie_tournament_idx ON match_tie (tournamentId);
+CREATE INDEX match_tie_match_idx ON match_tie (matchId);
+CREATE INDEX match_tie_player_idx ON match_tie (playerId);
+
+-- View definitions
+-- The subqueries group by tournamentId and are joined on it, so a filter on
+-- the tournament is pushed down into them instead of aggregating every match.
+CREATE OR REPLACE VIEW player_record AS (
+    SELECT 
+        p.tournamentId,
+        p.id, 
+        p.name,
+        COALESCE(w.wins, 0) wins,
+        COALESCE(l.losses, 0) losses,
+        COALESCE(t.ties, 0) ties,
+        COALESCE(w.wins, 0) + COALESCE(l.losses, 0) + COALESCE(t.ties, 0) matches
+    FROM player p
+        LEFT JOIN (SELECT tournamentId, winnerId, COUNT(winnerId) wins
+            FROM match
+            GROUP BY tournamentId, winnerId
+        ) w ON p.tournamentId = w.tournamentId AND p.id = w.winnerId
+        LEFT JOIN (SELECT tournamentId, loserId, COUNT(loserId) losses
+            FROM match
+            GROUP BY tournamentId, loserId
+        ) l ON p.tournamentId = l.tournamentId AND p.id = l.loserId
+        LEFT JOIN (SELECT tournamentId, playerId, COUNT(playerId) ties
+            FROM match_tie
+            GROUP BY tournamentId, playerId
+        ) t ON p.tournamentId = t.tournamentId AND p.id = t.playerId
+);
+CREATE OR REPLACE VIEW player_opponents AS (
+    SELECT p.tournamentId, p.id, p.name, m.loserId opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
+    FROM player p
+        INNER JOIN match m ON p.tournamentId = m.tournamentId AND p.id = m.winnerId
+        INNER JOIN player_record pr ON p.tournamentId = pr.tournamentId AND m.loserId = pr.id
+    WHERE m.loserId IS NOT NULL
+    UNION
+    SELECT p.tournamentId, p.id, p.name, m.winnerId opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
+    FROM player p
+        INNER JOIN match m ON p.tournamentId = m.tournamentId AND p.id = m.loserId
+        INNER JOIN player_record pr ON p.tournamentId = pr.tournamentId AND m.winnerId = pr.id
+    WHERE m.winnerId IS NOT NULL
+    UNION
+    SELECT p.tournamentId, p.id, p.name, mt2.playerId opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
+    FROM player p 
+        INNER JOIN match_tie mt ON p.tournamentId = mt.tournamentId AND p.id = mt.playerId 
+        INNER JOIN match_tie mt2 ON mt.tournamentId = mt2.tournamentId AND mt.matchId = mt2.matchId AND mt.playerId != mt2.playerId
+        INNER JOIN player_record pr ON p.tournamentId = pr.tournamentId AND mt2.playerId = pr.id
+);
+CREATE VIEW player_standing AS (
+    SELECT s.tournamentId, s.playerId id, p.name, s.wins, s.losses, s.ties, s.matches, s.omw
+    FROM standing s
+        INNER JOIN player p ON s.tournamentId = p.tournamentId AND s.playerId = p.id
+    ORDER BY s.wins DESC, s.ties DESC, s.omw DESC
+);
+
+COMMIT;
+ANALYZE;
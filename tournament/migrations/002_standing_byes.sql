@@ -0,0 +1,17 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Keeps each player's number of byes on their standing row.
+-- Run once from psql: \i migrations/002_standing_byes.sql
+BEGIN;
+
+ALTER TABLE standing ADD COLUMN byes integer NOT NULL DEFAULT 0;
+UPDATE standing s SET byes = b.byes
+    FROM (SELECT tournamentId, winnerId, COUNT(*) byes
+        FROM player_bye
+        GROUP BY tournamentId, winnerId
+    ) b
+    WHERE s.tournamentId = b.tournamentId AND s.playerId = b.winnerId;
+
+COMMIT;
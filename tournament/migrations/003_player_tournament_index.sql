@@ -0,0 +1,21 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Keeps the joins of a tournament's standing and player rows index lookups
+-- while a freshly loaded tournament's statistics still say it has one row:
+-- players are indexed by tournament and id, and player_standing joins them
+-- on the player's primary key alone.
+-- Run once from psql: \i migrations/003_player_tournament_index.sql
+BEGIN;
+
+DROP INDEX player_tournament_idx;
+CREATE INDEX player_tournament_idx ON player (tournamentId, id);
+CREATE OR REPLACE VIEW player_standing AS (
+    SELECT s.tournamentId, s.playerId id, p.name, s.wins, s.losses, s.ties, s.matches, s.omw
+    FROM standing s
+        INNER JOIN player p ON s.playerId = p.id
+    ORDER BY s.wins DESC, s.ties DESC, s.omw DESC
+);
+
+COMMIT;
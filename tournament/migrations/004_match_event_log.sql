@@ -0,0 +1,63 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Adds the append-only match event log and the standings snapshots. The log
+-- is backfilled from the recorded matches; a match's round is the largest
+-- number of matches either of its players had played once it was recorded.
+-- Run once from psql: \i migrations/004_match_event_log.sql
+BEGIN;
+
+CREATE TABLE match_event (
+    id serial PRIMARY KEY,
+    tournamentId integer REFERENCES tournament(id),
+    round integer NOT NULL,
+    matchId integer NOT NULL,
+    winnerId integer REFERENCES player(id) NULL,
+    loserId integer REFERENCES player(id) NULL,
+    isTie boolean NOT NULL DEFAULT FALSE,
+    isCorrection boolean NOT NULL DEFAULT FALSE,
+    recordedAt timestamp NOT NULL DEFAULT now()
+);
+CREATE TABLE standing_snapshot (
+    tournamentId integer REFERENCES tournament(id),
+    round integer NOT NULL,
+    playerId integer REFERENCES player(id),
+    wins integer NOT NULL,
+    losses integer NOT NULL,
+    ties integer NOT NULL,
+    matches integer NOT NULL,
+    omw integer NOT NULL,
+    byes integer NOT NULL,
+    PRIMARY KEY (tournamentId, round, playerId)
+);
+CREATE INDEX match_event_round_idx ON match_event (tournamentId, round);
+CREATE INDEX match_event_match_idx ON match_event (matchId);
+
+INSERT INTO match_event (tournamentId, round, matchId, winnerId, loserId,
+        isTie)
+    SELECT m.tournamentId, r.round, m.id,
+        COALESCE(m.winnerId, t.player1), COALESCE(m.loserId, t.player2),
+        COALESCE(m.isTie, FALSE)
+    FROM match m
+        INNER JOIN (SELECT matchId, MAX(n) round
+            FROM (SELECT matchId, ROW_NUMBER() OVER (
+                    PARTITION BY playerId ORDER BY matchId) n
+                FROM (SELECT id matchId, winnerId playerId FROM match
+                        WHERE winnerId IS NOT NULL
+                    UNION ALL
+                    SELECT id, loserId FROM match WHERE loserId IS NOT NULL
+                    UNION ALL
+                    SELECT matchId, playerId FROM match_tie
+                ) appearance
+            ) numbered
+            GROUP BY matchId
+        ) r ON r.matchId = m.id
+        LEFT JOIN (SELECT matchId, MIN(playerId) player1,
+                MAX(playerId) player2
+            FROM match_tie
+            GROUP BY matchId
+        ) t ON t.matchId = m.id
+    ORDER BY m.id;
+
+COMMIT;
@@ -0,0 +1,65 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Replaces match_tie with match_result, one row per player per match with
+-- the points they scored, and rebuilds the views on top of it. Every result
+-- already recorded is copied over before match_tie is dropped.
+-- Run once from psql: \i migrations/005_match_result.sql
+BEGIN;
+
+CREATE TABLE match_result (
+    matchId integer REFERENCES match(id),
+    tournamentId integer REFERENCES tournament(id),
+    playerId integer REFERENCES player(id),
+    opponentId integer REFERENCES player(id) NULL,
+    points smallint NOT NULL,
+    PRIMARY KEY (matchId, playerId)
+);
+
+INSERT INTO match_result (matchId, tournamentId, playerId, opponentId,
+        points)
+    SELECT id, tournamentId, winnerId, loserId, 4
+    FROM match WHERE winnerId IS NOT NULL
+    UNION ALL
+    SELECT id, tournamentId, loserId, winnerId, 0
+    FROM match WHERE loserId IS NOT NULL
+    UNION ALL
+    SELECT mt.matchId, mt.tournamentId, mt.playerId, mt2.playerId, 1
+    FROM match_tie mt
+        INNER JOIN match_tie mt2 ON mt.matchId = mt2.matchId AND
+        mt.playerId != mt2.playerId;
+
+CREATE INDEX match_result_tournament_idx
+    ON match_result (tournamentId, playerId);
+CREATE INDEX match_result_opponent_idx ON match_result (playerId, opponentId);
+
+DROP VIEW player_opponents;
+DROP VIEW player_record;
+DROP TABLE match_tie;
+
+CREATE VIEW player_record AS (
+    SELECT
+        p.tournamentId,
+        p.id,
+        p.name,
+        COALESCE(SUM((r.points = 4)::integer), 0) wins,
+        COALESCE(SUM((r.points = 0)::integer), 0) losses,
+        COALESCE(SUM((r.points = 1)::integer), 0) ties,
+        COUNT(r.playerId) matches
+    FROM player p
+        LEFT JOIN match_result r
+            ON r.tournamentId = p.tournamentId AND r.playerId = p.id
+    GROUP BY p.tournamentId, p.id, p.name
+);
+CREATE VIEW player_opponents AS (
+    SELECT p.tournamentId, p.id, p.name, r.opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
+    FROM player p
+        INNER JOIN (SELECT DISTINCT tournamentId, playerId, opponentId
+            FROM match_result
+            WHERE opponentId IS NOT NULL
+        ) r ON r.tournamentId = p.tournamentId AND r.playerId = p.id
+        INNER JOIN player_record pr ON p.tournamentId = pr.tournamentId AND r.opponentId = pr.id
+);
+
+COMMIT;
@@ -0,0 +1,25 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Adds opponent_pair, every pair of players of a tournament who have met,
+-- and fills it from the results already recorded.
+-- Run once from psql: \i migrations/006_opponent_pair.sql
+BEGIN;
+
+CREATE TABLE opponent_pair (
+    tournamentId integer REFERENCES tournament(id),
+    player1 integer REFERENCES player(id),
+    player2 integer REFERENCES player(id),
+    PRIMARY KEY (tournamentId, player1, player2),
+    CHECK (player1 < player2)
+);
+
+INSERT INTO opponent_pair (tournamentId, player1, player2)
+    SELECT DISTINCT tournamentId, playerId, opponentId
+    FROM match_result
+    WHERE playerId < opponentId;
+
+COMMIT;
+
+ANALYZE opponent_pair;
@@ -0,0 +1,14 @@
+/*
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)
+*/
+-- Adds tournament.resultVersion, bumped by every write to a tournament's
+-- players or matches, which the standings cache checks before serving rows.
+-- Run once from psql: \i migrations/007_result_version.sql
+BEGIN;
+
+CREATE SEQUENCE result_version_seq;
+ALTER TABLE tournament ADD COLUMN resultVersion bigint NOT NULL
+    DEFAULT nextval('result_version_seq');
+
+COMMIT;
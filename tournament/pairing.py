@@ -0,0 +1,454 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Swiss pairing engines used by swissPairings(). They work entirely in memory
+on Standing rows of playerStandings(True), sorted from first to last place.
+"""
+import functools
+import random
+from collections import namedtuple
+import matching
+import storage
+
+# Pairing methods accepted by swissPairings().
+GREEDY = 'greedy'
+OPTIMAL = 'optimal'
+
+# Costs used by the optimal pairing method. A rematch or a second bye is only
+# chosen when no other perfect pairing of the field exists.
+SCORE_DIFFERENCE_COST = 1000
+REMATCH_COST = 10 ** 9
+REPEATED_BYE_COST = 10 ** 9
+
+# Number of players the optimal pairing method solves together, unless a
+# bracket has to be merged with its neighbour. Larger brackets find better
+# pairings across bracket edges but take quadratically more time.
+OPTIMAL_BRACKET_SIZE = 48
+
+# A call to the storage, made by the swissPairings() driving
+# pairNextRound(): the name of a storage.Backend method and its arguments
+# after the tournament id.
+Call = namedtuple('Call', 'method arguments')
+
+
+def matchPoints(player):
+    """Returns a player's match points: 4 per win and 1 per tie.
+
+    Args:
+      player: a Standing row of playerStandings(True).
+    """
+    return player.wins * 4 + player.ties
+
+
+def greedyPairings(players, opponents):
+    """Pairs players from the bottom of the standings upwards.
+
+    Args:
+      players: Standing rows of playerStandings(True), best player first.
+        Must hold an even number of players.
+      opponents: a dict mapping player ids to the set of ids they have
+        already played, as returned by playerOpponents().
+
+    Returns:
+      A list of (id1, name1, id2, name2) tuples.
+    """
+    # Players are flagged as paired instead of being removed from the list,
+    # so finding a partner out of order does not shift the rest of the list.
+    paired = [False] * len(players)
+    pairings = []
+    for i in range(len(players) - 1, -1, -1):
+        if paired[i]:
+            continue
+        player1 = players[i]
+        paired[i] = True
+
+        # If two players have already played against each other, look down the
+        # list of players [higher ranked] until two players are found who have
+        # not yet played against each other. Only if a player has played
+        # against everyone down the list will a rematch be allowed.
+
+        played = opponents.get(player1.id, ())
+        partner = None
+        j = i - 1
+        while j >= 0:
+            if not paired[j]:
+                if partner is None:
+                    partner = j
+                if players[j].id not in played:
+                    partner = j
+                    break
+            j -= 1
+        paired[partner] = True
+        player2 = players[partner]
+        pairings.append((player1.id, player1.name, player2.id, player2.name))
+    return pairings
+
+
+def scoreGroups(players):
+    """Buckets the standings into score groups.
+
+    Args:
+      players: Standing rows of playerStandings(True), best player first.
+
+    Returns:
+      A list of score groups, most match points first, each a list of rows
+      in standings order.
+    """
+    groups = {}
+    for player in players:
+        groups.setdefault(matchPoints(player), []).append(player)
+    return [groups[points] for points in sorted(groups, reverse=True)]
+
+
+def bracketPairings(players, opponents, mapper=map):
+    """Pairs each score group independently with greedyPairings().
+
+    The field is bucketed with scoreGroups() and the groups are made even
+    from the top down: a group with an odd number of players floats one of
+    them into the group just below, where they are paired first. The
+    floater is the lowest ranked player who has not yet played everyone in
+    the group below. Once floaters are chosen the brackets share nothing,
+    so the rematch search of each one only scans its own players and the
+    brackets can be paired in parallel.
+
+    Args:
+      players: Standing rows of playerStandings(True), best player first.
+        Must hold an even number of players.
+      opponents: a dict mapping player ids to the set of ids they have
+        already played, as returned by playerOpponents().
+      mapper: a map() like function used to pair the brackets, e.g. the map
+        method of a multiprocessing pool; defaults to the built-in map.
+
+    Returns:
+      A list of (id1, name1, id2, name2) tuples.
+    """
+    brackets = _floatBrackets(scoreGroups(players), opponents)
+    results = list(mapper(
+        functools.partial(greedyPairings, opponents=opponents), brackets
+    ))
+    _repairRematches(results, opponents)
+    return [pair for bracket in results for pair in bracket]
+
+
+def _floatBrackets(groups, opponents):
+    """Moves one player of every odd score group into the group below.
+
+    Returns:
+      A list of brackets of even size, best bracket first.
+    """
+    brackets = []
+    floater = None
+    for index, group in enumerate(groups):
+        bracket = [floater] + group if floater is not None else list(group)
+        floater = None
+        if len(bracket) % 2 and index + 1 < len(groups):
+            below = groups[index + 1]
+            position = len(bracket) - 1
+            for i in range(len(bracket) - 1, -1, -1):
+                played = opponents.get(bracket[i].id, ())
+                if any(p.id not in played for p in below):
+                    position = i
+                    break
+            floater = bracket.pop(position)
+        if bracket:
+            brackets.append(bracket)
+    return brackets
+
+
+def _repairRematches(brackets, opponents):
+    """Swaps partners to undo rematches left by greedyPairings().
+
+    A rematch is swapped with another pair of its own bracket, or failing
+    that of a bracket next to it, when the two new pairs are not rematches.
+    The brackets are updated in place.
+
+    Args:
+      brackets: lists of pairings, one per bracket, best bracket first.
+      opponents: a dict mapping player ids to the set of ids they have
+        already played.
+    """
+    def isRematch(player1, player2):
+        return player2[0] in opponents.get(player1[0], ())
+
+    for index, bracket in enumerate(brackets):
+        for i, (id1, name1, id2, name2) in enumerate(bracket):
+            player1, player2 = (id1, name1), (id2, name2)
+            if not isRematch(player1, player2):
+                continue
+            for other_index in (index, index + 1, index - 1):
+                if not 0 <= other_index < len(brackets):
+                    continue
+                other = brackets[other_index]
+                swapped = None
+                for j, (id3, name3, id4, name4) in enumerate(other):
+                    if other is bracket and j == i:
+                        continue
+                    player3, player4 = (id3, name3), (id4, name4)
+                    for partner1, partner2 in ((player3, player4),
+                                               (player4, player3)):
+                        if not (isRematch(player1, partner1) or
+                                isRematch(player2, partner2)):
+                            swapped = j, partner1, partner2
+                            break
+                    if swapped is not None:
+                        break
+                if swapped is not None:
+                    j, partner1, partner2 = swapped
+                    bracket[i] = player1 + partner1
+                    other[j] = player2 + partner2
+                    break
+
+
+def optimalPairings(players, opponents, byes,
+                    bracket_size=OPTIMAL_BRACKET_SIZE):
+    """Pairs players by solving minimum-cost perfect matchings bracket by
+    bracket.
+
+    The standings are cut into consecutive brackets of about bracket_size
+    players, at score group boundaries where possible, see _brackets(), and
+    each bracket is solved exactly with the blossom algorithm. The result is
+    optimal within every bracket, not across the whole field. Pairing two
+    players costs the square of their match point difference plus their
+    distance in the standings; rematches cost far more than any such
+    difference. With an odd number of players a bye is matched like an
+    extra player of the last bracket that favours the lowest ranked players
+    and is very costly for players who already had one.
+
+    A bracket solved with a rematch or a repeated bye is merged with its
+    neighbour and solved again, until it is clean or holds every player, so
+    neither is chosen while the whole field can be paired without it.
+
+    Args:
+      players: Standing rows of playerStandings(True), best player first.
+      opponents: a dict mapping player ids to the set of ids they have
+        already played, as returned by playerOpponents().
+      byes: a set of ids of players who already had a bye.
+      bracket_size: number of players solved together, before merging.
+
+    Returns:
+      A tuple (pairings, bye) where pairings is a list of
+      (id1, name1, id2, name2) tuples and bye is the row of the player who
+      gets a bye, or None when the number of players is even.
+    """
+    brackets = _brackets(players, bracket_size)
+    # (pairings, bye) of every bracket solved so far, in order.
+    solutions = []
+    index = 0
+    while index < len(brackets):
+        start, stop = brackets[index]
+        pairings, bye = _solveBracket(players, opponents, byes, start, stop)
+        is_clean = (bye is None or bye.id not in byes) and not any(
+            id2 in opponents.get(id1, ())
+            for (id1, name1, id2, name2) in pairings
+        )
+        if is_clean or len(brackets) == 1:
+            solutions.append((pairings, bye))
+            index += 1
+        elif index + 1 < len(brackets):
+            brackets[index:index + 2] = [(start, brackets[index + 1][1])]
+        else:
+            brackets[index - 1:] = [(brackets[index - 1][0], stop)]
+            solutions.pop()
+            index -= 1
+
+    pairings = []
+    bye = None
+    for bracket_pairings, bracket_bye in solutions:
+        pairings.extend(bracket_pairings)
+        if bracket_bye is not None:
+            bye = bracket_bye
+    return pairings, bye
+
+
+def withdrawGrantedBye(players):
+    """Takes out the player who already has a bye for the coming round.
+
+    A bye already granted for a round, e.g. by an earlier call pairing the
+    same round, leaves its player one match ahead of everyone else in an
+    odd field. That player sits out again instead of a second bye being
+    granted.
+
+    Args:
+      players: Standing rows of playerStandings(True), best player first.
+
+    Returns:
+      A tuple (players, player_with_bye) of a new list of the rows left to
+      pair and the row taken out, or None.
+    """
+    players = list(players)
+    if len(players) % 2 == 0:
+        return players, None
+    fewest_matches = min(p.matches for p in players)
+    ahead = [i for i, p in enumerate(players) if p.matches > fewest_matches]
+    if len(ahead) != 1:
+        return players, None
+    return players, players.pop(ahead[0])
+
+
+def pairRound(players, opponents, byes, method):
+    """Pairs the next round of a tournament.
+
+    Players are shuffled in the first round. With method GREEDY the bye goes
+    to the best ranked player without one and the others are paired score
+    group by score group, see bracketPairings(); with method OPTIMAL the
+    whole round is solved by optimalPairings().
+
+    Args:
+      players: Standing rows of playerStandings(True), best player first.
+      opponents: a dict mapping player ids to the set of ids they have
+        already played, as returned by playerOpponents().
+      byes: a set of ids of players who already had a bye.
+      method: GREEDY or OPTIMAL.
+
+    Returns:
+      A tuple (pairings, bye) where pairings is a list of
+      (id1, name1, id2, name2) tuples and bye is the row of the player who
+      gets a bye, or None.
+    """
+    players = list(players)
+    if players and players[0].matches == 0:
+        random.shuffle(players)
+
+    if method == OPTIMAL:
+        return optimalPairings(players, opponents, byes)
+    elif method != GREEDY:
+        raise ValueError("Unknown pairing method %r." % (method,))
+
+    bye = None
+    if len(players) % 2 != 0:
+        for i, player in enumerate(players):
+            if player.id not in byes:
+                bye = players.pop(i)
+                break
+    return bracketPairings(players, opponents), bye
+
+
+def pairNextRound(players, method):
+    """Yields the storage calls pairing the next round, then the pairings.
+
+    A bye already granted for the round is kept, see withdrawGrantedBye().
+    The pairing itself is pure; this generator only says what it needs from
+    the storage and what it records there, so the blocking and the asyncio
+    APIs drive the same sequence. Every Call is sent back its result.
+
+    Args:
+      players: Standing rows of playerStandings(True), best player first.
+      method: GREEDY or OPTIMAL.
+    """
+    if method not in (GREEDY, OPTIMAL):
+        raise ValueError("Unknown pairing method %r." % (method,))
+    if players:
+        # Pairing a round means the previous one is complete, so its
+        # standings are kept for standingsAfterRound().
+        completed_round = min(p.matches for p in players)
+        if (completed_round > 0 and
+                completed_round % storage.SNAPSHOT_INTERVAL == 0):
+            yield Call('snapshotStandings', (completed_round,))
+    players, player_with_bye = withdrawGrantedBye(players)
+    if not players:
+        yield []
+        return
+    byes = set()
+    if len(players) % 2 != 0:
+        byes = yield Call('playersWithBye', ())
+    opponents = yield Call('playerOpponents', ())
+    pairings, bye = pairRound(players, opponents, byes, method)
+    if bye is not None:
+        yield Call('reportMatch', (bye.id, None, False))
+    yield pairings
+
+
+def _brackets(players, bracket_size):
+    """Cuts the standings into brackets solved by optimalPairings().
+
+    A bracket ends at the last score group boundary between half and all of
+    bracket_size players after its start, and takes the top player of the
+    next score group too if it would hold an odd number of players. Only a
+    score group with no boundary in that range is cut inside. The last
+    bracket holds the rest, including the odd player of an odd field.
+
+    Returns:
+      A list of (start, stop) positions in the standings.
+    """
+    bracket_size = max(2, bracket_size)
+    points = [matchPoints(p) for p in players]
+    player_count = len(players)
+    brackets = []
+    start = 0
+    while player_count - start > bracket_size + 1:
+        stop = start + bracket_size
+        for boundary in range(stop, start + bracket_size // 2, -1):
+            if points[boundary - 1] != points[boundary]:
+                stop = boundary
+                break
+        if (stop - start) % 2:
+            stop += 1
+        brackets.append((start, stop))
+        start = stop
+    if start < player_count:
+        brackets.append((start, player_count))
+    return brackets
+
+
+def _solveBracket(players, opponents, byes, start, stop):
+    """Solves the players at standings positions start to stop exactly.
+
+    Returns:
+      A tuple (pairings, bye) like optimalPairings(); bye is only given to
+      a bracket with an odd number of players.
+    """
+    members = list(range(start, stop))
+    edges = []
+    for a in range(len(members)):
+        i = members[a]
+        for b in range(a + 1, len(members)):
+            j = members[b]
+            edges.append((a, b, _pairingCost(players, opponents, i, j)))
+    if len(members) % 2:
+        lowest_points = min(matchPoints(p) for p in players)
+        bye_vertex = len(members)
+        for a, i in enumerate(members):
+            cost = (
+                SCORE_DIFFERENCE_COST *
+                (matchPoints(players[i]) - lowest_points) ** 2 +
+                (len(players) - 1 - i)
+            )
+            if players[i].id in byes:
+                cost += REPEATED_BYE_COST
+            edges.append((a, bye_vertex, cost))
+    if not edges:
+        return [], None
+
+    # Blossom maximises weight, so turn costs into positive weights.
+    max_cost = max(cost for (a, b, cost) in edges)
+    mate = matching.maxWeightMatching(
+        [(a, b, max_cost + 1 - cost) for (a, b, cost) in edges],
+        max_cardinality=True
+    )
+    pairings = []
+    bye = None
+    for a, i in enumerate(members):
+        b = mate[a]
+        if b == len(members):
+            bye = players[i]
+        elif a < b:
+            player1, player2 = players[i], players[members[b]]
+            pairings.append(
+                (player1.id, player1.name, player2.id, player2.name)
+            )
+    return pairings, bye
+
+
+def _pairingCost(players, opponents, i, j):
+    """Returns the cost of pairing the players at standings positions i and j.
+    """
+    player1, player2 = players[i], players[j]
+    cost = (
+        SCORE_DIFFERENCE_COST *
+        (matchPoints(player1) - matchPoints(player2)) ** 2 +
+        abs(i - j)
+    )
+    if player2.id in opponents.get(player1.id, ()):
+        cost += REMATCH_COST
+    return cost
@@ -0,0 +1,753 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+PostgreSQL storage backend, built on the schema in tournament.sql and the
+connection pool in db.py.
+"""
+import csv
+import itertools
+import storage
+from collections import namedtuple
+from contextlib import contextmanager
+from psycopg2.extensions import encodings
+from psycopg2.extras import execute_values
+from db import executePrepared, get_cursor
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# Names of these types are encoded before being written as CSV.
+try:
+    _UNICODE_TYPES = (unicode,)
+except NameError:
+    _UNICODE_TYPES = ()
+
+# Ids of everyone a player has won, lost or tied against; byes are excluded.
+# Takes the player's id as parameter.
+OPPONENT_IDS_QUERY = (
+    "SELECT opponentId FROM match_result "
+    "WHERE playerId = %s AND opponentId IS NOT NULL"
+)
+
+# Every pair of players of a tournament who have met, an index-only scan of
+# the primary key of opponent_pair. Takes the tournament id.
+OPPONENTS_QUERY = (
+    "SELECT player1, player2 FROM opponent_pair WHERE tournamentId = %s"
+)
+
+# The (winner, loser, is_tie) of every match of a tournament. A win or bye is
+# read from its winner's row, a tie from the row of its player with the
+# lower id. Takes the tournament id.
+MATCH_RESULTS_QUERY = (
+    "SELECT playerId, opponentId, points = 1 FROM match_result "
+    "WHERE tournamentId = %s AND (points = 4 OR "
+    "(points = 1 AND playerId < opponentId))"
+)
+
+# The standing counters of every player of a tournament who has played, from
+# one grouped scan of match_result. Takes the tournament id.
+STANDING_COUNTS_QUERY = (
+    "SELECT playerId, SUM((points = 4)::integer) AS wins, "
+    "SUM((points = 0)::integer) AS losses, "
+    "SUM((points = 1)::integer) AS ties, COUNT(*) AS matches, "
+    "SUM((opponentId IS NULL)::integer) AS byes "
+    "FROM match_result WHERE tournamentId = %s GROUP BY playerId"
+)
+
+# The OMW of every player of a tournament who has faced an opponent, from
+# opponent_pair, read in both directions, and the opponents' standing rows.
+# Takes the tournament id twice.
+STANDING_OMW_QUERY = (
+    "SELECT r.playerId, SUM(o.wins * 4 + o.ties) AS omw "
+    "FROM (SELECT player1 AS playerId, player2 AS opponentId "
+    "FROM opponent_pair WHERE tournamentId = %s "
+    "UNION ALL "
+    "SELECT player2, player1 FROM opponent_pair WHERE tournamentId = %s) r "
+    "INNER JOIN standing o ON o.playerId = r.opponentId "
+    "GROUP BY r.playerId"
+)
+
+# First key of the transaction-level advisory locks taken on tournaments; the
+# second key is the tournament id.
+TOURNAMENT_LOCK_KEY = 0x746f7572
+
+# Gives a tournament a new result version; run in the transaction of every
+# write to its players or matches. Takes the tournament id.
+BUMP_RESULT_VERSION_QUERY = (
+    "UPDATE tournament SET resultVersion = nextval('result_version_seq') "
+    "WHERE id = %s"
+)
+
+# Gives every tournament a new result version, e.g. after deleting all the
+# matches.
+BUMP_ALL_RESULT_VERSIONS_QUERY = (
+    "UPDATE tournament SET resultVersion = nextval('result_version_seq')"
+)
+
+# Blocks until the transaction holds a tournament's lock. Takes
+# TOURNAMENT_LOCK_KEY and the tournament id.
+LOCK_TOURNAMENT_QUERY = "SELECT pg_advisory_xact_lock(%s, %s)"
+
+# Numbers the server-side cursors of iterPlayerStandings(), whose names must
+# be unique within a connection.
+_cursor_ids = itertools.count(1)
+
+# Creates a tournament and returns its id.
+CREATE_TOURNAMENT_QUERY = (
+    "INSERT INTO tournament (id) VALUES (DEFAULT) RETURNING id"
+)
+
+# Id of the newest tournament.
+LATEST_TOURNAMENT_QUERY = "SELECT id FROM tournament ORDER BY id DESC LIMIT 1"
+
+# One page of a tournament's standings. Takes the tournament id, the number
+# of rows (NULL for all of them) and the number of rows to skip.
+STANDINGS_QUERY = (
+    "SELECT * FROM player_standing WHERE tournamentId = %s "
+    "ORDER BY wins DESC, ties DESC, omw DESC, id "
+    "LIMIT %s OFFSET %s"
+)
+
+# Registers a player and their standing row. Takes the name and the
+# tournament id, and returns the new player's id.
+REGISTER_PLAYER_QUERY = (
+    "WITH p AS (INSERT INTO player (name, tournamentId) VALUES "
+    "(%s, %s) RETURNING id, tournamentId) "
+    "INSERT INTO standing (playerId, tournamentId) "
+    "SELECT id, tournamentId FROM p RETURNING playerId"
+)
+
+# Reserves ids for new players. Takes the number of ids.
+RESERVE_PLAYER_IDS_QUERY = (
+    "SELECT nextval('player_id_seq')::integer FROM generate_series(1, %s)"
+)
+
+# Ids of the players of a tournament who had a bye. Takes the tournament id.
+PLAYERS_WITH_BYE_QUERY = (
+    "SELECT playerId FROM standing WHERE tournamentId = %s AND byes > 0"
+)
+
+# Copies a tournament's standing rows as those after a round, unless the
+# round already has them. Takes the round and the tournament id.
+SNAPSHOT_STANDINGS_QUERY = (
+    "INSERT INTO standing_snapshot (tournamentId, round, playerId, wins, "
+    "losses, ties, matches, omw, byes) "
+    "SELECT tournamentId, %s, playerId, wins, losses, ties, matches, omw, "
+    "byes FROM standing WHERE tournamentId = %s "
+    "ON CONFLICT DO NOTHING"
+)
+
+# A statement run by runStatements(): a query with %s placeholders and its
+# parameters.
+Statement = namedtuple('Statement', 'query parameters')
+
+# A statement run by runStatements() through a statement prepared once per
+# connection under the given name, see db.executePrepared().
+PreparedStatement = namedtuple('PreparedStatement', 'name query parameters')
+
+# Rows inserted into a table in bulk by runStatements(), as tuples in the
+# order of columns.
+Rows = namedtuple('Rows', 'table columns rows')
+
+
+def runStatements(c, statements):
+    """Runs a sequence of statements in the transaction of a cursor.
+
+    The statements recording matches are written once, as generators that
+    the asyncio API runs on its own connections too, see aiotournament.py.
+    Such a generator yields Statement, PreparedStatement and Rows tuples and
+    is sent back the rows each statement returned, or None; a last item of
+    any other type is its result.
+
+    Args:
+      c: a cursor from get_cursor().
+      statements: the generator, e.g. reportMatchStatements().
+
+    Returns:
+      The result of the sequence, or None if it has none.
+    """
+    rows = None
+    try:
+        step = next(statements)
+        while isinstance(step, (Statement, PreparedStatement, Rows)):
+            if isinstance(step, Rows):
+                execute_values(
+                    c, "INSERT INTO %s (%s) VALUES %%s" % (
+                        step.table, ", ".join(step.columns)
+                    ), step.rows, page_size=1000
+                )
+                rows = None
+            else:
+                _execute(c, step)
+                rows = c.fetchall() if c.description is not None else None
+            step = statements.send(rows)
+    except StopIteration:
+        return None
+    return step
+
+
+def _execute(c, statement):
+    """Executes a Statement or PreparedStatement on a cursor."""
+    if isinstance(statement, PreparedStatement):
+        executePrepared(
+            c, statement.name, statement.query, statement.parameters
+        )
+    else:
+        c.execute(statement.query, statement.parameters)
+
+
+def reportMatchStatements(tournament_id, winner, loser, is_tie):
+    """Yields the statements recording a single match, see runStatements().
+
+    The tournament is locked and the result validated first. Wins, losses,
+    ties and matches are then bumped for both players, and the new match
+    points are added to the OMW of everyone the players have already
+    faced. If this is the first time the players meet, which is when their
+    pair is new to opponent_pair, each one's OMW also gains the other's
+    match points. The match, its rows of match_result and
+    its entry in the match log are written last by one statement; the
+    round is the larger match count of its players, which have just been
+    bumped.
+
+    Raises:
+      ValueError: if the result is rejected by storage.validateResults().
+    """
+    yield lockTournamentStatement(tournament_id)
+    results = [(winner, loser, is_tie)]
+    rows = yield _matchCounts(tournament_id, results)
+    storage.validateResults(results, dict(rows))
+
+    bye = ('standing_bye', 'wins = wins + 1, byes = byes + 1')
+    win = ('standing_win', 'wins = wins + 1')
+    loss = ('standing_loss', 'losses = losses + 1')
+    tie = ('standing_tie', 'ties = ties + 1')
+    if loser is None:
+        updates = [(winner, bye, 4)]
+    elif is_tie:
+        updates = [(winner, tie, 1), (loser, tie, 1)]
+    else:
+        updates = [(winner, win, 4), (loser, loss, 0)]
+
+    is_first_meeting = False
+    if loser is not None:
+        rows = yield PreparedStatement(
+            'insert_opponent_pair',
+            "INSERT INTO opponent_pair (tournamentId, player1, player2) "
+            "VALUES (%s, %s, %s) ON CONFLICT DO NOTHING RETURNING 1",
+            (tournament_id, min(winner, loser), max(winner, loser))
+        )
+        is_first_meeting = bool(rows)
+
+    for player, (name, increments), points in updates:
+        yield PreparedStatement(
+            name, "UPDATE standing SET " + increments + ", "
+            "matches = matches + 1 WHERE playerId = %s", (player,)
+        )
+        if points:
+            yield PreparedStatement(
+                'standing_add_omw',
+                "UPDATE standing SET omw = omw + %s WHERE playerId IN (" +
+                OPPONENT_IDS_QUERY + ")", (points, player)
+            )
+    if is_first_meeting:
+        yield PreparedStatement(
+            'standing_first_meeting',
+            "UPDATE standing s SET omw = s.omw + o.wins * 4 + o.ties "
+            "FROM standing o WHERE (s.playerId = %s AND o.playerId = %s) "
+            "OR (s.playerId = %s AND o.playerId = %s)",
+            (winner, loser, loser, winner)
+        )
+
+    rows = _resultRows(winner, loser, is_tie)
+    parameters = [
+        tournament_id, None if is_tie else winner,
+        None if is_tie else loser, bool(is_tie)
+    ]
+    for row in rows:
+        parameters.append(tournament_id)
+        parameters.extend(row)
+    parameters.extend((
+        tournament_id, winner, loser, winner, loser, bool(is_tie)
+    ))
+    yield PreparedStatement(
+        'insert_match' if len(rows) == 2 else 'insert_bye',
+        "WITH m AS (INSERT INTO match (tournamentId, winnerId, loserId, "
+        "isTie) VALUES (%s, %s, %s, %s) RETURNING id), "
+        "r AS (INSERT INTO match_result (matchId, tournamentId, playerId, "
+        "opponentId, points) VALUES " + ", ".join(
+            ["((SELECT id FROM m), %s, %s, %s, %s)"] * len(rows)
+        ) + ") "
+        "INSERT INTO match_event (tournamentId, round, matchId, winnerId, "
+        "loserId, isTie) VALUES (%s, "
+        "(SELECT MAX(matches) FROM standing WHERE playerId IN (%s, %s)), "
+        "(SELECT id FROM m), %s, %s, %s)", tuple(parameters)
+    )
+    yield bumpResultVersionStatement(tournament_id)
+
+
+def reportMatchesStatements(tournament_id, results):
+    """Yields the statements recording a batch of results, see
+    runStatements().
+
+    The tournament is locked and the results validated first, then the
+    matches, their opponent pairs and their match log entries are inserted
+    in bulk and the
+    standings of the tournament are recomputed once afterwards.
+
+    Raises:
+      ValueError: if any result is rejected by storage.validateResults().
+    """
+    yield lockTournamentStatement(tournament_id)
+    rows = yield _matchCounts(tournament_id, results)
+    match_counts = dict(rows)
+    storage.validateResults(results, match_counts)
+
+    rows = yield Statement(
+        "SELECT nextval('match_id_seq') FROM generate_series(1, %s)",
+        (len(results),)
+    )
+    match_ids = [row[0] for row in rows]
+    matches = []
+    match_results = []
+    pairs = set()
+    events = []
+    for match_id, (winner, loser, is_tie) in zip(match_ids, results):
+        if is_tie:
+            matches.append((match_id, tournament_id, None, None, True))
+        else:
+            matches.append((match_id, tournament_id, winner, loser, False))
+        for row in _resultRows(winner, loser, is_tie):
+            match_results.append((match_id, tournament_id) + row)
+        if loser is not None:
+            pairs.add((tournament_id, min(winner, loser), max(winner, loser)))
+        match_counts[winner] += 1
+        round_number = match_counts[winner]
+        if loser is not None:
+            match_counts[loser] += 1
+            round_number = max(round_number, match_counts[loser])
+        events.append((
+            tournament_id, round_number, match_id, winner, loser,
+            bool(is_tie)
+        ))
+    yield Rows(
+        'match', ('id', 'tournamentId', 'winnerId', 'loserId', 'isTie'),
+        matches
+    )
+    yield Rows(
+        'match_result',
+        ('matchId', 'tournamentId', 'playerId', 'opponentId', 'points'),
+        match_results
+    )
+    if pairs:
+        yield Statement(
+            "INSERT INTO opponent_pair (tournamentId, player1, player2) "
+            "SELECT * FROM unnest(%s::integer[], %s::integer[], "
+            "%s::integer[]) ON CONFLICT DO NOTHING",
+            tuple(list(column) for column in zip(*pairs))
+        )
+    yield Rows(
+        'match_event',
+        ('tournamentId', 'round', 'matchId', 'winnerId', 'loserId', 'isTie'),
+        events
+    )
+    for statement in refreshStandingsStatements(tournament_id):
+        yield statement
+    yield bumpResultVersionStatement(tournament_id)
+
+
+def correctMatchStatements(tournament_id, winner, loser, is_tie):
+    """Yields the statements correcting the result of the latest match
+    between two players, see runStatements().
+
+    The tournament is locked and the correction validated first. The match
+    and match_result rows are rewritten to the new result, the correction
+    is appended to the match log and the standings of the tournament are
+    recomputed, see refreshStandingsStatements().
+
+    Raises:
+      ValueError: if the correction is rejected by
+        storage.validateCorrection(), or the players have not played each
+        other in the tournament.
+    """
+    yield lockTournamentStatement(tournament_id)
+    rows = yield _matchCounts(tournament_id, [(winner, loser, is_tie)])
+    storage.validateCorrection(winner, loser, is_tie, dict(rows))
+
+    rows = yield Statement(
+        "SELECT matchId, round FROM match_event "
+        "WHERE tournamentId = %s AND ((winnerId = %s AND loserId = %s) OR "
+        "(winnerId = %s AND loserId = %s)) "
+        "ORDER BY matchId DESC LIMIT 1",
+        (tournament_id, winner, loser, loser, winner)
+    )
+    if not rows:
+        raise ValueError(
+            "Players %r and %r have not played each other in the "
+            "tournament." % (winner, loser)
+        )
+    match_id, round_number = rows[0]
+    yield Statement(
+        "INSERT INTO match_event (tournamentId, round, matchId, winnerId, "
+        "loserId, isTie, isCorrection) VALUES (%s, %s, %s, %s, %s, %s, TRUE)",
+        (tournament_id, round_number, match_id, winner, loser, bool(is_tie))
+    )
+    if is_tie:
+        yield Statement(
+            "UPDATE match SET winnerId = NULL, loserId = NULL, isTie = TRUE "
+            "WHERE id = %s", (match_id,)
+        )
+    else:
+        yield Statement(
+            "UPDATE match SET winnerId = %s, loserId = %s, isTie = FALSE "
+            "WHERE id = %s", (winner, loser, match_id)
+        )
+    yield Statement(
+        "DELETE FROM match_result WHERE matchId = %s", (match_id,)
+    )
+    yield Rows(
+        'match_result',
+        ('matchId', 'tournamentId', 'playerId', 'opponentId', 'points'),
+        [(match_id, tournament_id) + row
+         for row in _resultRows(winner, loser, is_tie)]
+    )
+    yield Statement(
+        "DELETE FROM standing_snapshot WHERE tournamentId = %s AND "
+        "round >= %s", (tournament_id, round_number)
+    )
+    for statement in refreshStandingsStatements(tournament_id):
+        yield statement
+    yield bumpResultVersionStatement(tournament_id)
+
+
+def lockTournamentStatement(tournament_id):
+    """Returns the statement blocking until the transaction holds the
+    tournament's advisory lock, see PostgresBackend.lockTournament()."""
+    return PreparedStatement(
+        'lock_tournament', LOCK_TOURNAMENT_QUERY,
+        (TOURNAMENT_LOCK_KEY, tournament_id)
+    )
+
+
+def bumpResultVersionStatement(tournament_id):
+    """Returns the statement giving the tournament a new result version in
+    the transaction of a write, see PostgresBackend.resultVersion()."""
+    return PreparedStatement(
+        'bump_result_version', BUMP_RESULT_VERSION_QUERY, (tournament_id,)
+    )
+
+
+def refreshStandingsStatements(tournament_id):
+    """Returns the statements recomputing the standing table of a tournament
+    from its match history.
+
+    The counters of every player are aggregated from the tournament's rows
+    of match_result, then their OMW from the updated standing rows of their
+    opponents. Both aggregates are joined to standing on its primary key,
+    so the plans stay linear even when the statistics of a freshly played
+    tournament say it has no matches yet.
+    """
+    return [
+        Statement(
+            "UPDATE standing s SET wins = t.wins, losses = t.losses, "
+            "ties = t.ties, matches = t.matches, byes = t.byes "
+            "FROM (" + STANDING_COUNTS_QUERY + ") t "
+            "WHERE s.playerId = t.playerId", (tournament_id,)
+        ),
+        Statement(
+            "UPDATE standing s SET omw = t.omw "
+            "FROM (" + STANDING_OMW_QUERY + ") t "
+            "WHERE s.playerId = t.playerId", (tournament_id, tournament_id)
+        ),
+    ]
+
+
+def _resultRows(winner, loser, is_tie):
+    """Returns the (player, opponent, points) rows of match_result recording
+    a match; a bye has a single row."""
+    if loser is None:
+        return [(winner, None, 4)]
+    if is_tie:
+        return [(winner, loser, 1), (loser, winner, 1)]
+    return [(winner, loser, 4), (loser, winner, 0)]
+
+
+def opponentGraph(rows):
+    """Returns the dict of playerOpponents() built from the (player1,
+    player2) rows of OPPONENTS_QUERY."""
+    opponents = {}
+    for player1, player2 in rows:
+        opponents.setdefault(player1, set()).add(player2)
+        opponents.setdefault(player2, set()).add(player1)
+    return opponents
+
+
+def _matchCounts(tournament_id, results):
+    """Returns the statement reading the (player id, matches) of the players
+    named in results who are registered in the tournament."""
+    player_ids = set()
+    for winner, loser, is_tie in results:
+        player_ids.update((winner, loser))
+    player_ids.discard(None)
+    return PreparedStatement(
+        'player_match_counts',
+        "SELECT playerId, matches FROM standing "
+        "WHERE tournamentId = %s AND playerId = ANY(%s)",
+        (tournament_id, list(player_ids))
+    )
+
+
+class PostgresBackend(storage.Backend):
+    """Stores tournaments in the PostgreSQL database configured in db.py."""
+
+    def deleteMatches(self):
+        with get_cursor() as c:
+            c.execute(
+                "TRUNCATE match, match_event, standing_snapshot, "
+                "opponent_pair RESTART IDENTITY CASCADE"
+            )
+            c.execute(
+                "UPDATE standing SET wins = 0, losses = 0, ties = 0, "
+                "matches = 0, omw = 0, byes = 0"
+            )
+            c.execute(BUMP_ALL_RESULT_VERSIONS_QUERY)
+
+    def deletePlayers(self):
+        with get_cursor() as c:
+            c.execute("TRUNCATE player RESTART IDENTITY CASCADE")
+            c.execute(BUMP_ALL_RESULT_VERSIONS_QUERY)
+
+    def deleteTournaments(self):
+        with get_cursor() as c:
+            c.execute("TRUNCATE tournament RESTART IDENTITY CASCADE")
+
+    def countPlayers(self):
+        with get_cursor() as c:
+            c.execute("SELECT COUNT(id) FROM player")
+            row = c.fetchone()
+        return row[0] if row is not None else 0
+
+    def createTournament(self):
+        with get_cursor() as c:
+            c.execute(CREATE_TOURNAMENT_QUERY)
+            tournament_id = c.fetchone()[0]
+        return tournament_id
+
+    def latestTournamentId(self):
+        with get_cursor() as c:
+            c.execute(LATEST_TOURNAMENT_QUERY)
+            row = c.fetchone()
+        return None if row is None else row[0]
+
+    def resultVersion(self, tournament_id):
+        """Reads the version from the primary key of tournament."""
+        with get_cursor() as c:
+            executePrepared(
+                c, 'result_version',
+                "SELECT resultVersion FROM tournament WHERE id = %s",
+                (tournament_id,)
+            )
+            row = c.fetchone()
+        return None if row is None else row[0]
+
+    def registerPlayer(self, tournament_id, name):
+        with get_cursor() as c:
+            c.execute(REGISTER_PLAYER_QUERY, (name, tournament_id))
+            player_id = c.fetchone()[0]
+            _execute(c, bumpResultVersionStatement(tournament_id))
+        return player_id
+
+    def registerPlayers(self, tournament_id, names):
+        """Reserves the ids from the player sequence in one query and streams
+        the players to the database with COPY.
+        """
+        with get_cursor() as c:
+            c.execute(RESERVE_PLAYER_IDS_QUERY, (len(names),))
+            player_ids = [row[0] for row in c.fetchall()]
+
+            players = StringIO()
+            standings = StringIO()
+            # Quoted, an empty name is an empty string rather than NULL.
+            player_writer = csv.writer(players, quoting=csv.QUOTE_ALL)
+            standing_writer = csv.writer(standings)
+            # The Python 2 csv module only writes byte strings.
+            codec = encodings[c.connection.encoding]
+            for player_id, name in zip(player_ids, names):
+                if isinstance(name, _UNICODE_TYPES):
+                    name = name.encode(codec)
+                player_writer.writerow((player_id, name, tournament_id))
+                standing_writer.writerow((player_id, tournament_id))
+            players.seek(0)
+            standings.seek(0)
+            c.copy_expert(
+                "COPY player (id, name, tournamentId) FROM STDIN WITH CSV",
+                players
+            )
+            c.copy_expert(
+                "COPY standing (playerId, tournamentId) FROM STDIN WITH CSV",
+                standings
+            )
+            _execute(c, bumpResultVersionStatement(tournament_id))
+        return player_ids
+
+    def playerStandings(self, tournament_id, limit=None, offset=0):
+        with get_cursor() as c:
+            executePrepared(
+                c, 'player_standings', STANDINGS_QUERY,
+                (tournament_id, limit, offset)
+            )
+            player_standings = [
+                storage.Standing._make(row) for row in c.fetchall()
+            ]
+        return player_standings
+
+    def iterPlayerStandings(self, tournament_id,
+                            batch_size=storage.STANDINGS_BATCH_SIZE):
+        """Streams the standings through a server-side cursor.
+
+        The connection stays checked out until the generator is exhausted or
+        closed.
+        """
+        cursor_name = "player_standings_%d" % next(_cursor_ids)
+        with get_cursor(cursor_name) as c:
+            c.itersize = batch_size
+            c.execute(STANDINGS_QUERY, (tournament_id, None, 0))
+            for row in c:
+                yield storage.Standing._make(row)
+
+    @contextmanager
+    def lockTournament(self, tournament_id):
+        """Holds an advisory lock on the tournament until the transaction
+        ends; database calls made meanwhile on the same thread join the
+        transaction, see db.get_cursor().
+        """
+        with get_cursor() as c:
+            _execute(c, lockTournamentStatement(tournament_id))
+            yield
+
+    def reportMatch(self, tournament_id, winner, loser, is_tie):
+        with get_cursor() as c:
+            runStatements(
+                c, reportMatchStatements(tournament_id, winner, loser, is_tie)
+            )
+
+    def reportMatches(self, tournament_id, results):
+        """Writes the matches with multi-row INSERTs and recomputes the
+        standings of the tournament once afterwards.
+        """
+        with get_cursor() as c:
+            runStatements(c, reportMatchesStatements(tournament_id, results))
+
+    def matchResults(self, tournament_id):
+        with get_cursor() as c:
+            c.execute(MATCH_RESULTS_QUERY, (tournament_id,))
+            rows = c.fetchall()
+        return rows
+
+    def matchEvents(self, tournament_id):
+        with get_cursor() as c:
+            c.execute(
+                "SELECT id, round, matchId, winnerId, loserId, isTie, "
+                "isCorrection FROM match_event WHERE tournamentId = %s "
+                "ORDER BY id", (tournament_id,)
+            )
+            rows = c.fetchall()
+        return [storage.MatchEvent._make(row) for row in rows]
+
+    def correctMatch(self, tournament_id, winner, loser, is_tie):
+        with get_cursor() as c:
+            runStatements(
+                c, correctMatchStatements(tournament_id, winner, loser, is_tie)
+            )
+
+    def snapshotStandings(self, tournament_id, round_number):
+        with get_cursor() as c:
+            c.execute(SNAPSHOT_STANDINGS_QUERY, (round_number, tournament_id))
+
+    def standingsAfterRound(self, tournament_id, round_number):
+        with get_cursor() as c:
+            c.execute(
+                "SELECT MAX(round) FROM standing_snapshot "
+                "WHERE tournamentId = %s AND round <= %s",
+                (tournament_id, round_number)
+            )
+            snapshot_round = c.fetchone()[0] or 0
+            if snapshot_round == round_number:
+                c.execute(
+                    "SELECT s.tournamentId, s.playerId, p.name, s.wins, "
+                    "s.losses, s.ties, s.matches, s.omw "
+                    "FROM standing_snapshot s "
+                    "INNER JOIN player p ON p.id = s.playerId "
+                    "WHERE s.tournamentId = %s AND s.round = %s "
+                    "ORDER BY s.wins DESC, s.ties DESC, s.omw DESC, "
+                    "s.playerId", (tournament_id, round_number)
+                )
+                return [storage.Standing._make(row) for row in c.fetchall()]
+
+            c.execute(
+                "SELECT id, name FROM player WHERE tournamentId = %s",
+                (tournament_id,)
+            )
+            names = dict(c.fetchall())
+            c.execute(
+                "SELECT playerId, wins, losses, ties, matches "
+                "FROM standing_snapshot WHERE tournamentId = %s AND "
+                "round = %s", (tournament_id, snapshot_round)
+            )
+            snapshot = dict((row[0], row[1:]) for row in c.fetchall())
+            # The latest event of every match up to the round is its result.
+            c.execute(
+                "SELECT DISTINCT ON (matchId) round, winnerId, loserId, isTie "
+                "FROM match_event WHERE tournamentId = %s AND round <= %s "
+                "ORDER BY matchId, id DESC", (tournament_id, round_number)
+            )
+            events = c.fetchall()
+        return storage.replayStandings(
+            tournament_id, names, snapshot,
+            [(winner, loser, is_tie)
+             for (event_round, winner, loser, is_tie) in events
+             if event_round > snapshot_round],
+            [(winner, loser)
+             for (event_round, winner, loser, is_tie) in events
+             if loser is not None]
+        )
+
+    def playersWithBye(self, tournament_id):
+        with get_cursor() as c:
+            c.execute(PLAYERS_WITH_BYE_QUERY, (tournament_id,))
+            rows = c.fetchall()
+        return set(row[0] for row in rows)
+
+    def doesPlayerHaveBye(self, tournament_id, player):
+        with get_cursor() as c:
+            executePrepared(
+                c, 'does_player_have_bye',
+                "SELECT 1 FROM standing WHERE tournamentId = %s AND "
+                "playerId = %s AND byes > 0", (tournament_id, player)
+            )
+            row = c.fetchone()
+        return row is not None
+
+    def havePlayersBeenPaired(self, player1, player2):
+        """Looks the pair up in the primary key of opponent_pair; players
+        belong to a single tournament, which is read from the first one."""
+        with get_cursor() as c:
+            executePrepared(
+                c, 'have_players_been_paired',
+                "SELECT EXISTS (SELECT 1 FROM opponent_pair "
+                "WHERE tournamentId = (SELECT tournamentId FROM player "
+                "WHERE id = %s) AND player1 = %s AND player2 = %s)",
+                (player1, min(player1, player2), max(player1, player2))
+            )
+            have_been_paired = c.fetchone()[0]
+        return have_been_paired
+
+    def playerOpponents(self, tournament_id):
+        """Fetches the whole opponent graph of the tournament in one
+        index-only scan of opponent_pair."""
+        with get_cursor() as c:
+            c.execute(OPPONENTS_QUERY, (tournament_id,))
+            rows = c.fetchall()
+        return opponentGraph(rows)
@@ -0,0 +1,246 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Whole-tournament simulator for capacity planning. Results are printed as
+JSON.
+
+Every event registers its players, then plays its Swiss rounds through the
+tournament API: each round is paired, every match is decided at random or by
+the players' Elo ratings and reported, and the standings are read. Wall time
+and database statements are reported for each phase of each event:
+  python simulate.py --players 2000 --outcome elo --tie-rate 0.05
+  python simulate.py --players 500 --events 8 --workers 4 --dsn dbname=load
+
+Events run in worker processes when --workers is above 1, one tournament per
+worker at a time, all against the same database.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+from contextlib import contextmanager
+import instrumentation
+import tournament
+
+# How match outcomes are decided.
+RANDOM = 'random'
+ELO = 'elo'
+
+# Ratings of simulated players are drawn from a normal distribution.
+ELO_MEAN = 1500
+ELO_DEVIATION = 200
+
+# Phases of an event, in the order they are reported.
+PHASES = ('registration', 'pairing', 'reporting', 'standings')
+
+
+def winProbability(rating1, rating2):
+    """Returns the Elo probability that a player rated rating1 beats one
+    rated rating2."""
+    return 1.0 / (1.0 + 10 ** ((rating2 - rating1) / 400.0))
+
+
+def simulateEvent(player_count, rounds=None, outcome=RANDOM, tie_rate=0.0,
+                  method=tournament.GREEDY, bulk=False, seed=0):
+    """Plays a whole Swiss event through the tournament API.
+
+    Args:
+      player_count: number of players in the event.
+      rounds: number of rounds; defaults to log2 of the number of players,
+        rounded up.
+      outcome: RANDOM for coin tosses or ELO to favour higher rated players.
+      tie_rate: probability that a match ends in a tie.
+      method: pairing method passed to swissPairings().
+      bulk: register players with registerPlayers() and report every round
+        with reportMatches() instead of one call per player and match.
+      seed: seed of the ratings and results.
+
+    Returns:
+      A dict with the event's size, the wall time and number of database
+      connections and statements of each phase, and the final top three.
+    """
+    rng = random.Random(seed)
+    random.seed(seed)
+    round_count = rounds or max(1, int(math.ceil(math.log(player_count, 2))))
+    phases = dict(
+        (phase, {'seconds': 0.0, 'connections': 0, 'statements': 0})
+        for phase in PHASES
+    )
+
+    @contextmanager
+    def phase(name):
+        start = time.time()
+        with instrumentation.track() as usage:
+            yield
+        totals = phases[name]
+        totals['seconds'] += time.time() - start
+        totals['connections'] += usage['connections']
+        totals['statements'] += usage['statements']
+
+    start = time.time()
+    with phase('registration'):
+        tournament_id = tournament.createTournament()
+        names = ["Player %d" % i for i in range(player_count)]
+        if bulk:
+            player_ids = tournament.registerPlayers(names, tournament_id)
+        else:
+            player_ids = [
+                tournament.registerPlayer(name, tournament_id)
+                for name in names
+            ]
+    ratings = dict(
+        (player_id, rng.gauss(ELO_MEAN, ELO_DEVIATION))
+        for player_id in player_ids
+    )
+
+    for _ in range(round_count):
+        with phase('pairing'):
+            pairings = tournament.swissPairings(tournament_id, method)
+        results = []
+        for (id1, name1, id2, name2) in pairings:
+            if rng.random() < tie_rate:
+                results.append((id1, id2, True))
+                continue
+            if outcome == ELO:
+                chance = winProbability(ratings[id1], ratings[id2])
+            else:
+                chance = 0.5
+            if rng.random() < chance:
+                results.append((id1, id2, False))
+            else:
+                results.append((id2, id1, False))
+        with phase('reporting'):
+            if bulk:
+                tournament.reportMatches(results, tournament_id)
+            else:
+                for winner, loser, is_tie in results:
+                    tournament.reportMatch(
+                        winner, loser, is_tie, tournament_id
+                    )
+        with phase('standings'):
+            standings = tournament.playerStandings(
+                tournament_id=tournament_id
+            )
+
+    return {
+        'tournament_id': tournament_id,
+        'players': player_count,
+        'rounds': round_count,
+        'wall_seconds': time.time() - start,
+        'phases': phases,
+        'top': [row[1] for row in standings[:3]],
+    }
+
+
+def simulate(events=1, workers=1, backend=None, dsn=None, **options):
+    """Plays several events, in parallel worker processes if asked to.
+
+    Args:
+      events: number of events to play.
+      workers: number of worker processes; 1 plays the events in this
+        process one after the other.
+      backend: name of the storage backend; defaults to the one in use.
+      dsn: database to play the events in; defaults to db.DSN.
+      options: keyword arguments of simulateEvent(); event i is seeded
+        with seed + i.
+
+    Returns:
+      A dict with the result of every event, the totals of every phase and
+      the wall time of the whole simulation.
+    """
+    seed = options.pop('seed', 0)
+    jobs = [
+        (backend, dsn, dict(options, seed=seed + i)) for i in range(events)
+    ]
+    start = time.time()
+    if workers > 1:
+        # Workers must not inherit this process's database connections.
+        tournament.closePool()
+        worker_pool = multiprocessing.Pool(workers)
+        try:
+            results = worker_pool.map(_simulateInWorker, jobs)
+        finally:
+            worker_pool.close()
+            worker_pool.join()
+    else:
+        results = [_simulateInWorker(job) for job in jobs]
+    wall_seconds = time.time() - start
+
+    totals = dict(
+        (name, {'seconds': 0.0, 'connections': 0, 'statements': 0})
+        for name in PHASES
+    )
+    for result in results:
+        for name in PHASES:
+            for key in totals[name]:
+                totals[name][key] += result['phases'][name][key]
+    return {
+        'events': results,
+        'workers': workers,
+        'wall_seconds': wall_seconds,
+        'events_per_hour': 3600 * events / wall_seconds,
+        'phases': totals,
+    }
+
+
+def _simulateInWorker(job):
+    """Plays one event with the backend and database of the job."""
+    backend, dsn, options = job
+    if backend is not None:
+        tournament.setBackend(backend)
+    if dsn is not None:
+        tournament.configurePool(dsn=dsn)
+    instrumentation.enable(slow_query_seconds=None)
+    return simulateEvent(**options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--players', type=int, default=1024)
+    parser.add_argument(
+        '--rounds', type=int, default=None,
+        help="rounds per event; defaults to log2 of the number of players"
+    )
+    parser.add_argument('--outcome', choices=[RANDOM, ELO], default=RANDOM)
+    parser.add_argument(
+        '--tie-rate', type=float, default=0.0,
+        help="probability that a match ends in a tie"
+    )
+    parser.add_argument(
+        '--method', choices=[tournament.GREEDY, tournament.OPTIMAL],
+        default=tournament.GREEDY
+    )
+    parser.add_argument(
+        '--bulk', action='store_true',
+        help="register and report with registerPlayers() and reportMatches()"
+    )
+    parser.add_argument('--events', type=int, default=1)
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="number of worker processes playing events in parallel"
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--backend', default=None,
+        help="storage backend; defaults to TOURNAMENT_BACKEND or postgres"
+    )
+    parser.add_argument(
+        '--dsn', default=None, help="database to play the events in"
+    )
+
+    args = parser.parse_args(argv)
+    result = simulate(
+        events=args.events, workers=args.workers, backend=args.backend,
+        dsn=args.dsn, player_count=args.players, rounds=args.rounds,
+        outcome=args.outcome, tie_rate=args.tie_rate, method=args.method,
+        bulk=args.bulk, seed=args.seed
+    )
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
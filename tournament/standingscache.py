@@ -0,0 +1,112 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Cache of standings reads, see playerStandings().
+
+Entries are keyed by tournament id and the arguments of the read, and hold
+the result version of the tournament they were read at, see
+Backend.resultVersion(). The backend bumps the version in the same
+transaction as every write, whichever process makes it, so an entry is
+only served while the version read back from the backend still matches;
+otherwise the read is made again and replaces the entry.
+"""
+import threading
+from collections import OrderedDict
+
+# Number of standings reads kept, across all tournaments.
+DEFAULT_MAX_ENTRIES = 256
+
+
+class StandingsCache(object):
+    """Bounded cache of standings rows, evicting the least recently used.
+
+    All methods are safe to call from several threads. Rows are computed
+    outside the lock, so a slow read does not block the others.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 0:
+            raise ValueError("The cache cannot hold fewer than 0 entries.")
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        # (tournament id,) + arguments -> (version, tuple of rows)
+        self._entries = OrderedDict()
+        self._hits = self._misses = 0
+        self._evictions = self._invalidations = 0
+
+    def fetch(self, tournament_id, version, arguments, compute):
+        """Returns the cached rows of a read, computing them on a miss.
+
+        Args:
+          tournament_id: id of the tournament read.
+          version: current result version of the tournament; None if it
+            has none, in which case nothing is cached.
+          arguments: a hashable tuple of the arguments of the read.
+          compute: function returning the rows from the backend.
+
+        Returns:
+          A new list of the rows, which the caller may modify.
+        """
+        key = (tournament_id,) + arguments
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries[key] = self._entries.pop(key)
+                self._hits += 1
+                return list(entry[1])
+            self._misses += 1
+            if entry is not None:
+                self._invalidations += 1
+
+        # The rows are at least as recent as the version, which was read
+        # first, so a write landing meanwhile only makes them newer than
+        # their version says.
+        rows = tuple(compute())
+        if version is None:
+            return list(rows)
+        with self._lock:
+            if self._max_entries:
+                entry = self._entries.pop(key, None)
+                # A concurrent read may already have stored newer rows.
+                if entry is None or entry[0] < version:
+                    entry = (version, rows)
+                self._entries[key] = entry
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return list(rows)
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, max_entries):
+        """Changes the number of entries kept and drops every entry."""
+        if max_entries < 0:
+            raise ValueError("The cache cannot hold fewer than 0 entries.")
+        with self._lock:
+            self._max_entries = max_entries
+        self.clear()
+
+    def statistics(self):
+        """Returns the counters of the cache.
+
+        Returns:
+          A dict with the number of hits, misses, evictions and
+          invalidations, misses on an entry left behind by a write, since
+          the cache was created, the hit_ratio of all reads, and the number
+          of entries held out of max_entries.
+        """
+        with self._lock:
+            reads = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': self._hits / float(reads) if reads else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'entries': len(self._entries),
+                'max_entries': self._max_entries,
+            }
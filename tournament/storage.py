@@ -0,0 +1,329 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Storage backends behind the tournament API.
+
+The functions in tournament.py resolve the tournament and pair players; all
+the data they read and write goes through a backend. Two backends ship with
+the module:
+  postgres: the PostgreSQL schema in tournament.sql (the default)
+  memory: plain Python dicts, for simulations and database-free test runs
+"""
+import importlib
+from collections import namedtuple
+
+# Backend used when none is chosen explicitly, and the environment variable
+# that overrides it.
+DEFAULT_BACKEND = 'postgres'
+BACKEND_ENVIRONMENT_VARIABLE = 'TOURNAMENT_BACKEND'
+
+# Rows fetched per round trip by iterPlayerStandings().
+STANDINGS_BATCH_SIZE = 1000
+
+# Every how many rounds swissPairings() snapshots the standings, see
+# Backend.standingsAfterRound(). Rounds in between are replayed from the
+# match log.
+SNAPSHOT_INTERVAL = 1
+
+# A row of a tournament's standings. Being a tuple it compares equal to, and
+# takes no more memory than, the plain rows read from the database.
+Standing = namedtuple(
+    'Standing', 'tournamentId id name wins losses ties matches omw'
+)
+
+# An entry of a tournament's match log: a reported result, or a correction
+# of the result of an earlier match. Ties list their players as winner and
+# loser; a bye has no loser.
+MatchEvent = namedtuple(
+    'MatchEvent', 'id round matchId winnerId loserId isTie isCorrection'
+)
+
+BACKENDS = {
+    'postgres': ('pgstorage', 'PostgresBackend'),
+    'memory': ('memstorage', 'MemoryBackend'),
+}
+
+
+class Backend(object):
+    """Interface implemented by every storage backend.
+
+    Tournament, player and match ids are integers assigned by the backend,
+    starting from 1 again once their records are deleted. Standings rows are
+    Standing tuples of (tournamentId, id, name, wins, losses, ties, matches,
+    omw).
+    """
+
+    # True if the data lives in the memory of this process, so that worker
+    # processes would each work on a copy of it.
+    process_local = False
+
+    def deleteMatches(self):
+        """Removes every match and resets every player's standing."""
+        raise NotImplementedError
+
+    def deletePlayers(self):
+        """Removes every player along with their matches."""
+        raise NotImplementedError
+
+    def deleteTournaments(self):
+        """Removes every tournament along with its players and matches."""
+        raise NotImplementedError
+
+    def countPlayers(self):
+        """Returns the number of players registered across all tournaments."""
+        raise NotImplementedError
+
+    def createTournament(self):
+        """Creates a new tournament and returns its id."""
+        raise NotImplementedError
+
+    def latestTournamentId(self):
+        """Returns the id of the newest tournament, or None if there is none.
+        """
+        raise NotImplementedError
+
+    def resultVersion(self, tournament_id):
+        """Returns the result version of a tournament, or None if there is
+        no such tournament.
+
+        The version changes whenever the tournament's players or matches
+        change, by whichever process, and is never reused, so standings read
+        at a version are current for as long as it is.
+        """
+        raise NotImplementedError
+
+    def registerPlayer(self, tournament_id, name):
+        """Adds a player to a tournament and returns the player's id."""
+        raise NotImplementedError
+
+    def registerPlayers(self, tournament_id, names):
+        """Adds a list of players to a tournament at once.
+
+        Returns:
+          A list of the new players' ids, in the order of names.
+        """
+        raise NotImplementedError
+
+    def playerStandings(self, tournament_id, limit=None, offset=0):
+        """Returns the standings rows of a tournament, best player first.
+
+        Players are ranked by wins, then ties, then OMW, then id, so that
+        pages of the same standings never overlap.
+
+        Args:
+          tournament_id: id of the tournament.
+          limit: maximum number of rows to return; None returns them all.
+          offset: number of rows to skip first.
+        """
+        raise NotImplementedError
+
+    def iterPlayerStandings(self, tournament_id,
+                            batch_size=STANDINGS_BATCH_SIZE):
+        """Yields the standings rows of a tournament, best player first.
+
+        Rows are fetched batch_size at a time, so memory use is bounded and
+        the first row arrives before the whole standings have been read.
+        """
+        raise NotImplementedError
+
+    def lockTournament(self, tournament_id):
+        """Returns a context manager holding a tournament's exclusive lock.
+
+        Reporting matches takes the same lock, so the tournament cannot
+        change while it is held. Other tournaments are not blocked, and the
+        lock may be taken again by the thread holding it.
+        """
+        raise NotImplementedError
+
+    def reportMatch(self, tournament_id, winner, loser, is_tie):
+        """Records a match; a loser of None records a bye for the winner.
+
+        Raises:
+          ValueError: if the result is rejected by validateResults(); it is
+            not recorded then.
+        """
+        raise NotImplementedError
+
+    def reportMatches(self, tournament_id, results):
+        """Records a list of (winner, loser, is_tie) results atomically.
+
+        Raises:
+          ValueError: if any result is rejected by validateResults(); no
+            result is recorded then.
+        """
+        raise NotImplementedError
+
+    def matchResults(self, tournament_id):
+        """Returns every match of a tournament as (winner, loser, is_tie).
+
+        A loser of None is a bye; ties list their players in no set order.
+        """
+        raise NotImplementedError
+
+    def matchEvents(self, tournament_id):
+        """Returns the match log of a tournament as MatchEvent tuples, in
+        the order the events were recorded."""
+        raise NotImplementedError
+
+    def correctMatch(self, tournament_id, winner, loser, is_tie):
+        """Replaces the result of the latest match between two players.
+
+        The correction is checked by validateCorrection() before anything
+        is read or written, so both backends reject the same corrections. A
+        correction is then appended to the match log with the round of the
+        corrected match, the tournament's standings are recomputed and its
+        snapshots from that round on are dropped.
+
+        Raises:
+          ValueError: if the correction is rejected by validateCorrection(),
+            or the two players have not played each other in the
+            tournament.
+        """
+        raise NotImplementedError
+
+    def snapshotStandings(self, tournament_id, round_number):
+        """Saves a copy of the current standings as those after a round,
+        unless that round already has one."""
+        raise NotImplementedError
+
+    def standingsAfterRound(self, tournament_id, round_number):
+        """Returns the standings rows as they were after a round.
+
+        The standings come straight from the round's snapshot when it has
+        one, and are otherwise rebuilt by replayStandings() from the latest
+        earlier snapshot and the match log after it.
+        """
+        raise NotImplementedError
+
+    def playersWithBye(self, tournament_id):
+        """Returns the set of ids of players who have had a bye."""
+        raise NotImplementedError
+
+    def doesPlayerHaveBye(self, tournament_id, player):
+        """Returns True if the player has had a bye in the tournament."""
+        raise NotImplementedError
+
+    def havePlayersBeenPaired(self, player1, player2):
+        """Returns True if the two players have played each other."""
+        raise NotImplementedError
+
+    def playerOpponents(self, tournament_id):
+        """Returns a dict mapping player ids to the set of their opponents.
+
+        Only players who have played a match appear; byes are not opponents.
+        """
+        raise NotImplementedError
+
+
+def createBackend(name):
+    """Returns a new instance of the backend registered under name.
+
+    Backend modules are only imported when they are first used.
+    """
+    try:
+        module_name, class_name = BACKENDS[name]
+    except KeyError:
+        raise ValueError("Unknown storage backend %r." % (name,))
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)()
+
+
+def validateResults(results, registered):
+    """Checks a list of match results before any of them is recorded.
+
+    Args:
+      results: a list of (winner, loser, is_tie) tuples.
+      registered: a set of the ids of the players in the tournament.
+
+    Raises:
+      ValueError: if a result names a player who is not registered in the
+        tournament, pits a player against themself, or is a tie without a
+        loser.
+    """
+    for i, (winner, loser, is_tie) in enumerate(results):
+        if winner not in registered or (
+                loser is not None and loser not in registered):
+            raise ValueError(
+                "Result %d names a player who is not registered in the "
+                "tournament." % i
+            )
+        if winner == loser:
+            raise ValueError("Result %d pits a player against themself." % i)
+        if is_tie and loser is None:
+            raise ValueError("Result %d is a tie without a loser." % i)
+
+
+def validateCorrection(winner, loser, is_tie, registered):
+    """Checks the new result of a match before it is corrected.
+
+    Args:
+      winner: the id of the player who actually won.
+      loser: the id of the player who actually lost.
+      is_tie: true if the match actually ended in a tie.
+      registered: a set of the ids of the players in the tournament.
+
+    Raises:
+      ValueError: if the result has no loser, since byes are not corrected,
+        or is rejected by validateResults().
+    """
+    if loser is None:
+        raise ValueError("A bye cannot be corrected.")
+    validateResults([(winner, loser, is_tie)], registered)
+
+
+def replayStandings(tournament_id, names, snapshot, results, pairs):
+    """Rebuilds standings from a snapshot and the results recorded after it.
+
+    Win, loss, tie and match counts are the snapshot's plus those of the
+    results. OMW is recomputed from the opponent pairs, since a new result
+    changes the OMW of everyone its players met before.
+
+    Args:
+      tournament_id: id of the tournament.
+      names: a dict mapping the id of every player of the tournament to
+        their name.
+      snapshot: a dict mapping player ids to their (wins, losses, ties,
+        matches) at the snapshot; players left out start from zero.
+      results: the (winner, loser, is_tie) results after the snapshot, up
+        to the round being rebuilt.
+      pairs: (player1, player2) of every match up to that round; byes are
+        left out.
+
+    Returns:
+      A list of Standing tuples, best player first.
+    """
+    counts = dict(
+        (player_id, list(snapshot.get(player_id, (0, 0, 0, 0))))
+        for player_id in names
+    )
+    for winner, loser, is_tie in results:
+        counts[winner][3] += 1
+        if loser is None:
+            counts[winner][0] += 1
+            continue
+        counts[loser][3] += 1
+        if is_tie:
+            counts[winner][2] += 1
+            counts[loser][2] += 1
+        else:
+            counts[winner][0] += 1
+            counts[loser][1] += 1
+
+    opponents = {}
+    for player1, player2 in pairs:
+        opponents.setdefault(player1, set()).add(player2)
+        opponents.setdefault(player2, set()).add(player1)
+    points = dict(
+        (player_id, wins * 4 + ties)
+        for player_id, (wins, losses, ties, matches) in counts.items()
+    )
+    rows = [
+        Standing(
+            tournament_id, player_id, names[player_id], wins, losses, ties,
+            matches, sum(points[o] for o in opponents.get(player_id, ()))
+        )
+        for player_id, (wins, losses, ties, matches) in counts.items()
+    ]
+    rows.sort(key=lambda p: (-p.wins, -p.ties, -p.omw, p.id))
+    return rows
@@ -0,0 +1,126 @@
+"""
+Copyright 2015 Brian Quach
+Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
+
+Tiebreakers computed in memory from a tournament's match results, see
+playerStandings(tiebreakers=...) and playerTiebreakers().
+
+Match points are 4 per win, bye included, and 1 per tie, as for OMW.
+Percentages follow Wizard's tiebreakers: a player's match-win percentage is
+their match points over 4 per match played, floored at 1/3, and byes are
+not opponents.
+  https://www.wizards.com/dci/downloads/tiebreakers.pdf
+"""
+from __future__ import division
+
+# Tiebreakers accepted by playerStandings() and returned by computeTiebreakers
+OMW = 'omw'
+MATCH_WIN_PERCENTAGE = 'match_win_percentage'
+OMW_PERCENTAGE = 'omw_percentage'
+OOW_PERCENTAGE = 'oow_percentage'
+BUCHHOLZ = 'buchholz'
+SONNEBORN_BERGER = 'sonneborn_berger'
+TIEBREAKERS = (
+    OMW, MATCH_WIN_PERCENTAGE, OMW_PERCENTAGE, OOW_PERCENTAGE, BUCHHOLZ,
+    SONNEBORN_BERGER
+)
+
+# Lowest match-win percentage counted for an opponent.
+MINIMUM_PERCENTAGE = 1 / 3
+
+
+def computeTiebreakers(player_ids, results):
+    """Computes every tiebreaker of every player in one pass over results.
+
+    Args:
+      player_ids: ids of the players of the tournament.
+      results: an iterable of (winner, loser, is_tie) tuples, as returned by
+        matchResults(); a loser of None is a bye.
+
+    Returns:
+      A dict mapping each player id to a dict of their tiebreakers:
+        omw: match points of their distinct opponents, like playerStandings()
+        match_win_percentage: their own match-win percentage
+        omw_percentage: average match-win percentage of their distinct
+          opponents
+        oow_percentage: average OMW percentage of their distinct opponents
+        buchholz: match points of their opponent in every match they played
+        sonneborn_berger: match points of every opponent they beat, plus
+          half of those of every opponent they tied
+    """
+    points = dict((p, 0) for p in player_ids)
+    matches = dict((p, 0) for p in player_ids)
+    faced = dict((p, []) for p in player_ids)
+    beaten = dict((p, []) for p in player_ids)
+    tied = dict((p, []) for p in player_ids)
+    for winner, loser, is_tie in results:
+        matches[winner] += 1
+        if loser is None:
+            points[winner] += 4
+            continue
+        matches[loser] += 1
+        faced[winner].append(loser)
+        faced[loser].append(winner)
+        if is_tie:
+            points[winner] += 1
+            points[loser] += 1
+            tied[winner].append(loser)
+            tied[loser].append(winner)
+        else:
+            points[winner] += 4
+            beaten[winner].append(loser)
+
+    match_win_percentage = dict(
+        (p, max(MINIMUM_PERCENTAGE, points[p] / (4 * matches[p]))
+         if matches[p] else MINIMUM_PERCENTAGE)
+        for p in player_ids
+    )
+    opponents = dict((p, set(faced[p])) for p in player_ids)
+    omw_percentage = dict(
+        (p, _average(match_win_percentage[o] for o in opponents[p]))
+        for p in player_ids
+    )
+
+    tiebreakers = {}
+    for p in player_ids:
+        tiebreakers[p] = {
+            OMW: sum(points[o] for o in opponents[p]),
+            MATCH_WIN_PERCENTAGE: match_win_percentage[p],
+            OMW_PERCENTAGE: omw_percentage[p],
+            OOW_PERCENTAGE: _average(
+                omw_percentage[o] for o in opponents[p]
+            ),
+            BUCHHOLZ: sum(points[o] for o in faced[p]),
+            SONNEBORN_BERGER: (
+                sum(points[o] for o in beaten[p]) +
+                sum(points[o] for o in tied[p]) / 2
+            ),
+        }
+    return tiebreakers
+
+
+def sortStandings(players, tiebreakers, chain):
+    """Sorts standings rows by wins, ties and then a chain of tiebreakers.
+
+    Args:
+      players: Standing rows of playerStandings(True).
+      tiebreakers: the dict returned by computeTiebreakers().
+      chain: a sequence of tiebreaker names, most significant first.
+
+    Returns:
+      A new list of the rows, best player first.
+    """
+    for name in chain:
+        if name not in TIEBREAKERS:
+            raise ValueError("Unknown tiebreaker %r." % (name,))
+    return sorted(players, key=lambda p: (
+        (-p.wins, -p.ties) +
+        tuple(-tiebreakers[p.id][name] for name in chain) +
+        (p.id,)
+    ))
+
+
+def _average(values):
+    """Returns the mean of values, or 0 when there are none."""
+    values = list(values)
+    return sum(values) / len(values) if values else 0
@@ -2,53 +2,137 @@
 Copyright 2015 Brian Quach
 Licensed under MIT (https://github.com/brianquach/udacity-nano-fullstack-tournament/blob/master/LICENSE)  # noqa
 """
-import random
-import psycopg2
-from contextlib import contextmanager
+import multiprocessing
+import os
+import threading
+import db
+import instrumentation
+import pairing
+import standingscache
+import storage
+import tiebreakers as _tiebreakers
+from multiprocessing import pool as _thread_pool
+from db import configurePool, connect, get_cursor  # noqa
+from pairing import GREEDY, OPTIMAL  # noqa
+from tiebreakers import (  # noqa
+    BUCHHOLZ, MATCH_WIN_PERCENTAGE, OMW, OMW_PERCENTAGE, OOW_PERCENTAGE,
+    SONNEBORN_BERGER
+)
+
+# Id of the active tournament, cached by activeTournamentId().
+_active_tournament_id = None
+_active_tournament_lock = threading.Lock()
+
+# Reads of playerStandings() cached until their tournament is written to, see
+# configureStandingsCache().
+_standings_cache = standingscache.StandingsCache()
+
+# Storage backend every function reads from and writes to, see getBackend().
+_backend = None
+_backend_lock = threading.Lock()
+
+# Worker pool of swissPairingsBatch(), kept between calls, and the (kind,
+# size, database, backend) it was started for; see _pairingWorkers().
+_pairing_workers = None
+_pairing_workers_key = None
+_pairing_workers_lock = threading.Lock()
+
+
+def getBackend():
+    """Returns the storage backend the tournament functions use.
+
+    Unless setBackend() was called, the backend is created on first use from
+    the TOURNAMENT_BACKEND environment variable, 'postgres' or 'memory', and
+    defaults to PostgreSQL.
+    """
+    global _backend
+    backend = _backend
+    if backend is not None:
+        return backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = storage.createBackend(os.environ.get(
+                storage.BACKEND_ENVIRONMENT_VARIABLE, storage.DEFAULT_BACKEND
+            ))
+        return _backend
 
 
-@contextmanager
-def get_cursor():
-    """Returns a context manager that will handle our database connection"""
-    conn = connect()
-    c = conn.cursor()
-    try:
-        yield c
-    except:
-        raise
-    else:
-        conn.commit()
-    finally:
-        c.close()
-        conn.close()
+def setBackend(backend):
+    """Makes every tournament function use another storage backend.
+
+    The cached active tournament is forgotten, since it belongs to the
+    previous backend.
+
+    Args:
+      backend: a storage.Backend instance, or the name of a registered
+        backend: 'postgres' or 'memory'.
 
+    Returns:
+      The backend now in use.
+    """
+    global _backend
+    if not isinstance(backend, storage.Backend):
+        backend = storage.createBackend(backend)
+    with _backend_lock:
+        _backend = backend
+    clearActiveTournament()
+    _standings_cache.clear()
+    return backend
+
+
+def configureStandingsCache(max_entries=standingscache.DEFAULT_MAX_ENTRIES):
+    """Sets how many reads of playerStandings() are cached.
+
+    A read is cached until its tournament is written to: registering
+    players, reporting or correcting matches, pairing a round that grants a
+    bye, or deleting. The backend bumps the tournament's result version in
+    the same transaction as each of these writes, whichever process makes
+    it, and every read checks the version before returning cached rows, see
+    storage.Backend.resultVersion(). Least recently used reads are evicted
+    first once max_entries are held, whatever their tournament. Every entry
+    is dropped.
 
-def connect():
-    """Connect to the PostgreSQL database.  Returns a database connection."""
-    return psycopg2.connect("dbname=tournament")
+    Args:
+      max_entries: number of reads kept across all tournaments; 0 disables
+        the cache.
+    """
+    _standings_cache.resize(max_entries)
+
+
+def standingsCacheStatistics():
+    """Returns the hit and miss counters of the playerStandings() cache.
+
+    Returns:
+      A dict with the number of hits, misses, evictions and invalidations,
+      misses on a read outdated by a write, the hit_ratio of all reads, and
+      the number of entries held out of max_entries; see
+      standingscache.StandingsCache.statistics().
+    """
+    return _standings_cache.statistics()
 
 
 def deleteMatches():
     """Remove all the match records from the database."""
-    with get_cursor() as c:
-        c.execute("TRUNCATE match RESTART IDENTITY CASCADE")
+    try:
+        getBackend().deleteMatches()
+    finally:
+        _standings_cache.clear()
 
 
 def deletePlayers():
     """Remove all the player records from the database."""
-    with get_cursor() as c:
-        c.execute("TRUNCATE player RESTART IDENTITY CASCADE")
+    try:
+        getBackend().deletePlayers()
+    finally:
+        _standings_cache.clear()
 
 
 def countPlayers():
     """Returns the number of players currently registered."""
-    with get_cursor() as c:
-        c.execute("SELECT COUNT(id) FROM player")
-        row = c.fetchone()
-    return row[0] if row is not None else 0
+    return getBackend().countPlayers()
 
 
-def registerPlayer(name):
+def registerPlayer(name, tournament_id=None):
     """Adds a player to the tournament database.
 
     The database assigns a unique serial id number for the player.  (This
@@ -56,19 +140,40 @@ def registerPlayer(name):
 
     Args:
       name: the player's full name (need not be unique).
+      tournament_id: id of the tournament; defaults to the active tournament
 
     Returns:
       Newly registered player's Id
     """
-    tournament_id = activeTournamentId()
-    with get_cursor() as c:
-        c.execute("INSERT INTO player (name, tournamentId) VALUES (%s, %s) "
-                  "RETURNING id", (name, tournament_id))
-        player_id = c.fetchone()[0]
-    return player_id
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    return getBackend().registerPlayer(tournament_id, name)
 
 
-def playerStandings(show_all_columns=False):
+def registerPlayers(names, tournament_id=None):
+    """Adds many players to the tournament database in a single transaction.
+
+    Meant for importing a whole check-in list: ids are reserved from the
+    player sequence in one query and the players are streamed to the
+    database with COPY.
+
+    Args:
+      names: an iterable of the players' full names.
+      tournament_id: id of the tournament; defaults to the active tournament
+
+    Returns:
+      A list of the newly registered players' ids, in the order of names.
+    """
+    names = list(names)
+    if not names:
+        return []
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    return getBackend().registerPlayers(tournament_id, names)
+
+
+def playerStandings(show_all_columns=False, tournament_id=None,
+                    tiebreakers=None, limit=None, offset=0):
     """Returns a list of the players and their win records, sorted by wins.
 
     Player standings are ranked in descending order first by wins, then ties,
@@ -77,12 +182,32 @@ def playerStandings(show_all_columns=False):
     against. Optional parameter show_all_columns added in for backwards
     compatability with original test cases from the code fork.
 
+    Standings are read from the standing table, which reportMatch() keeps up
+    to date, so the cost of a read does not grow with the match history.
+    Reads are then cached until the tournament is written to, which is
+    checked with one primary key read, see configureStandingsCache().
+
     Opponent Match Wins based off Wizard's OMW:
       https://www.wizards.com/dci/downloads/tiebreakers.pdf
 
+    Players tied on wins and ties can instead be ranked by a chain of other
+    tiebreakers, computed from the tournament's match results by
+    tiebreakers.computeTiebreakers().
+
+    A page of the standings, e.g. the top 8 of a leaderboard, is read with
+    limit and offset; the backend then only returns those rows, unless
+    tiebreakers are given and the whole tournament has to be ranked first.
+    To walk every row of a very large tournament use iterPlayerStandings().
+
     Args:
       show_all_columns: if true all the columns from playerStanding will be
         returned.
+      tournament_id: id of the tournament; defaults to the active tournament
+      tiebreakers: a sequence of tiebreaker names from tiebreakers.py, most
+        significant first, e.g. (OMW_PERCENTAGE, OOW_PERCENTAGE); defaults to
+        OMW
+      limit: maximum number of players to return; None returns them all
+      offset: number of players to skip, counted from first place
 
     Returns:
       A list of tuples, each of which contains (id, name, wins, matches):
@@ -90,31 +215,99 @@ def playerStandings(show_all_columns=False):
         name: the player's full name (as registered)
         wins: the number of matches the player has won
         matches: the number of matches the player has played
-      Or when show_all_columns is True a list of tupes, each of which contains
-      the above and (tournamentId, losses, ties, omw):
+      Or when show_all_columns is True a list of storage.Standing named
+      tuples, each of which contains the above and (tournamentId, losses,
+      ties, omw):
         tournamentId: the tournament's unique id (assigned by the database)
         losses: the number of matches the player has lost
         ties: the number of matches the player has tied
         omw: the total points added up from player's opponent's wins and ties
     """
 
-    # The reason why there are two queries below is that one is used to pass
-    # the original Udacity tests, therefore keeping backward compatibily. And
-    # other is used for everything else.
-
-    tournament_id = activeTournamentId()
+    # The reason why there are two shapes of rows below is that one is used
+    # to pass the original Udacity tests, therefore keeping backward
+    # compatibily. And other is used for everything else.
+
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    tiebreakers = tuple(tiebreakers or ())
+    player_standings = _standings_cache.fetch(
+        tournament_id, getBackend().resultVersion(tournament_id),
+        (tiebreakers, limit, offset),
+        lambda: _readStandings(tournament_id, tiebreakers, limit, offset)
+    )
     if show_all_columns:
-        query = "SELECT * FROM player_standing WHERE tournamentId = %s"
-    else:
-        query = """SELECT id, name, wins, matches FROM player_standing WHERE
-                tournamentId = %s"""
-    with get_cursor() as c:
-        c.execute(query, (tournament_id,))
-        player_standings = c.fetchall()
-    return player_standings
+        return player_standings
+    return [(p.id, p.name, p.wins, p.matches) for p in player_standings]
+
+
+def _readStandings(tournament_id, tiebreakers, limit, offset):
+    """Reads standings rows from the backend; see playerStandings()."""
+    if not tiebreakers:
+        return getBackend().playerStandings(tournament_id, limit, offset)
+    player_standings = getBackend().playerStandings(tournament_id)
+    player_standings = _tiebreakers.sortStandings(
+        player_standings,
+        playerTiebreakers(tournament_id, player_standings),
+        tiebreakers
+    )
+    stop = None if limit is None else offset + limit
+    return player_standings[offset:stop]
+
+
+def iterPlayerStandings(show_all_columns=False, tournament_id=None,
+                        batch_size=storage.STANDINGS_BATCH_SIZE):
+    """Yields the players and their win records, best player first.
+
+    Rows come in the order and shapes of playerStandings(), but are fetched
+    from the backend batch_size at a time, through a server-side cursor with
+    PostgreSQL. Rendering the leaderboard of a very large tournament thus
+    uses bounded memory and starts as soon as the first batch arrives.
 
+    The backend may hold a database connection until the generator is
+    exhausted or closed, so iterate it to the end or close it promptly.
 
-def reportMatch(winner, loser, is_tie=False):
+    Args:
+      show_all_columns: if true all the columns from playerStanding will be
+        yielded.
+      tournament_id: id of the tournament; defaults to the active tournament
+      batch_size: number of rows fetched per round trip to the database
+    """
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    for p in getBackend().iterPlayerStandings(tournament_id, batch_size):
+        if show_all_columns:
+            yield p
+        else:
+            yield (p.id, p.name, p.wins, p.matches)
+
+
+def playerTiebreakers(tournament_id=None, players=None):
+    """Computes every tiebreaker of every player in a tournament.
+
+    The tournament's match results are loaded with a single query and all
+    tiebreakers are computed from them in one pass, see
+    tiebreakers.computeTiebreakers().
+
+    Args:
+      tournament_id: id of the tournament; defaults to the active tournament
+      players: rows of playerStandings(True) of the tournament, when already
+        fetched
+
+    Returns:
+      A dict mapping each player id to a dict of their tiebreakers by name.
+    """
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    backend = getBackend()
+    if players is None:
+        players = backend.playerStandings(tournament_id)
+    return _tiebreakers.computeTiebreakers(
+        [p.id for p in players], backend.matchResults(tournament_id)
+    )
+
+
+def reportMatch(winner, loser, is_tie=False, tournament_id=None):
     """Records the outcome of a single match between two players.
 
     If there is a winner but no loser then the winner has received a 'bye' or a
@@ -124,29 +317,116 @@ def reportMatch(winner, loser, is_tie=False):
       winner: the id number of the player who won
       loser: the id number of the player who lost
       is_tie: true if the match ended in a tie, otherwise false
+      tournament_id: id of the tournament; defaults to the active tournament
+
+    Raises:
+      ValueError: if a player is not registered in the tournament, the
+        players are the same, or a tie has no loser.
     """
-    tournament_id = activeTournamentId()
-    with get_cursor() as c:
-        if is_tie:
-            c.execute(
-                "INSERT INTO match (tournamentId, isTie) VALUES"
-                "(%s, %s) RETURNING id", (tournament_id, is_tie)
-            )
-            match_id = c.fetchone()[0]
-            c.execute(
-                "INSERT INTO match_tie (matchId, playerId) VALUES "
-                "(%s, %s), (%s, %s)", (match_id, winner, match_id, loser)
-            )
-        else:
-            c.execute(
-                "INSERT INTO match (tournamentId, winnerId, loserId, isTie) "
-                "VALUES (%s, %s, %s, %s) RETURNING id", (
-                    tournament_id, winner, loser, is_tie
-                )
-            )
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    getBackend().reportMatch(tournament_id, winner, loser, is_tie)
 
 
-def swissPairings():
+def reportMatches(results, tournament_id=None):
+    """Records the outcomes of many matches in a single transaction.
+
+    Meant for submitting a whole round at once: the matches are written with
+    multi-row INSERTs and the standings of the tournament are recomputed once
+    afterwards. Either every result is recorded or, if any result is invalid,
+    none are.
+
+    Args:
+      results: an iterable of (winner, loser, is_tie) tuples with the same
+        meaning as the arguments of reportMatch(); is_tie may be left out.
+      tournament_id: id of the tournament; defaults to the active tournament
+
+    Raises:
+      ValueError: if a result names a player who is not registered in the
+        tournament, pits a player against themself, or is a tie
+        without a loser.
+    """
+    results = [
+        (result[0], result[1], bool(result[2]) if len(result) > 2 else False)
+        for result in results
+    ]
+    if not results:
+        return
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    getBackend().reportMatches(tournament_id, results)
+
+
+def correctMatch(winner, loser, is_tie=False, tournament_id=None):
+    """Corrects the result of the latest match between two players.
+
+    The match keeps its round, the correction is appended to the match log
+    and the standings are recomputed from the corrected results. Standings
+    of the rounds since the match are rebuilt by standingsAfterRound().
+
+    Args:
+      winner: the id number of the player who actually won
+      loser: the id number of the player who actually lost
+      is_tie: true if the match actually ended in a tie
+      tournament_id: id of the tournament; defaults to the active tournament
+
+    Raises:
+      ValueError: if loser is None, since byes are not corrected, if the
+        result names a player who is not registered in the tournament or
+        pits a player against themself, or if the two players have not
+        played each other in the tournament.
+    """
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    getBackend().correctMatch(tournament_id, winner, loser, bool(is_tie))
+
+
+def matchEvents(tournament_id=None):
+    """Returns the match log of a tournament.
+
+    Every reported result and every correction is an entry of the log, in
+    the order they were recorded.
+
+    Args:
+      tournament_id: id of the tournament; defaults to the active tournament
+
+    Returns:
+      A list of storage.MatchEvent named tuples, each of which contains
+      (id, round, matchId, winnerId, loserId, isTie, isCorrection).
+    """
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    return getBackend().matchEvents(tournament_id)
+
+
+def standingsAfterRound(round_number, show_all_columns=False,
+                        tournament_id=None):
+    """Returns the standings of a tournament as they were after a round.
+
+    swissPairings() snapshots the standings every storage.SNAPSHOT_INTERVAL
+    rounds; the standings after other rounds are replayed from the latest
+    earlier snapshot and the match log, with corrections applied.
+
+    Args:
+      round_number: the round, counted from 1
+      show_all_columns: if true all the columns from playerStanding will be
+        returned.
+      tournament_id: id of the tournament; defaults to the active tournament
+
+    Returns:
+      A list of rows in the shapes and order of playerStandings().
+    """
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    player_standings = getBackend().standingsAfterRound(
+        tournament_id, round_number
+    )
+    if show_all_columns:
+        return player_standings
+    return [(p.id, p.name, p.wins, p.matches) for p in player_standings]
+
+
+def swissPairings(tournament_id=None, method=GREEDY):
     """Returns a list of pairs of players for the next round of a match.
 
     Assuming that there are an even number of players registered, each player
@@ -161,6 +441,24 @@ def swissPairings():
     Swiss pairing structured after Wizard's swiss-pairing system:
       http://www.wizards.com/dci/downloads/swiss_pairings.pdf
 
+    The standings are bucketed into score groups that are paired one by one,
+    with a player floating down from every odd group into the next, see
+    pairing.bracketPairings().
+
+    With method OPTIMAL the round is instead solved as a minimum-cost perfect
+    matching over score differences, rematches and bye history, see
+    pairing.optimalPairings(). The bye then goes to the lowest ranked player
+    without one.
+
+    The tournament is locked while a round is paired, so concurrent calls
+    for the same tournament, from any thread or process, run one after the
+    other. Pairing a round again before its results are in keeps the bye it
+    already granted instead of granting another one.
+
+    Args:
+      tournament_id: id of the tournament; defaults to the active tournament
+      method: GREEDY or OPTIMAL
+
     Returns:
       A list of tuples, each of which contains (id1, name1, id2, name2)
         id1: the first player's unique id
@@ -168,69 +466,173 @@ def swissPairings():
         id2: the second player's unique id
         name2: the second player's name
     """
-    pairings = []
-    players = playerStandings(True)
-    index = 0
-    player_count = len(players)
-    is_player_count_odd = (player_count % 2) != 0
-    if player_count == 0:
-        return []
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    backend = getBackend()
+    with backend.lockTournament(tournament_id):
+        steps = pairing.pairNextRound(
+            playerStandings(True, tournament_id), method
+        )
+        step = next(steps)
+        while isinstance(step, pairing.Call):
+            step = steps.send(
+                getattr(backend, step.method)(tournament_id, *step.arguments)
+            )
+    return step
+
+
+def swissPairingsBatch(tournament_ids, method=GREEDY, workers=None,
+                       processes=True):
+    """Pairs the next round of many tournaments in parallel.
+
+    Each tournament is paired by swissPairings() in a worker of a process
+    pool, or of a thread pool if processes is false. Worker processes open
+    their own connection pool of one connection to the database this
+    process uses; worker threads share this process's pool, so workers
+    should not exceed db.poolSize(). Threads suit the in-memory backend and
+    greedy pairing, which mostly waits on the database; processes also run
+    the pairing itself, e.g. with OPTIMAL, on every core.
+
+    The workers are started by the first call and kept for the next ones,
+    since starting them costs more than pairing a round of a small
+    tournament; closePool() stops them. Batches run one at a time.
+
+    Args:
+      tournament_ids: ids of the tournaments to pair.
+      method: GREEDY or OPTIMAL
+      workers: size of the pool; defaults to the number of cores for
+        processes and to the size of the connection pool for threads.
+      processes: pair in worker processes rather than threads.
+
+    Returns:
+      A tuple of two dicts, (pairings, errors). pairings maps the id of every
+      tournament that was paired to what swissPairings() returned for it;
+      errors maps the id of every tournament that failed to the exception
+      raised while pairing it.
+
+    Raises:
+      ValueError: if method is unknown, or processes is true while the
+        backend keeps its data in this process.
+    """
+    if method not in (GREEDY, OPTIMAL):
+        raise ValueError("Unknown pairing method %r." % (method,))
+    tournament_ids = list(tournament_ids)
+    if processes and getBackend().process_local:
+        raise ValueError(
+            "Worker processes cannot share an in-process backend; pair with "
+            "threads instead."
+        )
+    if workers is None:
+        workers = (
+            multiprocessing.cpu_count() if processes else db.poolSize()
+        )
+    if not tournament_ids:
+        return {}, {}
+
+    jobs = [(tournament_id, method) for tournament_id in tournament_ids]
+    with _pairing_workers_lock:
+        outcomes = _pairingWorkers(max(1, workers), processes).map(
+            _pairInWorker, jobs, chunksize=1
+        )
+
+    pairings = {}
+    errors = {}
+    for tournament_id, round_pairings, error in outcomes:
+        if error is None:
+            pairings[tournament_id] = round_pairings
+        else:
+            errors[tournament_id] = error
+    return pairings, errors
+
 
-    matchCount = players[0][6]
-    if matchCount == 0:
-        random.shuffle(players)
-
-    # If there is an odd number of players, a player will be chosen starting
-    # from the top and moving downwards until a player with no 'byes' is found,
-    # to be given a bye. The rest of the players will then be paired.
-
-    if is_player_count_odd:
-        player_with_bye = None
-        for player in players:
-            if not doesPlayerHaveBye(player[1]):
-                reportMatch(player[1], None, False)
-                player_with_bye = player
-                break
-        if player_with_bye is not None:
-            players.remove(player_with_bye)
-
-    while len(players) > 0:
-        player1 = players.pop()
-        player2 = players.pop()
-
-        # If two players have already played against each other, look down the
-        # list of players [higher ranked] until two players are found who have
-        # not yet played against each other. Only if a player has played
-        # against everyone down the list will a rematch be allowed.
-
-        if havePlayersBeenPaired(player1[1], player2[1]):
-            new_pair_found = False
-            players.append(player2)
-            for i in range((len(players) - 2), -1, -1):
-                player2 = players[i]
-                if not havePlayersBeenPaired(player1[1], player2[1]):
-                    players.remove(player2)
-                    new_pair_found = True
-                    break
-            if not new_pair_found:
-                player2 = players.pop()
-        pairings.append((player1[1], player1[2], player2[1], player2[2]))
-
-    return pairings
+def closePool():
+    """Stops the workers of swissPairingsBatch() and closes every connection
+    held by the shared connection pool, see db.closePool()."""
+    with _pairing_workers_lock:
+        _closePairingWorkers()
+    db.closePool()
+
+
+def _pairingWorkers(workers, processes):
+    """Returns the worker pool of swissPairingsBatch(), starting it if none
+    is running for the same kind and size of pool, database and backend.
+
+    Must be called while holding _pairing_workers_lock.
+    """
+    global _pairing_workers, _pairing_workers_key
+    key = (processes, workers, db.poolDsn(), getBackend())
+    if _pairing_workers is not None and _pairing_workers_key != key:
+        _closePairingWorkers()
+    if _pairing_workers is None:
+        if processes:
+            _pairing_workers = multiprocessing.Pool(
+                workers, _initPairingWorker, (db.poolDsn(),)
+            )
+        else:
+            _pairing_workers = _thread_pool.ThreadPool(workers)
+        _pairing_workers_key = key
+    return _pairing_workers
+
+
+def _closePairingWorkers():
+    """Stops the worker pool of swissPairingsBatch(), if one is running.
+
+    Must be called while holding _pairing_workers_lock.
+    """
+    global _pairing_workers, _pairing_workers_key
+    if _pairing_workers is not None:
+        _pairing_workers.close()
+        _pairing_workers.join()
+    _pairing_workers = None
+    _pairing_workers_key = None
+
+
+def _initPairingWorker(dsn):
+    """Gives a pairing worker process a pool of its own single connection.
+
+    Workers are forked, so they start with copies of this process's pool
+    and locks, which other threads may have held while forking. The pool is
+    forgotten without closing the connections it shares with this process,
+    see db.forgetPool(), and every lock is replaced.
+    """
+    global _active_tournament_lock, _backend_lock, _pairing_workers
+    global _pairing_workers_key, _pairing_workers_lock, _standings_cache
+    db.forgetPool()
+    instrumentation.resetAfterFork()
+    _standings_cache = standingscache.StandingsCache()
+    _active_tournament_lock = threading.Lock()
+    _backend_lock = threading.Lock()
+    _pairing_workers = None
+    _pairing_workers_key = None
+    _pairing_workers_lock = threading.Lock()
+    configurePool(max_connections=1, dsn=dsn)
+
+
+def _pairInWorker(job):
+    """Pairs one tournament, returning (tournament_id, pairings, error)."""
+    tournament_id, method = job
+    try:
+        return tournament_id, swissPairings(tournament_id, method), None
+    except Exception as e:
+        return tournament_id, None, e
 
 
 def createTournament():
-    """Creates a new tournament and returns its id."""
-    with get_cursor() as c:
-        c.execute("INSERT INTO tournament (id) VALUES (DEFAULT) RETURNING id")
-        tournament_id = c.fetchone()[0]
+    """Creates a new tournament, makes it the active one and returns its id."""
+    global _active_tournament_id
+    tournament_id = getBackend().createTournament()
+    _active_tournament_id = tournament_id
     return tournament_id
 
 
 def deleteTournaments():
     """Remove all tournament records from the database."""
-    with get_cursor() as c:
-        c. execute("TRUNCATE tournament RESTART IDENTITY CASCADE")
+    global _active_tournament_id
+    try:
+        getBackend().deleteTournaments()
+    finally:
+        _standings_cache.clear()
+    _active_tournament_id = None
 
 
 def activeTournamentId():
@@ -239,32 +641,60 @@ def activeTournamentId():
     An active tournament is the most recent tournament where players are still
     playing with no winner. If there are no tournaments then a new one will be
     created and its id returned.
+
+    The id is looked up once and cached for the rest of the process;
+    createTournament() and deleteTournaments() update the cache. Tournaments
+    created by other processes are only picked up after calling
+    clearActiveTournament().
+
+    Code driving several tournaments at once should pass explicit tournament
+    ids to every function instead of relying on the active tournament.
     """
-    with get_cursor() as c:
-        c.execute("SELECT id FROM tournament ORDER BY id DESC LIMIT 1")
-        row = c.fetchone()
-        tournament_id = createTournament() if row is None else row[0]
+    global _active_tournament_id
+    tournament_id = _active_tournament_id
+    if tournament_id is not None:
+        return tournament_id
+    with _active_tournament_lock:
+        tournament_id = _active_tournament_id
+        if tournament_id is None:
+            tournament_id = getBackend().latestTournamentId()
+            if tournament_id is None:
+                tournament_id = createTournament()
+            _active_tournament_id = tournament_id
     return tournament_id
 
 
-def doesPlayerHaveBye(player):
+def clearActiveTournament():
+    """Forgets the cached active tournament id so it is looked up again."""
+    global _active_tournament_id
+    _active_tournament_id = None
+
+
+def doesPlayerHaveBye(player, tournament_id=None):
     """Determine if a player has a bye in the current tournament.
 
     Args:
       player: id of player to check for bye.
+      tournament_id: id of the tournament; defaults to the active tournament
 
     Returns:
       A boolean; True if player has a bye in this active tournament, otherwise
       False.
     """
-    tournament_id = activeTournamentId()
-    with get_cursor() as c:
-        c.execute(
-            "SELECT * FROM player_bye WHERE tournamentId = %s AND "
-            "winnerId = %s", (tournament_id, player)
-        )
-        row = c.fetchone()
-    return row is not None
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    return getBackend().doesPlayerHaveBye(tournament_id, player)
+
+
+def playersWithBye(tournament_id=None):
+    """Returns the ids of the players who have had a bye in a tournament.
+
+    Args:
+      tournament_id: id of the tournament; defaults to the active tournament
+    """
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    return getBackend().playersWithBye(tournament_id)
 
 
 def havePlayersBeenPaired(player1, player2):
@@ -278,11 +708,23 @@ def havePlayersBeenPaired(player1, player2):
       A boolean; True if player1 has already played player2 and vice versa,
       otherwise False.
     """
-    tournament_id = activeTournamentId()
-    with get_cursor() as c:
-        c.execute(
-            "SELECT * FROM player_opponents WHERE tournamentId = %s AND "
-            "id = %s AND opponentId = %s", (tournament_id, player1, player2)
-        )
-        row = c.fetchone()
-    return row is not None
+    return getBackend().havePlayersBeenPaired(player1, player2)
+
+
+def playerOpponents(tournament_id=None):
+    """Returns every player's opponents in the active tournament.
+
+    The whole opponent graph is fetched in a single query so that pairing can
+    check for rematches in memory instead of querying once per pair. Byes are
+    not counted as opponents.
+
+    Args:
+      tournament_id: id of the tournament; defaults to the active tournament
+
+    Returns:
+      A dict mapping each player id that has played a match to the set of ids
+      of the players they have played against.
+    """
+    if tournament_id is None:
+        tournament_id = activeTournamentId()
+    return getBackend().playerOpponents(tournament_id)
@@ -8,8 +8,15 @@ CREATE DATABASE tournament;
 \c tournament;
 
 -- Table definitions
+-- resultVersion is bumped in the same transaction as every write to a
+-- tournament's players or matches, so caches of its standings in any
+-- process can tell whether they are current with one primary key read.
+-- Versions come from a sequence that is never restarted, so they are not
+-- reused even once tournament ids are.
+CREATE SEQUENCE result_version_seq;
 CREATE TABLE tournament (
-    id serial PRIMARY KEY
+    id serial PRIMARY KEY,
+    resultVersion bigint NOT NULL DEFAULT nextval('result_version_seq')
 );
 CREATE TABLE player (
     id serial PRIMARY KEY,
@@ -23,60 +30,118 @@ CREATE TABLE match (
     loserId integer REFERENCES player(id) NULL,
     isTie boolean
 );
-CREATE TABLE match_tie (
+-- One row per player per match: the player's opponent, NULL for a bye, and
+-- the match points they scored, 4 for a win or bye, 1 for a tie and 0 for a
+-- loss. Standings, opponents and results are all grouped scans of it; match
+-- holds one row per match, with no winner or loser for a tie.
+CREATE TABLE match_result (
     matchId integer REFERENCES match(id),
-    playerId integer REFERENCES player(id)
+    tournamentId integer REFERENCES tournament(id),
+    playerId integer REFERENCES player(id),
+    opponentId integer REFERENCES player(id) NULL,
+    points smallint NOT NULL,
+    PRIMARY KEY (matchId, playerId)
+);
+-- Every pair of players of a tournament who have met, lower id first, once
+-- however many times they played. Written by reportMatch(); backs the
+-- rematch checks and the opponent graph read for pairing.
+CREATE TABLE opponent_pair (
+    tournamentId integer REFERENCES tournament(id),
+    player1 integer REFERENCES player(id),
+    player2 integer REFERENCES player(id),
+    PRIMARY KEY (tournamentId, player1, player2),
+    CHECK (player1 < player2)
+);
+-- Running totals per player, kept up to date by reportMatch() so standings
+-- and bye eligibility never have to re-aggregate the match history.
+CREATE TABLE standing (
+    playerId integer PRIMARY KEY REFERENCES player(id),
+    tournamentId integer REFERENCES tournament(id),
+    wins integer NOT NULL DEFAULT 0,
+    losses integer NOT NULL DEFAULT 0,
+    ties integer NOT NULL DEFAULT 0,
+    matches integer NOT NULL DEFAULT 0,
+    omw integer NOT NULL DEFAULT 0,
+    byes integer NOT NULL DEFAULT 0
+);
+-- Append-only log of every reported result and correction, in the order
+-- they were recorded. match and match_result hold the current result of each
+-- match; the latest event of a match is the same result. A tie lists its
+-- two players as winner and loser.
+CREATE TABLE match_event (
+    id serial PRIMARY KEY,
+    tournamentId integer REFERENCES tournament(id),
+    round integer NOT NULL,
+    matchId integer NOT NULL,
+    winnerId integer REFERENCES player(id) NULL,
+    loserId integer REFERENCES player(id) NULL,
+    isTie boolean NOT NULL DEFAULT FALSE,
+    isCorrection boolean NOT NULL DEFAULT FALSE,
+    recordedAt timestamp NOT NULL DEFAULT now()
 );
+-- Copies of a tournament's standing rows taken as its rounds complete, from
+-- which the standings after any round are rebuilt.
+CREATE TABLE standing_snapshot (
+    tournamentId integer REFERENCES tournament(id),
+    round integer NOT NULL,
+    playerId integer REFERENCES player(id),
+    wins integer NOT NULL,
+    losses integer NOT NULL,
+    ties integer NOT NULL,
+    matches integer NOT NULL,
+    omw integer NOT NULL,
+    byes integer NOT NULL,
+    PRIMARY KEY (tournamentId, round, playerId)
+);
+
+-- Index definitions
+-- Every per-tournament query filters on tournamentId first; player and match
+-- lookups by id back the rematch and OMW bookkeeping in reportMatch().
+CREATE INDEX standing_rank_idx
+    ON standing (tournamentId, wins DESC, ties DESC, omw DESC);
+CREATE INDEX player_tournament_idx ON player (tournamentId, id);
+CREATE INDEX match_tournament_idx ON match (tournamentId);
+CREATE INDEX match_winner_idx ON match (winnerId);
+CREATE INDEX match_loser_idx ON match (loserId);
+CREATE INDEX match_bye_idx ON match (tournamentId, winnerId)
+    WHERE winnerId IS NOT NULL AND loserId IS NULL;
+CREATE INDEX match_result_tournament_idx
+    ON match_result (tournamentId, playerId);
+CREATE INDEX match_result_opponent_idx ON match_result (playerId, opponentId);
+CREATE INDEX match_event_round_idx ON match_event (tournamentId, round);
+CREATE INDEX match_event_match_idx ON match_event (matchId);
 
 -- View definitions
+-- match_result is joined on tournamentId as well as the player, so a filter
+-- on the tournament is pushed down into it instead of aggregating every match.
 CREATE VIEW player_record AS (
-    SELECT 
+    SELECT
         p.tournamentId,
-        p.id, 
+        p.id,
         p.name,
-        COALESCE(w.wins, 0) wins,
-        COALESCE(l.losses, 0) losses,
-        COALESCE(t.ties, 0) ties,
-        COALESCE(w.wins, 0) + COALESCE(l.losses, 0) + COALESCE(t.ties, 0) matches
+        COALESCE(SUM((r.points = 4)::integer), 0) wins,
+        COALESCE(SUM((r.points = 0)::integer), 0) losses,
+        COALESCE(SUM((r.points = 1)::integer), 0) ties,
+        COUNT(r.playerId) matches
     FROM player p
-        LEFT JOIN (SELECT winnerId, COUNT(winnerId) wins
-            FROM match
-            GROUP BY winnerId
-        ) w ON p.id = w.winnerId
-        LEFT JOIN (SELECT loserId, COUNT(loserId) losses
-            FROM match
-            GROUP BY loserId
-        ) l ON p.id = l.loserId 
-        LEFT JOIN (SELECT playerId, COUNT(playerId) ties
-            FROM match_tie
-            GROUP BY playerId
-        ) t ON p.id = t.playerId
+        LEFT JOIN match_result r
+            ON r.tournamentId = p.tournamentId AND r.playerId = p.id
+    GROUP BY p.tournamentId, p.id, p.name
 );
 CREATE VIEW player_opponents AS (
-    SELECT p.tournamentId, p.id, p.name, m.loserId opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
-    FROM player p
-        INNER JOIN match m ON p.id = m.winnerId
-        INNER JOIN player_record pr ON m.loserId = pr.id
-    WHERE m.loserId IS NOT NULL
-    UNION
-    SELECT p.tournamentId, p.id, p.name, m.winnerId opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
+    SELECT p.tournamentId, p.id, p.name, r.opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
     FROM player p
-        INNER JOIN match m ON p.id = m.loserId
-        INNER JOIN player_record pr ON m.winnerId = pr.id
-    WHERE m.winnerId IS NOT NULL
-    UNION
-    SELECT p.tournamentId, p.id, p.name, mt2.playerId opponentId, pr.name opponentName, (pr.wins*4) opponentMatchWinPoints, pr.ties opponentMatchTiePoints
-    FROM player p 
-        INNER JOIN match_tie mt ON p.id = mt.playerId 
-        INNER JOIN match_tie mt2 ON mt.matchId = mt2.matchId AND mt.playerId != mt2.playerId
-        INNER JOIN player_record pr ON mt2.playerId = pr.id
+        INNER JOIN (SELECT DISTINCT tournamentId, playerId, opponentId
+            FROM match_result
+            WHERE opponentId IS NOT NULL
+        ) r ON r.tournamentId = p.tournamentId AND r.playerId = p.id
+        INNER JOIN player_record pr ON p.tournamentId = pr.tournamentId AND r.opponentId = pr.id
 );
 CREATE VIEW player_standing AS (
-    SELECT pr.*, COALESCE(SUM(po.opponentMatchWinPoints) + SUM(po.opponentMatchTiePoints), 0) omw
-    FROM player_record pr
-        LEFT JOIN player_opponents po ON pr.id = po.id
-    GROUP BY pr.tournamentId, pr.id, pr.name, pr.wins, pr.losses, pr.ties, pr.matches
-    ORDER BY pr.wins DESC, pr.ties DESC, omw DESC 
+    SELECT s.tournamentId, s.playerId id, p.name, s.wins, s.losses, s.ties, s.matches, s.omw
+    FROM standing s
+        INNER JOIN player p ON s.playerId = p.id
+    ORDER BY s.wins DESC, s.ties DESC, s.omw DESC
 );
 CREATE VIEW player_bye AS (
     SELECT m.winnerId, tournamentId
@@ -3,6 +3,13 @@ The original author of this code is Udacity's Full-Stack Web Developer
 Nanodegree course.
 Code modified by: Brian Quach (13rianquach@gmail.com)
 """
+import threading
+from multiprocessing.dummy import Pool
+import instrumentation
+import pairing
+import simulate
+from memstorage import MemoryBackend
+from storage import Standing
 from tournament import *
 
 
@@ -476,6 +483,924 @@ def testMultipleTournaments():
     print ("15. After creating 3 different tournaments, player scores are kept"
            " to tied to their respective tournaments.")
 
+
+def _backendPid():
+    with get_cursor() as c:
+        c.execute("SELECT pg_backend_pid()")
+        return c.fetchone()[0]
+
+
+def _concurrentBackendPids():
+    """Returns the server pids of two connections checked out at once."""
+    pids = []
+    with get_cursor():
+        pids.append(_backendPid())
+        thread = threading.Thread(target=lambda: pids.append(_backendPid()))
+        thread.start()
+        thread.join()
+    return set(pids)
+
+
+def testConnectionPool():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    createTournament()
+    configurePool(min_connections=1, max_connections=2)
+    threads = [
+        threading.Thread(target=registerPlayer, args=("Player %d" % i,))
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if countPlayers() != 8:
+        raise ValueError(
+            "Eight threads sharing a pool of two connections should register "
+            "eight players."
+        )
+    if not isinstance(getBackend(), MemoryBackend):
+        # Connections opened past min_connections are kept once returned.
+        if _concurrentBackendPids() != _concurrentBackendPids():
+            raise ValueError(
+                "Returned connections should be reused, not reopened."
+            )
+    configurePool()
+    print ("16. Threads share pooled connections without exceeding the pool "
+           "size.")
+
+
+def testPlayerOpponents():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    id1 = registerPlayer("Ada Lovelace")
+    id2 = registerPlayer("Alan Turing")
+    id3 = registerPlayer("Grace Hopper")
+    reportMatch(id1, id2)
+    reportMatch(id2, id3, True)
+    reportMatch(id3, None)
+    opponents = playerOpponents()
+    expected = {id1: set([id2]), id2: set([id1, id3]), id3: set([id2])}
+    if opponents != expected:
+        raise ValueError(
+            "playerOpponents() should map each player to the players they "
+            "have won, lost or tied against, ignoring byes."
+        )
+    print ("17. playerOpponents() returns the opponent graph of the active "
+           "tournament.")
+
+
+def testStandingsUpdatedByReportMatch():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    id1 = registerPlayer("Rock Lee")
+    id2 = registerPlayer("Neji Hyuga")
+    id3 = registerPlayer("Tenten")
+    reportMatch(id1, id2)
+    reportMatch(id2, id3, True)
+    reportMatch(id1, id2)
+    omw = dict((row[1], row[7]) for row in playerStandings(True))
+    if omw != {id1: 1, id2: 9, id3: 1}:
+        raise ValueError(
+            "Reporting a match should update the OMW of every previous "
+            "opponent and count each opponent only once."
+        )
+    print ("18. After reporting matches, OMW is updated for players' previous "
+           "opponents.")
+
+
+def testReportMatchesInBulk():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    createTournament()
+    ids = [registerPlayer("Player %d" % i) for i in range(5)]
+    reportMatch(ids[0], ids[1])
+    reportMatch(ids[2], ids[3], True)
+    reportMatch(ids[4], None)
+    reportMatch(ids[1], ids[2])
+    reportMatch(ids[3], ids[0], True)
+    expected = sorted(playerStandings(True))
+
+    createTournament()
+    ids = [registerPlayer("Player %d" % i) for i in range(5)]
+    reportMatches([(ids[0], ids[1]), (ids[2], ids[3], True), (ids[4], None)])
+    reportMatches([(ids[1], ids[2], False), (ids[3], ids[0], True)])
+    offset = ids[0] - expected[0][1]
+    actual = sorted(
+        (tId - 1, i - offset, n, w, l, t, m, omw)
+        for (tId, i, n, w, l, t, m, omw) in playerStandings(True)
+    )
+    if actual != expected:
+        raise ValueError(
+            "reportMatches() should produce the same standings as reporting "
+            "each match with reportMatch()."
+        )
+    if playersWithBye() != set([ids[4]]):
+        raise ValueError(
+            "reportMatches() should record byes like reportMatch() does."
+        )
+    try:
+        reportMatches([(ids[0], ids[2]), (ids[1], ids[1])])
+    except ValueError:
+        pass
+    else:
+        raise ValueError(
+            "reportMatches() should reject a player matched against themself."
+        )
+    if sorted(row[6] for row in playerStandings(True)) != [1, 2, 2, 2, 2]:
+        raise ValueError(
+            "reportMatches() should record nothing when any result is invalid."
+        )
+    print ("19. Whole rounds can be reported at once, and invalid rounds are "
+           "rejected entirely.")
+
+
+def testExplicitTournamentId():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    first_tournament_id = createTournament()
+    id1 = registerPlayer("Mario")
+    second_tournament_id = createTournament()
+    if activeTournamentId() != second_tournament_id:
+        raise ValueError(
+            "After creating a tournament, it should become the active one."
+        )
+    id2 = registerPlayer("Luigi", first_tournament_id)
+    reportMatch(id1, id2, tournament_id=first_tournament_id)
+    if len(playerStandings()) != 0:
+        raise ValueError(
+            "Players registered to an older tournament should not appear in "
+            "the active tournament's standings."
+        )
+    standings = playerStandings(tournament_id=first_tournament_id)
+    if [row[0] for row in standings] != [id1, id2]:
+        raise ValueError(
+            "Standings of an explicitly given tournament should list its "
+            "players."
+        )
+    deleteTournaments()
+    if activeTournamentId() != 1:
+        raise ValueError(
+            "After deleting tournaments, activeTournamentId() should create "
+            "a new tournament."
+        )
+    print ("20. Functions accept an explicit tournament id and the active "
+           "tournament is cached.")
+
+
+def testOptimalPairings():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    for i in range(7):
+        registerPlayer("Player %d" % i)
+    for round_number in range(4):
+        pairings = swissPairings(method=OPTIMAL)
+        if len(pairings) != 3:
+            raise ValueError(
+                "For seven players, optimal swissPairings should return three "
+                "pairs."
+            )
+        for (pid1, pname1, pid2, pname2) in pairings:
+            if havePlayersBeenPaired(pid1, pid2):
+                raise ValueError(
+                    "Optimal pairing should avoid rematches while a pairing "
+                    "without them exists."
+                )
+            reportMatch(pid1, pid2)
+    if len(playersWithBye()) != 4:
+        raise ValueError(
+            "After four rounds of seven players, four different players "
+            "should have had a bye."
+        )
+
+    # A rematch forced inside one bracket is avoided by solving it together
+    # with its neighbour.
+    players = [
+        Standing(1, i, "Player %d" % i, 0, 0, 0, 0, 0) for i in range(1, 5)
+    ]
+    pairings, bye = pairing.optimalPairings(players, {1: set([2])}, set(), 2)
+    if any(set((p[0], p[2])) == set((1, 2)) for p in pairings):
+        raise ValueError(
+            "Optimal pairing should avoid rematches across brackets too."
+        )
+    print ("21. Optimal pairing avoids rematches and repeated byes.")
+
+
+def testRegisterPlayersInBulk():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    names = ["Player %d" % i for i in range(500)] + ['O\'Neil, "Junior"', ""]
+    ids = registerPlayers(name for name in names)
+    if countPlayers() != len(names):
+        raise ValueError(
+            "After registering players in bulk, countPlayers() should count "
+            "all of them."
+        )
+    registered = dict((row[0], row[1]) for row in playerStandings())
+    if [registered[i] for i in ids] != names:
+        raise ValueError(
+            "registerPlayers() should return the new ids in the order the "
+            "names were given."
+        )
+    # A non-ASCII name reads back the same whichever way it was registered.
+    bulk_id = registerPlayers([u"Jos\xe9"])[0]
+    single_id = registerPlayer(u"Jos\xe9")
+    registered = dict((row[0], row[1]) for row in playerStandings())
+    if registered[bulk_id] != registered[single_id]:
+        raise ValueError(
+            "registerPlayers() should store empty and non-ASCII names like "
+            "registerPlayer() does."
+        )
+    print ("22. Players can be registered in bulk and their ids are returned "
+           "in order.")
+
+
+def testBulkRefreshMatchesReportMatch():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    bulk, single, other = [createTournament() for _ in range(3)]
+    names = ["Player %d" % i for i in range(11)]
+    bulk_ids = registerPlayers(names, bulk)
+    single_ids = dict(zip(bulk_ids, registerPlayers(names, single)))
+    ann, bea = registerPlayers(["Ann", "Bea"], other)
+    reportMatch(ann, bea, False, other)
+    other_standings = sorted(playerStandings(True, other))
+
+    # Rounds of a round robin never rematch players, and give at most one
+    # bye to each of them.
+    seats = bulk_ids + [None]
+    for round_number in range(4):
+        results = []
+        for i in range(len(seats) // 2):
+            first, second = seats[i], seats[-1 - i]
+            if first is None:
+                first, second = second, first
+            outcome = (i + round_number) % 3
+            if second is None:
+                results.append((first, None, False))
+            elif outcome == 2:
+                results.append((first, second, True))
+            elif outcome == 1:
+                results.append((second, first, False))
+            else:
+                results.append((first, second, False))
+        seats = [seats[0], seats[-1]] + seats[1:-1]
+        reportMatches(results, bulk)
+        for winner, loser, is_tie in results:
+            reportMatch(
+                single_ids[winner], single_ids.get(loser), is_tie, single
+            )
+
+    # Rows are (tournamentId, id, name, wins, losses, ties, matches, omw).
+    bulk_standings = sorted(
+        (single_ids[p[1]],) + tuple(p[2:]) for p in playerStandings(True, bulk)
+    )
+    single_standings = sorted(
+        tuple(p[1:]) for p in playerStandings(True, single)
+    )
+    if bulk_standings != single_standings or len(bulk_standings) != 11:
+        raise ValueError(
+            "Standings refreshed from a whole round should equal those "
+            "updated by each match, with every player listed once."
+        )
+    if (set(single_ids[p] for p in playersWithBye(bulk)) !=
+            playersWithBye(single)):
+        raise ValueError(
+            "Byes reported in bulk should be counted like single ones."
+        )
+    if sorted(playerStandings(True, other)) != other_standings:
+        raise ValueError(
+            "Refreshing a tournament should leave the others untouched."
+        )
+    print ("23. Standings refreshed in bulk equal those updated by each "
+           "match.")
+
+
+def testSwitchingBackends():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    registerPlayer("Stays Put")
+    previous = getBackend()
+    setBackend(MemoryBackend())
+    try:
+        id1, id2 = registerPlayers(["Ada Memory", "Bo Memory"])
+        reportMatch(id1, id2)
+        if countPlayers() != 2:
+            raise ValueError(
+                "A fresh backend should only count the players registered "
+                "with it."
+            )
+        standings = playerStandings()
+        if [(row[0], row[2]) for row in standings] != [(id1, 1), (id2, 0)]:
+            raise ValueError(
+                "Standings should be computed the same way by every backend."
+            )
+    finally:
+        setBackend(previous)
+    if countPlayers() != 1:
+        raise ValueError(
+            "Switching backends should leave the previous backend's players "
+            "alone."
+        )
+    print "24. The storage backend can be switched at runtime."
+
+
+def testRejectInvalidMatch():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    first, second = createTournament(), createTournament()
+    ann, bea = registerPlayers(["Ann", "Bea"], first)
+    cid, = registerPlayers(["Cid"], second)
+    unknown = max(ann, bea, cid) + 1
+    for winner, loser, is_tie in (
+            (ann, cid, False), (cid, ann, False), (cid, None, False),
+            (ann, unknown, False), (unknown, None, False),
+            (ann, ann, False), (ann, ann, True), (ann, None, True)):
+        try:
+            reportMatch(winner, loser, is_tie, first)
+        except ValueError:
+            pass
+        else:
+            raise ValueError(
+                "Reporting a match of a player outside the tournament, or "
+                "of a player against themself, should raise ValueError."
+            )
+    if any(p[3] for t in (first, second)
+           for p in playerStandings(tournament_id=t)):
+        raise ValueError(
+            "A rejected match should not be recorded in any tournament."
+        )
+    print "25. Invalid matches are rejected before anything is recorded."
+
+
+def testTiebreakers():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    a, b, c, d = registerPlayers(["Ann", "Bea", "Cid", "Dot"])
+    reportMatch(a, b)
+    reportMatch(c, d, True)
+    reportMatch(a, c)
+    reportMatch(b, d)
+    expected = {
+        a: (5, 1.0, 5 / 12.0, 2 / 3.0, 5, 5),
+        b: (9, 0.5, 2 / 3.0, 5 / 12.0, 9, 1),
+        c: (9, 1 / 3.0, 2 / 3.0, 5 / 12.0, 9, 0.5),
+        d: (5, 1 / 3.0, 5 / 12.0, 2 / 3.0, 5, 0.5),
+    }
+    names = (OMW, MATCH_WIN_PERCENTAGE, OMW_PERCENTAGE, OOW_PERCENTAGE,
+             BUCHHOLZ, SONNEBORN_BERGER)
+    computed = playerTiebreakers()
+    for player, values in expected.items():
+        for name, value in zip(names, values):
+            if abs(computed[player][name] - value) > 1e-9:
+                raise ValueError(
+                    "Player %s should have a %s of %s, not %s." % (
+                        player, name, value, computed[player][name]
+                    )
+                )
+    omw = dict((row[1], row[7]) for row in playerStandings(True))
+    if any(omw[p] != computed[p][OMW] for p in omw):
+        raise ValueError(
+            "The computed OMW should match the OMW kept by reportMatch()."
+        )
+    standings = playerStandings(
+        tiebreakers=(SONNEBORN_BERGER, OMW_PERCENTAGE)
+    )
+    if [row[0] for row in standings] != [a, b, c, d]:
+        raise ValueError(
+            "Players tied on Sonneborn-Berger should be ranked by OMW%."
+        )
+    standings = playerStandings(tiebreakers=(OOW_PERCENTAGE,))
+    if [row[0] for row in standings] != [a, b, d, c]:
+        raise ValueError("Standings should follow the tiebreaker chain.")
+    print "26. Tiebreakers are computed in one pass and can order standings."
+
+
+def testConcurrentTournaments():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    tournament_ids = [createTournament() for _ in range(6)]
+    for tournament_id in tournament_ids:
+        registerPlayers(
+            ["Player %d" % i for i in range(7)], tournament_id
+        )
+
+    for round_number in range(1, 4):
+        # Two callers pair every tournament at the same time.
+        pairings = dict((t, []) for t in tournament_ids)
+        threads = [
+            threading.Thread(
+                target=lambda t: pairings[t].append(swissPairings(t)),
+                args=(t,)
+            )
+            for t in tournament_ids for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for tournament_id in tournament_ids:
+            first, second = [
+                sorted(p for pair in pairs for p in (pair[0], pair[2]))
+                for pairs in pairings[tournament_id]
+            ]
+            if first != second:
+                raise ValueError(
+                    "Concurrent pairings of a round should leave out the "
+                    "same player with a bye."
+                )
+            if len(playersWithBye(tournament_id)) != round_number:
+                raise ValueError(
+                    "Exactly one bye should be granted per round, however "
+                    "many callers pair it."
+                )
+            reportMatches(
+                [(pair[0], pair[2]) for pair in pairings[tournament_id][0]],
+                tournament_id
+            )
+        for tournament_id in tournament_ids:
+            matches = set(row[3] for row in playerStandings(
+                tournament_id=tournament_id
+            ))
+            if matches != set([round_number]):
+                raise ValueError(
+                    "Every player should have played every round."
+                )
+    print "27. Concurrent callers can pair many tournaments at once safely."
+
+
+def testInstrumentation():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    registerPlayers(["Ann", "Bea", "Cid", "Dot", "Eve"])
+    instrumentation.resetStatistics()
+    instrumentation.enable(slow_query_seconds=None)
+    seen = []
+
+    def hook(query, raw, parameters, seconds):
+        seen.append(query)
+
+    instrumentation.addHook(hook)
+    try:
+        with instrumentation.track() as usage:
+            swissPairings()
+    finally:
+        instrumentation.removeHook(hook)
+        instrumentation.disable()
+    uses_database = not isinstance(getBackend(), MemoryBackend)
+    if usage['connections'] != (1 if uses_database else 0):
+        raise ValueError(
+            "Pairing a round should check out a single connection."
+        )
+    if uses_database and not usage['statements']:
+        raise ValueError("Statements run while tracking should be counted.")
+    if [query for query, seconds in usage['queries']] != seen:
+        raise ValueError("Hooks should see every instrumented statement.")
+    total = sum(
+        entry['count']
+        for entry in instrumentation.statistics()['queries'].values()
+    )
+    if total != usage['statements']:
+        raise ValueError(
+            "Per-query histograms should add up to the statement count."
+        )
+    print "28. Connections and statements can be counted and timed."
+
+
+def testSimulateEvent():
+    previous = getBackend()
+    setBackend(MemoryBackend())
+    try:
+        events = [
+            simulate.simulateEvent(8, bulk=True), simulate.simulateEvent(8)
+        ]
+        for event in events:
+            if event['rounds'] != 3:
+                raise ValueError(
+                    "An event of 8 players should default to 3 rounds."
+                )
+            if sorted(event['phases']) != sorted(simulate.PHASES):
+                raise ValueError("Every phase of an event should be timed.")
+            for totals in event['phases'].values():
+                if totals['connections'] or totals['statements']:
+                    raise ValueError(
+                        "Events in memory should not touch the database."
+                    )
+            standings = playerStandings(tournament_id=event['tournament_id'])
+            if [row[3] for row in standings] != [3] * 8:
+                raise ValueError("Every player should play every round.")
+            if event['top'] != [row[1] for row in standings[:3]]:
+                raise ValueError(
+                    "The top three should be read from the final standings."
+                )
+        if events[0]['top'] != events[1]['top']:
+            raise ValueError(
+                "Reporting in bulk should not change the outcome of an event."
+            )
+    finally:
+        setBackend(previous)
+    print "29. Whole events can be simulated."
+
+
+def testScoreGroupPairings():
+    # Three players on two wins, three on one and two on none.
+    players = [
+        Standing(
+            1, player_id, "Player %d" % player_id, wins, 2 - wins, 0, 2, 0
+        )
+        for player_id, wins in
+        [(1, 2), (2, 2), (3, 2), (4, 1), (5, 1), (6, 1), (7, 0), (8, 0)]
+    ]
+    opponents = {
+        3: set([4, 5, 6]), 4: set([3]), 5: set([3]), 6: set([3]),
+        7: set([8]), 8: set([7]),
+    }
+    groups = pairing.scoreGroups(players)
+    if [[p[1] for p in group] for group in groups] != [
+            [1, 2, 3], [4, 5, 6], [7, 8]]:
+        raise ValueError(
+            "Score groups should hold players with equal match points, best "
+            "group first."
+        )
+    expected = set([
+        frozenset([1, 3]), frozenset([2, 4]), frozenset([5, 7]),
+        frozenset([6, 8]),
+    ])
+    pairings = pairing.bracketPairings(players, opponents)
+    if set(frozenset([p[0], p[2]]) for p in pairings) != expected:
+        raise ValueError(
+            "The lowest ranked player of an odd group who can avoid a "
+            "rematch should float into the group below, and rematches "
+            "should be swapped with a pair of an adjacent group."
+        )
+    pool = Pool(2)
+    try:
+        parallel_pairings = pairing.bracketPairings(
+            players, opponents, pool.map
+        )
+    finally:
+        pool.close()
+        pool.join()
+    if parallel_pairings != pairings:
+        raise ValueError(
+            "Brackets paired in parallel should give the same pairings."
+        )
+    print "30. Score groups are paired bracket by bracket with floaters."
+
+
+def testStandingsPagesAndStreaming():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    player_ids = registerPlayers(["Player %d" % i for i in range(25)])
+    for round_number in range(2):
+        reportMatches([
+            (pid1, pid2, False) for (pid1, pname1, pid2, pname2) in
+            swissPairings()
+        ])
+    standings = playerStandings()
+    if playerStandings(limit=8) != standings[:8]:
+        raise ValueError("A limit should return the top of the standings.")
+    pages = []
+    for offset in range(0, len(player_ids), 10):
+        pages.extend(playerStandings(limit=10, offset=offset))
+    if pages != standings:
+        raise ValueError(
+            "Consecutive pages should add up to the whole standings."
+        )
+    if list(iterPlayerStandings(batch_size=4)) != standings:
+        raise ValueError(
+            "Streamed standings should match playerStandings()."
+        )
+    if (list(iterPlayerStandings(True, batch_size=4)) !=
+            playerStandings(True)):
+        raise ValueError(
+            "Streamed standings should match playerStandings(True)."
+        )
+    rows = iterPlayerStandings(batch_size=4)
+    if next(rows) != standings[0]:
+        raise ValueError("The first streamed row should be the leader.")
+    rows.close()
+    if countPlayers() != len(player_ids):
+        raise ValueError(
+            "Closing a stream early should leave the API usable."
+        )
+    print "31. Standings can be read a page at a time or streamed."
+
+
+def _inThread(function):
+    """Returns what function returns when called on another thread."""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+def testWritesWhileStreaming():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    ann, bea, cid, dee = registerPlayers(["Ann", "Bea", "Cid", "Dee"])
+    rows = iterPlayerStandings(batch_size=1)
+    next(rows)
+    reportMatch(ann, bea)
+    # Closing the stream early should not undo the match reported meanwhile.
+    rows.close()
+    rows = iterPlayerStandings(batch_size=1)
+    next(rows)
+    # Nor should finishing the stream on another thread.
+    _inThread(lambda: list(rows))
+    reportMatch(cid, dee)
+    matches = _inThread(lambda: [p[3] for p in playerStandings()])
+    if matches != [1, 1, 1, 1]:
+        raise ValueError(
+            "Matches reported while a stream is open should be committed "
+            "on their own."
+        )
+    print "32. Matches can be reported while standings are streamed."
+
+
+def testPreparedStatements():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    player_ids = registerPlayers(["Ann", "Bea", "Cid"])
+    reportMatch(player_ids[0], player_ids[1])
+    closePool()
+    instrumentation.enable(slow_query_seconds=None)
+    try:
+        with instrumentation.track() as first:
+            paired = havePlayersBeenPaired(player_ids[0], player_ids[1])
+        with instrumentation.track() as second:
+            not_paired = havePlayersBeenPaired(player_ids[0], player_ids[2])
+    finally:
+        instrumentation.disable()
+    if not paired or not_paired:
+        raise ValueError(
+            "Prepared statements should give the same answers as queries."
+        )
+    if not isinstance(getBackend(), MemoryBackend):
+        first_queries = [query for query, seconds in first['queries']]
+        second_queries = [query for query, seconds in second['queries']]
+        if (len(first_queries) != 2 or
+                not first_queries[0].startswith("PREPARE ")):
+            raise ValueError(
+                "A new connection should prepare a statement before its "
+                "first use."
+            )
+        if (len(second_queries) != 1 or
+                not second_queries[0].startswith("EXECUTE ")):
+            raise ValueError(
+                "A prepared statement should be executed by name afterwards."
+            )
+    print "33. Hot statements are prepared once per connection."
+
+
+def testStandingsAfterRound():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    registerPlayers(["Player %d" % i for i in range(9)])
+    after_round = {}
+    for round_number in range(1, 4):
+        results = [
+            (pid1, pid2, i == 0) for i, (pid1, pname1, pid2, pname2) in
+            enumerate(swissPairings())
+        ]
+        if round_number == 2:
+            for winner, loser, is_tie in results:
+                reportMatch(winner, loser, is_tie)
+        else:
+            reportMatches(results)
+        after_round[round_number] = playerStandings(True)
+    for round_number, standings in after_round.items():
+        if standingsAfterRound(round_number, True) != standings:
+            raise ValueError(
+                "standingsAfterRound() should return the standings as they "
+                "were after round %d." % round_number
+            )
+    if standingsAfterRound(3) != playerStandings():
+        raise ValueError(
+            "standingsAfterRound() should return the short rows by default."
+        )
+
+    first = [e for e in matchEvents() if e.round == 1 and e.loserId and
+             not e.isTie][0]
+    correctMatch(first.loserId, first.winnerId)
+    correction = matchEvents()[-1]
+    if not correction.isCorrection or correction.round != 1 or (
+            correction.matchId != first.matchId):
+        raise ValueError(
+            "A correction should be logged with the round of its match."
+        )
+    if standingsAfterRound(3, True) != playerStandings(True):
+        raise ValueError(
+            "Standings after the last round should include corrections."
+        )
+    wins = dict((p.id, p.wins) for p in standingsAfterRound(1, True))
+    before = dict((p.id, p.wins) for p in after_round[1])
+    if (wins[first.winnerId] != before[first.winnerId] - 1 or
+            wins[first.loserId] != before[first.loserId] + 1):
+        raise ValueError(
+            "Standings after round 1 should reflect its corrected match."
+        )
+    standings = playerStandings(True)
+    events = matchEvents()
+    for winner, loser, is_tie in [
+            (first.winnerId, first.winnerId, False),
+            (first.winnerId, None, False),
+            (first.winnerId, -1, False),
+            (first.winnerId, None, True)]:
+        try:
+            correctMatch(winner, loser, is_tie)
+        except ValueError:
+            pass
+        else:
+            raise ValueError(
+                "Correcting a match to a self-match, a bye or a result "
+                "naming an unregistered player should fail."
+            )
+    never_met = [
+        (p1.id, p2.id) for p1 in standings for p2 in standings
+        if p1.id < p2.id and not havePlayersBeenPaired(p1.id, p2.id)
+    ][0]
+    try:
+        correctMatch(*never_met)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("Correcting a match never played should fail.")
+    if playerStandings(True) != standings or matchEvents() != events:
+        raise ValueError(
+            "A rejected correction should change neither the standings nor "
+            "the match log."
+        )
+    print "34. Standings after any round can be replayed from the match log."
+
+
+def testOpponentPairs():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    ann, bea, cid, dan = registerPlayers(["Ann", "Bea", "Cid", "Dan"])
+    reportMatch(bea, ann)
+    reportMatches([(ann, bea, False), (cid, ann, True), (dan, None, False)])
+    if not (havePlayersBeenPaired(ann, bea) and
+            havePlayersBeenPaired(bea, ann) and
+            havePlayersBeenPaired(ann, cid)):
+        raise ValueError(
+            "Players who met should be paired whichever comes first."
+        )
+    if havePlayersBeenPaired(bea, cid) or havePlayersBeenPaired(dan, ann):
+        raise ValueError("Players who never met should not be paired.")
+    opponents = playerOpponents()
+    if opponents.get(ann) != set([bea, cid]) or dan in opponents:
+        raise ValueError(
+            "A rematch should count once in the opponents, and a bye not "
+            "at all."
+        )
+    omw = dict((p.id, p.omw) for p in playerStandings(True))
+    if omw[ann] != 4 + 1 or omw[bea] != 4 + 1:
+        raise ValueError("A rematch should count once in the OMW.")
+    print "35. Opponent pairs are recorded once, whoever won."
+
+
+def testSwissPairingsBatch():
+    import tournament
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    tournament_ids = [createTournament() for _ in range(4)]
+    for tournament_id in tournament_ids:
+        registerPlayers(["Player %d" % i for i in range(5)], tournament_id)
+    # The in-memory backend can only be shared with threads.
+    processes = not getBackend().process_local
+    if processes:
+        pids = _concurrentBackendPids()
+        with get_cursor() as c:
+            pairings, errors = swissPairingsBatch(tournament_ids, workers=2)
+            # Connections of this process, even in use, outlive the batch.
+            c.execute("SELECT 1")
+        if _concurrentBackendPids() != pids:
+            raise ValueError(
+                "Pairing in worker processes should keep this process's "
+                "pooled connections open."
+            )
+    else:
+        pairings, errors = swissPairingsBatch(
+            tournament_ids, workers=2, processes=False
+        )
+    if errors or sorted(pairings) != tournament_ids:
+        raise ValueError("Every tournament of the batch should be paired.")
+    for tournament_id in tournament_ids:
+        if len(pairings[tournament_id]) != 2:
+            raise ValueError(
+                "Each tournament of the batch should get its own pairings."
+            )
+        if len(playersWithBye(tournament_id)) != 1:
+            raise ValueError(
+                "Each tournament of the batch should grant one bye."
+            )
+
+    workers = tournament._pairing_workers
+    for tournament_id in tournament_ids:
+        reportMatches([
+            (id1, id2, False)
+            for (id1, name1, id2, name2) in pairings[tournament_id]
+        ], tournament_id)
+    pairings, errors = swissPairingsBatch(
+        tournament_ids, workers=2, processes=processes
+    )
+    if errors or len(pairings) != len(tournament_ids):
+        raise ValueError("A second batch should pair every tournament.")
+    if workers is None or tournament._pairing_workers is not workers:
+        raise ValueError("The workers should be kept for the next batch.")
+    closePool()
+    if tournament._pairing_workers is not None:
+        raise ValueError("closePool() should stop the batch workers.")
+
+    if getBackend().process_local:
+        try:
+            swissPairingsBatch(tournament_ids, processes=True)
+        except ValueError:
+            pass
+        else:
+            raise ValueError(
+                "Worker processes should be refused an in-process backend."
+            )
+    print "36. Many tournaments can be paired at once."
+
+
+def testStandingsCache():
+    deleteMatches()
+    deletePlayers()
+    deleteTournaments()
+    configureStandingsCache(2)
+    first, second, third = [createTournament() for _ in range(3)]
+    ann, bea = registerPlayers(["Ann", "Bea"], first)
+    cid, dan = registerPlayers(["Cid", "Dan"], second)
+    registerPlayers(["Eve", "Fay"], third)
+
+    before = standingsCacheStatistics()
+    playerStandings(tournament_id=first)
+    standings = playerStandings(tournament_id=first)
+    standings.pop()
+    if len(playerStandings(tournament_id=first)) != 2:
+        raise ValueError(
+            "Changing returned standings should not alter the cache."
+        )
+    after = standingsCacheStatistics()
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    if (hits, misses) != (2, 1):
+        raise ValueError("Repeated reads should be served from the cache.")
+
+    reportMatch(ann, bea, False, first)
+    if playerStandings(tournament_id=first)[0][2] != 1:
+        raise ValueError("Reporting a match should invalidate the cache.")
+    correctMatch(bea, ann, False, first)
+    if playerStandings(tournament_id=first)[0][0] != bea:
+        raise ValueError("Correcting a match should invalidate the cache.")
+    cy = registerPlayer("Cy", first)
+    if cy not in [p[0] for p in playerStandings(tournament_id=first)]:
+        raise ValueError("Registering a player should invalidate the cache.")
+    playerStandings(tournament_id=second)
+    # Written straight to the backend, as another process would.
+    getBackend().reportMatch(second, cid, dan, False)
+    if playerStandings(tournament_id=second)[0][2] != 1:
+        raise ValueError(
+            "Writes made past this module should invalidate the cache."
+        )
+
+    playerStandings(tournament_id=second)
+    playerStandings(tournament_id=third)
+    statistics = standingsCacheStatistics()
+    if statistics['entries'] != 2 or statistics['evictions'] == 0:
+        raise ValueError(
+            "The least recently used reads should be evicted past the bound."
+        )
+    deleteMatches()
+    if playerStandings(tournament_id=first)[0][3] != 0:
+        raise ValueError("Deleting matches should invalidate the cache.")
+    configureStandingsCache()
+    print "37. Standings are cached until their tournament is written to."
+
+
 if __name__ == '__main__':
     testDeleteMatches()
     testDelete()
@@ -492,4 +1417,26 @@ if __name__ == '__main__':
     testPlayerStandingsWithOpponentMatchWins()
     testPreventRematch()
     testMultipleTournaments()
+    testConnectionPool()
+    testPlayerOpponents()
+    testStandingsUpdatedByReportMatch()
+    testReportMatchesInBulk()
+    testExplicitTournamentId()
+    testOptimalPairings()
+    testRegisterPlayersInBulk()
+    testBulkRefreshMatchesReportMatch()
+    testSwitchingBackends()
+    testRejectInvalidMatch()
+    testTiebreakers()
+    testConcurrentTournaments()
+    testInstrumentation()
+    testSimulateEvent()
+    testScoreGroupPairings()
+    testStandingsPagesAndStreaming()
+    testWritesWhileStreaming()
+    testPreparedStatements()
+    testStandingsAfterRound()
+    testOpponentPairs()
+    testSwissPairingsBatch()
+    testStandingsCache()
     print "Success!  All tests pass!"